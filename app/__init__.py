@@ -15,7 +15,6 @@ from dotenv import load_dotenv
 from flask_migrate import Migrate
 import psutil
 import time
-import redis
 
 # Load environment variables
 load_dotenv()
@@ -53,8 +52,10 @@ def create_app(config_class=None):
     csrf.init_app(app)
     mail.init_app(app)
     cache.init_app(app)
-    # Initialize SocketIO
-    socketio.init_app(app, cors_allowed_origins="*", logger=True, engineio_logger=True)
+    # Initialize SocketIO (Redis message queue lets all workers emit to all clients)
+    from .utils.redis_pool import is_redis_configured, get_redis_url
+    socketio.init_app(app, cors_allowed_origins="*", logger=True, engineio_logger=True,
+                      message_queue=get_redis_url('socketio') if is_redis_configured() else None)
     
     # Register WebSocket handlers
     try:
@@ -120,9 +121,23 @@ def create_app(config_class=None):
     except Exception as e:
         app.logger.warning(f"Translation service initialization failed: {e}")
     
-    # Initialize price monitoring service (disabled in production to prevent context errors)
+    # Seed the ticker registry so invalid symbols are rejected without upstream calls
+    try:
+        from .utils.ticker_registry import ticker_registry
+        ticker_registry.load()
+    except Exception as e:
+        app.logger.warning(f"Ticker registry initialization failed: {e}")
+    
+    # Initialize price monitoring service (disabled in production to prevent context errors).
+    # Under gunicorn only the quote ingest process runs it, not every web worker;
+    # with QUOTE_BOARD_INGEST=0 there is no ingest process, so the workers do.
     is_railway = os.getenv('RAILWAY_ENVIRONMENT') or os.getenv('PORT')  # Railway provides PORT
-    if not is_railway:
+    process_role = os.getenv('AKSJERADAR_PROCESS_ROLE', 'standalone')
+    ingest_process = os.getenv('QUOTE_BOARD_INGEST', '1') == '1'
+    runs_monitor = process_role in ('ingest', 'standalone') or (process_role == 'web' and not ingest_process)
+    if not runs_monitor:
+        app.logger.info(f"Price monitoring service runs in the ingest process, not in {process_role}")
+    elif not is_railway:
         try:
             from .services.price_monitor_service import price_monitor
             price_monitor.start_monitoring(app)
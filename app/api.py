@@ -10,8 +10,8 @@ from .services.risk_manager import RiskManager
 from .services.insider_trading_service import InsiderTradingService
 from .services.financial_data_aggregator import FinancialDataAggregator
 from .services.data_service import DataService
+from .utils.quote_batch import get_batch_quotes
 import logging
-import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -850,103 +850,22 @@ def get_realtime_quotes():
                 'message': 'No symbols provided'
             }), 400
         
-        # Get real-time data using yfinance or other sources
+        # One multi-ticker download (cached) shared with /api/realtime/batch-updates
+        symbols = symbols[:20]  # Limit to 20 symbols
         quotes = {}
-        for symbol in symbols[:20]:  # Limit to 20 symbols
-            try:
-                try:
-                    import yfinance as yf
-                except ImportError:
-                    yf = None
-                
-                if yf is None:
-                    # Return fallback data when yfinance is not available
-                    quotes = {}
-                    for symbol in symbols:
-                        quotes[symbol] = {
-                            'symbol': symbol,
-                            'price': 100.0 + (hash(symbol) % 100),  # Deterministic but varied prices
-                            'change': ((hash(symbol) % 21) - 10) / 10,  # Random-ish change -1 to +1
-                            'change_percent': ((hash(symbol) % 21) - 10) / 10,
-                            'volume': 1000000 + (hash(symbol) % 500000),
-                            'timestamp': datetime.now().isoformat(),
-                            'market_status': 'open'
-                        }
-                    
-                    return jsonify({
-                        'success': True,
-                        'quotes': quotes,
-                        'note': 'Using fallback data - yfinance not available'
-                    })
-                    
-                # Original yfinance code would go here when available
-                if yf is not None:
-                    ticker = yf.Ticker(symbol)
-                    info = ticker.info
-                    
-                    quotes[symbol] = {
-                        'price': info.get('currentPrice', info.get('regularMarketPrice', 0)),
-                        'change': info.get('regularMarketChange', 0),
-                        'change_percent': info.get('regularMarketChangePercent', 0),
-                        'volume': info.get('regularMarketVolume', 0),
-                        'market_status': 'open'  # Would be determined by market hours
-                    }
-                else:
-                    # Return fallback when yfinance not available
-                    quotes[symbol] = {
-                        'symbol': symbol,
-                        'price': 100.0 + (hash(symbol) % 100),
-                        'change': ((hash(symbol) % 21) - 10) / 10,
-                        'volume': 1000000,
-                        'timestamp': datetime.now().isoformat(),
-                        'note': 'Fallback data - yfinance not available'
-                    }
-            except:
-                # Use DataService for fallback instead of random data
-                try:
-                    stock_data = DataService.get_stock_data(symbol, period='1d')
-                    if not stock_data.empty:
-                        latest_price = float(stock_data['Close'].iloc[-1])
-                        if len(stock_data) > 1:
-                            prev_price = float(stock_data['Close'].iloc[-2])
-                            change = latest_price - prev_price
-                            change_percent = (change / prev_price) * 100 if prev_price != 0 else 0
-                        else:
-                            change = 0
-                            change_percent = 0
-                        
-                        quotes[symbol] = {
-                            'price': latest_price,
-                            'change': change,
-                            'change_percent': change_percent,
-                            'volume': int(stock_data['Volume'].iloc[-1]) if 'Volume' in stock_data.columns else 100000,
-                            'market_status': 'open'
-                        }
-                    else:
-                        # Last resort: use mock data with warning
-                        quotes[symbol] = {
-                            'price': np.random.uniform(50, 300),
-                            'change': np.random.uniform(-5, 5),
-                            'change_percent': np.random.uniform(-3, 3),
-                            'volume': np.random.randint(100000, 10000000),
-                            'market_status': 'open',
-                            'note': 'Mock data - real data unavailable'
-                        }
-                except Exception as e:
-                    # Absolute fallback with error logging
-                    logger.warning(f"DataService fallback failed for {symbol}: {e}")
-                    quotes[symbol] = {
-                        'price': np.random.uniform(50, 300),
-                        'change': np.random.uniform(-5, 5),
-                        'change_percent': np.random.uniform(-3, 3),
-                        'volume': np.random.randint(100000, 10000000),
-                        'market_status': 'open',
-                        'note': 'Mock data - all data sources failed'
-                    }
+        for symbol, quote in get_batch_quotes(symbols).items():
+            quote['symbol'] = symbol
+            quote['market_status'] = 'open'  # Would be determined by market hours
+            quotes[symbol] = quote
+        
+        missing = [symbol for symbol in symbols if symbol not in quotes]
+        if missing:
+            logger.warning(f"No real-time data for {', '.join(missing)}")
         
         return jsonify({
             'success': True,
-            'quotes': quotes
+            'quotes': quotes,
+            'missing': missing
         })
         
     except Exception as e:
@@ -7,7 +7,6 @@ import redis
 import json
 from ..services.stock_service import StockService
 from ..services.news_service import NewsService
-from ..utils.cache_manager import cache_manager
 from ..utils.rate_limiter import rate_limiter
 
 api = Blueprint('api', __name__, url_prefix='/api')
@@ -48,11 +47,14 @@ def api_rate_limit(max_requests=60, window=60):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if rate_limiter.wait_if_needed('api_request') > 0:
-                return jsonify({
+            retry_after = rate_limiter.wait_if_needed('api_request')
+            if retry_after > 0:
+                response = jsonify({
                     'error': 'Rate limit exceeded',
                     'message': f'Maximum {max_requests} requests per {window} seconds'
-                }), 429
+                })
+                response.headers['Retry-After'] = str(int(retry_after) + 1)
+                return response, 429
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -92,9 +92,26 @@ class Config:
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
     
+    # Live prices over the /market-data websocket need an async gunicorn worker;
+    # with the sync worker browsers only poll the quote APIs
+    REALTIME_WEBSOCKET = os.getenv(
+        'REALTIME_WEBSOCKET',
+        'True' if any(name in os.getenv('GUNICORN_WORKER_CLASS', '') for name in ('gevent', 'eventlet')) else 'False'
+    ).lower() == 'true'
+
     # Rate limiting
     RATELIMIT_STORAGE_URL = os.getenv('REDIS_URL', 'memory://')
 
+    # Upstream provider budgets for utils.rate_limiter ('burst' defaults to 'calls')
+    RATE_LIMIT_YFINANCE = {'calls': int(os.getenv('RATE_LIMIT_YFINANCE_CALLS', 2)), 'per_seconds': 60}
+    RATE_LIMIT_FMP = {'calls': int(os.getenv('RATE_LIMIT_FMP_CALLS', 250)), 'per_seconds': 86400, 'burst': 10}
+    RATE_LIMIT_ALPHA_VANTAGE = {'calls': int(os.getenv('RATE_LIMIT_ALPHA_VANTAGE_CALLS', 5)), 'per_seconds': 60}
+    RATE_LIMIT_POLYGON = {'calls': int(os.getenv('RATE_LIMIT_POLYGON_CALLS', 5)), 'per_seconds': 60}
+    RATE_LIMIT_FINNHUB = {'calls': int(os.getenv('RATE_LIMIT_FINNHUB_CALLS', 60)), 'per_seconds': 60}
+    # Quote board batch downloads (50 symbols each); only ingest uses it, so no reserve
+    RATE_LIMIT_QUOTE_INGEST = {'calls': int(os.getenv('RATE_LIMIT_QUOTE_INGEST_CALLS', 60)), 'per_seconds': 60,
+                               'reserve': 0}
+
 class DevelopmentConfig(Config):
     DEBUG = True
     TESTING = False
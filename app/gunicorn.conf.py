@@ -3,13 +3,20 @@ Production-ready WSGI configuration for gunicorn
 """
 import multiprocessing
 import os
+import subprocess
+import sys
 
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+# The /market-data price channel is websocket-only and needs an async worker,
+# e.g. GUNICORN_WORKER_CLASS=geventwebsocket.gunicorn.workers.GeventWebSocketWorker
+# (requires gevent-websocket). Config.REALTIME_WEBSOCKET follows this setting,
+# so with the default sync worker pages never open the socket and only poll
+# the quote APIs.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
 worker_connections = 1000
 timeout = 120
 keepalive = 60
@@ -39,9 +46,29 @@ reload = False
 reload_engine = 'auto'
 spew = False
 
+# Quote board: one upstream poller per host, read by every worker via mmap
+quote_board_ingest = os.getenv('QUOTE_BOARD_INGEST', '1') == '1'
+
+# Workers inherit this; background services (price monitor) run in the ingest process,
+# or in the workers when QUOTE_BOARD_INGEST=0
+os.environ.setdefault('AKSJERADAR_PROCESS_ROLE', 'web')
+
 # Server hooks
 def when_ready(server):
-    server.log.info("Server is ready. Doing nothing.")
+    server.log.info("Server is ready.")
+    if quote_board_ingest:
+        try:
+            # Separate interpreter: the master never imports the app itself
+            server.quote_ingest = subprocess.Popen(
+                [sys.executable, '-m', 'app.utils.quote_board'],
+                env=dict(os.environ, AKSJERADAR_PROCESS_ROLE='ingest')
+            )
+            server.log.info(f"Quote board ingest started (pid {server.quote_ingest.pid})")
+        except Exception as e:
+            server.log.warning(f"Quote board ingest not started: {e}")
 
 def on_exit(server):
-    server.log.info("Server is stopping. Doing nothing.")
+    server.log.info("Server is stopping.")
+    ingest = getattr(server, 'quote_ingest', None)
+    if ingest is not None:
+        ingest.terminate()
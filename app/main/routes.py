@@ -3,7 +3,7 @@ from flask_login import current_user
 from datetime import datetime
 
 from ..auth.enhanced_auth import validate_session, require_subscription
-from ..utils.cache_manager import cached, cache_manager
+from ..utils.tiered_cache import tiered_cache
 
 bp = Blueprint('main', __name__)
 
@@ -19,7 +19,7 @@ def index():
     cache_key = f"homepage_data:{current_user.subscription_level if current_user.is_authenticated else 'anonymous'}"
     
     # Try to get cached data
-    homepage_data = cache_manager.get(cache_key)
+    homepage_data = tiered_cache.get(cache_key, 'pages')
     
     if not homepage_data:
         # Generate fresh data
@@ -30,7 +30,7 @@ def index():
         }
         
         # Cache for 5 minutes
-        cache_manager.set(cache_key, homepage_data, ttl=300)
+        tiered_cache.set(cache_key, homepage_data, 'pages', ttl=300)
     
     return render_template('index.html', **homepage_data)
 
@@ -93,6 +93,68 @@ def api_error_log():
         'data': error_log
     })
 
+@admin.route('/api/cache-stats')
+@login_required
+@admin_required
+def api_cache_stats():
+    """API for å hente cache-statistikk (alle lag og navnerom)"""
+    try:
+        from ..utils.tiered_cache import tiered_cache
+        from ..utils.ticker_registry import ticker_registry
+        from ..utils.quote_board import quote_board
+        from ..utils.history_store import history_store
+        from ..utils.upstream_coalescer import upstream_coalescer
+        from ..utils.provider_router import provider_router
+        from ..utils.circuit_breaker import get_breaker_stats
+        stats = tiered_cache.get_stats()
+        stats['ticker_registry'] = ticker_registry.get_stats()
+        stats['quote_board'] = quote_board.get_stats()
+        stats['history_store'] = history_store.get_stats()
+        stats['upstream_coalescer'] = upstream_coalescer.get_stats()
+        stats['provider_router'] = provider_router.get_stats()
+        stats['circuit_breakers'] = get_breaker_stats()
+        return jsonify({
+            'success': True,
+            'data': stats
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@admin.route('/providers')
+@login_required
+@admin_required
+def provider_status():
+    """Status for eksterne datakilder (circuit breakers og latens)"""
+    from ..utils.circuit_breaker import get_breaker_stats
+    from ..utils.provider_router import provider_router
+    return render_template('admin/providers.html',
+                         breakers=get_breaker_stats(),
+                         router=provider_router.get_stats())
+
+@admin.route('/api/breakers')
+@login_required
+@admin_required
+def api_breakers():
+    """API for å hente circuit breaker-status (denne arbeidsprosessen)"""
+    from ..utils.circuit_breaker import get_breaker_stats
+    return jsonify({
+        'success': True,
+        'data': get_breaker_stats()
+    })
+
+@admin.route('/api/breakers/<path:name>/reset', methods=['POST'])
+@login_required
+@admin_required
+def api_reset_breaker(name):
+    """Lukk en circuit breaker manuelt"""
+    from ..utils.circuit_breaker import reset_breaker
+    if not reset_breaker(name):
+        return jsonify({'success': False, 'error': 'Ukjent breaker'}), 404
+    return jsonify({'success': True})
+
 @admin.route('/users')
 @login_required
 @admin_required
@@ -3,7 +3,7 @@ from flask_login import current_user, login_required
 from ..utils.access_control import access_required, demo_access, premium_required
 from ..models.user import User
 from ..models.portfolio import Portfolio, PortfolioStock
-from ..extensions import cache
+from ..utils.tiered_cache import tiered_cache
 from datetime import datetime, timedelta
 import logging
 import requests
@@ -911,7 +911,7 @@ def ai(ticker=None):
         if ticker:
             ticker = ticker.strip().upper()
             cache_key = f"ai_analysis_{ticker}"
-            cached_data = cache.get(cache_key)
+            cached_data = tiered_cache.get(cache_key, 'analysis')
             if cached_data:
                 return cached_data
             
@@ -961,7 +961,7 @@ def ai(ticker=None):
             result = render_template('analysis/ai.html', 
                                    analysis=ai_analysis,
                                    ticker=ticker)
-            cache.set(cache_key, result, timeout=1800)
+            tiered_cache.set(cache_key, result, 'analysis', ttl=1800)
             return result
         else:
             return render_template('analysis/ai_form.html')
@@ -982,7 +982,7 @@ def short_analysis(ticker=None):
         
         if ticker:
             cache_key = f"short_analysis_{ticker}"
-            cached_data = cache.get(cache_key)
+            cached_data = tiered_cache.get(cache_key, 'analysis')
             if cached_data:
                 return cached_data
             
@@ -1012,7 +1012,7 @@ def short_analysis(ticker=None):
             result = render_template('analysis/short_analysis.html', 
                                    short_data=short_data,
                                    ticker=ticker)
-            cache.set(cache_key, result, timeout=1800)
+            tiered_cache.set(cache_key, result, 'analysis', ttl=1800)
             return result
         else:
             return render_template('analysis/short_analysis_select.html')
@@ -1031,7 +1031,7 @@ def ai_predictions(ticker=None):
             ticker = request.args.get('ticker')
         if ticker:
             cache_key = f"ai_predictions_{ticker}"
-            cached_data = cache.get(cache_key)
+            cached_data = tiered_cache.get(cache_key, 'analysis')
             if cached_data:
                 return cached_data
             
@@ -1069,7 +1069,7 @@ def ai_predictions(ticker=None):
             result = render_template('analysis/ai_predictions.html', 
                                    predictions=predictions,
                                    ticker=ticker)
-            cache.set(cache_key, result, timeout=1800)
+            tiered_cache.set(cache_key, result, 'analysis', ttl=1800)
             return result
         else:
             return render_template('analysis/ai_predictions_select.html')
@@ -7,7 +7,11 @@ from ..services.data_service import DataService
 from ..services.ai_service import AIService
 from ..services.yahoo_finance_service import YahooFinanceService
 from ..services.portfolio_service import get_ai_analysis
-from ..services.simple_cache import simple_cache
+from ..utils.market_snapshot import read_snapshots
+from ..utils.ticker_registry import ticker_registry
+from ..utils.quote_fetcher import fetch_quotes, confirm_unknown
+from ..utils.quote_batch import get_batch_quotes
+from ..utils.quote_versions import quote_versions, parse_since
 from ..utils.access_control import access_required, api_access_required, api_login_required
 from ..models.user import User
 from ..models.portfolio import Portfolio, PortfolioStock
@@ -18,6 +22,14 @@ import traceback
 api = Blueprint('api', __name__, url_prefix='/api')
 logger = logging.getLogger(__name__)
 
+# Quick prices: tickers per request and time budget for uncached quotes
+MAX_QUICK_PRICE_TICKERS = 50
+QUICK_PRICES_DEADLINE = 2.5
+
+# Fields whose change gives a quote a new version (delta polling with since=)
+QUICK_PRICE_FIELDS = ('last_price', 'change', 'change_percent', 'volume')
+BATCH_UPDATE_FIELDS = ('price', 'change', 'change_percent', 'volume')
+
 @api.route('/docs')
 def api_docs():
     """API Documentation page"""
@@ -445,11 +457,13 @@ def search():
     """Search for stocks - uses real data via DataService"""
     try:
         query = request.args.get('q', '').strip()
-        if not query:
+        if not query or ticker_registry.has_no_results(query):
             return jsonify({'results': []})
         
         # Use DataService.search_stocks for real data
         results = DataService.search_stocks(query)
+        if not results:
+            ticker_registry.mark_no_results(query)
         return jsonify({'results': results})
     except Exception as e:
         logger.error(f"Search error: {e}")
@@ -465,8 +479,12 @@ def search_stocks():
         return response
     
     try:
+        if ticker_registry.has_no_results(query):
+            return jsonify({'success': True, 'results': []})
         # Search for stocks using DataService for real data
         results = DataService.search_stocks(query)
+        if not results:
+            ticker_registry.mark_no_results(query)
         return jsonify({'success': True, 'results': results})
     except Exception as e:
         logger.error(f"Error searching stocks: {str(e)}")
@@ -477,60 +495,39 @@ def get_quick_prices():
     """Optimized endpoint for quick price updates on homepage"""
     import time
     try:
-        current_app.logger.info("Quick prices endpoint called")
         tickers = request.args.get('tickers', '').split(',')
-        current_app.logger.info(f"Raw tickers: {tickers}")
         tickers = [t.strip() for t in tickers if t.strip()]
-        current_app.logger.info(f"Cleaned tickers: {tickers}")
         
         if not tickers:
             current_app.logger.warning("No tickers provided")
             return jsonify({'error': 'No tickers provided'}), 400
             
-        if len(tickers) > 10:
+        if len(tickers) > MAX_QUICK_PRICE_TICKERS:
             current_app.logger.warning(f"Too many tickers: {len(tickers)}")
             return jsonify({'error': 'Too many tickers requested'}), 400
-            
-        # Use DataService.get_stock_info for real prices
-        results = {}
-        for ticker in tickers:
-            try:
-                stock_info = DataService.get_stock_info(ticker)
-                if stock_info:
-                    results[ticker] = {
-                        'last_price': stock_info.get('last_price'),
-                        'change_percent': stock_info.get('change_percent'),
-                        'change': stock_info.get('change'),
-                        'volume': stock_info.get('volume'),
-                        'name': stock_info.get('name', ticker),
-                        'market_state': stock_info.get('market_state', 'OPEN')
-                    }
-                else:
-                    results[ticker] = {
-                        'last_price': None,
-                        'change_percent': None,
-                        'change': None,
-                        'volume': None,
-                        'name': ticker,
-                        'market_state': 'UNKNOWN'
-                    }
-            except Exception as e:
-                current_app.logger.error(f"Error fetching price for {ticker}: {e}")
-                results[ticker] = {
-                    'last_price': None,
-                    'change_percent': None,
-                    'change': None,
-                    'volume': None,
-                    'name': ticker,
-                    'market_state': 'ERROR'
-                }
-        current_app.logger.info(f"Results generated: {len(results)} tickers")        
-        return jsonify({
+        
+        # Cache hits in one multi-get, misses fetched concurrently until the deadline
+        results, pending = fetch_quotes(tickers, deadline=QUICK_PRICES_DEADLINE)
+        
+        # Delta polling: with since=<version> only quotes that changed are sent
+        since = parse_since(request.args.get('since'))
+        priced = {ticker: quote for ticker, quote in results.items() if quote.get('last_price') is not None}
+        changed, version = quote_versions.changes_since(priced, QUICK_PRICE_FIELDS, 'quick_prices', since)
+        if since is not None:
+            if not changed and not pending:
+                return '', 304, {'X-Quote-Version': str(version)}
+            results = dict(changed, **{ticker: results[ticker] for ticker in pending})
+        
+        response = jsonify({
             'success': True,
             'data': results,
+            'pending': pending,
+            'version': version,
             'cached': False,
             'timestamp': time.time()
         })
+        response.headers['X-Quote-Version'] = str(version)
+        return response
         
     except Exception as e:
         current_app.logger.error(f"Quick prices API error: {str(e)}")
@@ -543,12 +540,21 @@ def get_quick_prices():
 def get_stock_data(symbol):
     """Get stock data for a specific symbol"""
     try:
+        # Known-bad symbols are answered without touching DataService
+        if ticker_registry.is_known_invalid(symbol):
+            response = jsonify({'error': 'Stock not found'})
+            response.status_code = 404
+            return response
+
         stock_data = DataService.get_stock_info(symbol)
         if not stock_data:
+            # Remembered as invalid only when a provider confirms it, not on an outage
+            confirm_unknown(symbol)
             response = jsonify({'error': 'Stock not found'})
             response.status_code = 404
             return response
         
+        ticker_registry.mark_valid(symbol)
         return jsonify(stock_data)
     except Exception as e:
         logger.error(f"Error fetching stock data for {symbol}: {e}")
@@ -559,6 +565,11 @@ def get_stock_data(symbol):
 def get_stock_price(symbol):
     """Get current price for a stock"""
     try:
+        if ticker_registry.is_known_invalid(symbol):
+            response = jsonify({'error': 'Price data not available'})
+            response.status_code = 404
+            return response
+
         price_data = DataService.get_stock_price(symbol)
         if not price_data:
             response = jsonify({'error': 'Price data not available'})
@@ -658,60 +669,13 @@ def homepage_market_data():
             'cached': True
         }
 
-        # Try to get cached data first for speed
-        try:
-            cached_oslo = simple_cache.get('homepage_oslo_data', 'market_data')
-            if cached_oslo:
-                data['oslo'] = cached_oslo[:5]
-        except Exception as e:
-            logger.warning(f"Oslo cache failed: {e}")
-
-        try:
-            cached_global = simple_cache.get('homepage_global_data', 'market_data')
-            if cached_global:
-                data['global'] = cached_global[:5]
-        except Exception as e:
-            logger.warning(f"Global cache failed: {e}")
-
-        try:
-            cached_crypto = simple_cache.get('homepage_crypto_data', 'market_data')
-            if cached_crypto:
-                data['crypto'] = cached_crypto[:3]
-        except Exception as e:
-            logger.warning(f"Crypto cache failed: {e}")
-
-        try:
-            cached_currency = simple_cache.get('homepage_currency_data', 'market_data')
-            if cached_currency:
-                data['currency'] = cached_currency
-        except Exception as e:
-            logger.warning(f"Currency cache failed: {e}")
-
-        # If no cached data available, try to load fresh data quickly
-        if not any([data['oslo'], data['global'], data['crypto']]):
-            data['cached'] = False
-            logger.info("No cached data available, attempting fresh load")
-            try:
-                DataService = get_data_service()
-                if DataService:
-                    oslo_data = DataService.get_oslo_stocks() or []
-                    global_data = DataService.get_global_stocks() or []
-                    crypto_data = DataService.get_crypto_overview() or []
-                    currency_data = DataService.get_currency_overview() or {}
-                    data['oslo'] = list(oslo_data.values())[:5] if isinstance(oslo_data, dict) else oslo_data[:5]
-                    data['global'] = list(global_data.values())[:5] if isinstance(global_data, dict) else global_data[:5]
-                    data['crypto'] = list(crypto_data.values())[:3] if isinstance(crypto_data, dict) else crypto_data[:3]
-                    data['currency'] = currency_data
-                    simple_cache.set('homepage_oslo_data', data['oslo'], 'market_data')
-                    simple_cache.set('homepage_global_data', data['global'], 'market_data')
-                    simple_cache.set('homepage_crypto_data', data['crypto'], 'market_data')
-                    simple_cache.set('homepage_currency_data', data['currency'], 'market_data')
-            except Exception as e:
-                logger.warning(f"Fresh data load failed: {e}")
-                data['oslo'] = []
-                data['global'] = []
-                data['crypto'] = []
-                data['currency'] = {}
+        # Stale-while-revalidate snapshots: only blocks on a cold cache
+        snapshots, loaded = read_snapshots()
+        data['cached'] = not loaded
+        data['oslo'] = (snapshots.get('oslo') or [])[:5]
+        data['global'] = (snapshots.get('global') or [])[:5]
+        data['crypto'] = (snapshots.get('crypto') or [])[:3]
+        data['currency'] = snapshots.get('currency') or {}
 
         logger.info(f"Homepage API served: Oslo={len(data['oslo'])}, Global={len(data['global'])}, Crypto={len(data['crypto'])}, Cached={data['cached']}")
         return jsonify({'success': True, 'data': data})
@@ -964,45 +928,29 @@ def realtime_batch_updates():
         
         if not tickers:
             response = jsonify({'error': 'No tickers provided'})
-        response.status_code = 400
-        return response
+            response.status_code = 400
+            return response
         
-        # Get real-time data for batch update
-        updates = {}
-        for ticker in tickers[:20]:  # Limit to 20 tickers for performance
-            try:
-                # Try to get real stock data
-                stock_data = DataService.get_stock_data(ticker, period='2d')
-                
-                if stock_data is not None and not stock_data.empty:
-                    latest = stock_data.iloc[-1]
-                    previous = stock_data.iloc[-2] if len(stock_data) > 1 else latest
-                    
-                    current_price = latest.get('Close', latest.get('Adj Close', 0))
-                    previous_price = previous.get('Close', previous.get('Adj Close', current_price))
-                    
-                    change = current_price - previous_price
-                    change_percent = (change / previous_price * 100) if previous_price != 0 else 0
-                    
-                    updates[ticker] = {
-                        'price': round(float(current_price), 2),
-                        'change': round(float(change), 2),
-                        'change_percent': round(float(change_percent), 2),
-                        'volume': int(latest.get('Volume', 0)) if latest.get('Volume') else 0
-                    }
-                else:
-                    # Fallback to cached data or skip
-                    logger.warning(f"No data available for {ticker} in batch update")
-                    
-            except Exception as e:
-                logger.warning(f"Error getting batch data for {ticker}: {e}")
-                continue
+        # One multi-ticker download (cached) instead of one history call per ticker
+        updates = get_batch_quotes(tickers[:20])  # Limit to 20 tickers for performance
+        for ticker in tickers[:20]:
+            if ticker not in updates:
+                logger.warning(f"No data available for {ticker} in batch update")
         
-        return jsonify({
+        # Delta polling: with since=<version> only quotes that changed are sent
+        since = parse_since(data.get('since', request.args.get('since')))
+        updates, version = quote_versions.changes_since(updates, BATCH_UPDATE_FIELDS, 'batch_updates', since)
+        if since is not None and not updates:
+            return '', 304, {'X-Quote-Version': str(version)}
+        
+        response = jsonify({
             'success': True,
             'updates': updates,
+            'version': version,
             'timestamp': datetime.utcnow().isoformat()
         })
+        response.headers['X-Quote-Version'] = str(version)
+        return response
     except Exception as e:
         current_app.logger.error(f"Error in batch updates: {e}")
         response = jsonify({'success': False, 'error': 'Could not process batch update'})
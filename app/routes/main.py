@@ -6,6 +6,7 @@ from ..models.favorites import Favorites
 from ..extensions import db
 from ..utils.market_open import is_market_open, is_oslo_bors_open
 from ..utils.access_control import access_required
+from ..utils.market_snapshot import get_snapshots
 from ..services.dashboard_service import DashboardService
 import logging
 import logging
@@ -18,16 +19,6 @@ import hashlib
 import time
 import os
 
-# Import performance optimizations
-try:
-    from ..services.simple_cache import simple_cache
-except ImportError:
-    # Fallback if cache not available
-    class DummyCache:
-        def get(self, key, cache_type='default'): return None
-        def set(self, key, value, cache_type='default'): pass
-    simple_cache = DummyCache()
-
 # Import column fallbacks for database compatibility
 try:
     from ..utils.column_fallbacks import apply_column_fallbacks
@@ -428,17 +419,16 @@ def index():
         'currency': {}
     }
 
-    # Only try cached data for instant loading - no API calls on page load
+    # Only try cached data for instant loading - no API calls on page load.
+    # Stale or missing snapshots are refreshed in the background.
     try:
-        cached_oslo = simple_cache.get('homepage_oslo_data', 'market_data')
-        if cached_oslo:
-            market_data['oslo_stocks'] = cached_oslo[:5]  # Limit for faster rendering
-        cached_global = simple_cache.get('homepage_global_data', 'market_data')
-        if cached_global:
-            market_data['global_stocks'] = cached_global[:5]
-        cached_crypto = simple_cache.get('homepage_crypto_data', 'market_data')
-        if cached_crypto:
-            market_data['crypto_stocks'] = cached_crypto[:5]
+        snapshots = get_snapshots(['oslo', 'global', 'crypto'], block=False)
+        if snapshots.get('oslo'):
+            market_data['oslo_stocks'] = snapshots['oslo'][:5]  # Limit for faster rendering
+        if snapshots.get('global'):
+            market_data['global_stocks'] = snapshots['global'][:5]
+        if snapshots.get('crypto'):
+            market_data['crypto_stocks'] = snapshots['crypto'][:5]
     except Exception as e:
         logger.error(f"Error loading cached market data: {str(e)}")
     # Render homepage with fast-loading market data
@@ -3,7 +3,7 @@ import pandas as pd
 import random
 import time
 import traceback
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app, abort
 from flask import Response
 from flask_login import current_user, login_required
 from datetime import datetime, timedelta
@@ -14,7 +14,13 @@ from ..utils.access_control import access_required, demo_access
 from ..models.favorites import Favorites
 from ..services.notification_service import NotificationService
 from ..utils.exchange_utils import get_exchange_url
-from ..services.simple_cache import simple_cache
+from ..utils.market_snapshot import get_snapshots
+from ..utils.tiered_cache import tiered_cache
+from ..utils.ticker_registry import ticker_registry
+from ..utils.history_store import get_history, get_histories, is_valid_interval, is_valid_period
+from ..utils.chart_payload import build_chart_payload, MIN_POINTS, MAX_POINTS
+from ..utils.upstream_coalescer import call_data_service
+from ..utils.quote_fetcher import confirm_unknown, cached_quote
 
 import logging
 logger = logging.getLogger(__name__)
@@ -22,6 +28,9 @@ logger = logging.getLogger(__name__)
 # Define the stocks Blueprint
 stocks = Blueprint('stocks', __name__)
 
+# call_data_service() fallback telling an open breaker apart from "not found"
+_BREAKER_OPEN = object()
+
 @stocks.route('/list/global', strict_slashes=False)
 @access_required
 def list_global():
@@ -48,23 +57,24 @@ def index():
         currency_data = {}
         
         try:
-            # Try cached data first for speed
-            cached_oslo = simple_cache.get('homepage_oslo_data', 'market_data')
+            # Stale-while-revalidate snapshots, fetched in parallel on a cold cache
+            snapshots = get_snapshots()
+            cached_oslo = snapshots.get('oslo')
             if cached_oslo and isinstance(cached_oslo, list):
                 oslo_stocks = {s.get('symbol', s.get('ticker', f'OSLO_{i}')): s 
                              for i, s in enumerate(cached_oslo[:10]) if isinstance(s, dict)}
                              
-            cached_global = simple_cache.get('homepage_global_data', 'market_data')
+            cached_global = snapshots.get('global')
             if cached_global and isinstance(cached_global, list):
                 global_stocks = {s.get('symbol', s.get('ticker', f'GLOBAL_{i}')): s 
                                for i, s in enumerate(cached_global[:10]) if isinstance(s, dict)}
                                
-            cached_crypto = simple_cache.get('homepage_crypto_data', 'market_data')
+            cached_crypto = snapshots.get('crypto')
             if cached_crypto and isinstance(cached_crypto, list):
                 crypto_data = {s.get('symbol', s.get('ticker', f'CRYPTO_{i}')): s 
                              for i, s in enumerate(cached_crypto[:10]) if isinstance(s, dict)}
                              
-            cached_currency = simple_cache.get('homepage_currency_data', 'market_data')
+            cached_currency = snapshots.get('currency')
             if cached_currency and isinstance(cached_currency, dict):
                 currency_data = cached_currency
                 
@@ -148,23 +158,24 @@ def list_stocks():
         currency_data = {}
         
         try:
-            # Get cached data for quick overview
-            cached_oslo = simple_cache.get('homepage_oslo_data', 'market_data')
+            # Cached data only; a cold cache renders the fallback and refreshes in the background
+            snapshots = get_snapshots(block=False)
+            cached_oslo = snapshots.get('oslo')
             if cached_oslo and isinstance(cached_oslo, list):
                 oslo_stocks = {s.get('symbol', s.get('ticker', f'OSLO_{i}')): s 
                              for i, s in enumerate(cached_oslo[:5]) if isinstance(s, dict)}  # Limit to 5 for overview
                              
-            cached_global = simple_cache.get('homepage_global_data', 'market_data')
+            cached_global = snapshots.get('global')
             if cached_global and isinstance(cached_global, list):
                 global_stocks = {s.get('symbol', s.get('ticker', f'GLOBAL_{i}')): s 
                                for i, s in enumerate(cached_global[:5]) if isinstance(s, dict)}  # Limit to 5 for overview
                                
-            cached_crypto = simple_cache.get('homepage_crypto_data', 'market_data')
+            cached_crypto = snapshots.get('crypto')
             if cached_crypto and isinstance(cached_crypto, list):
                 crypto_data = {s.get('symbol', s.get('ticker', f'CRYPTO_{i}')): s 
                              for i, s in enumerate(cached_crypto[:5]) if isinstance(s, dict)}  # Limit to 5 for overview
                              
-            cached_currency = simple_cache.get('homepage_currency_data', 'market_data')
+            cached_currency = snapshots.get('currency')
             if cached_currency and isinstance(cached_currency, dict):
                 currency_data = dict(list(cached_currency.items())[:5])  # Limit to 5 for overview
                 
@@ -574,32 +585,46 @@ def list_currency():
 @stocks.route('/details/<symbol>')
 def details(symbol):
     try:
-        # Get stock data from DataService
-        stock_info = DataService.get_stock_info(symbol)
-        if not stock_info:
+        # Known-bad symbols are answered without touching DataService
+        if ticker_registry.is_known_invalid(symbol):
             flash(f'Kunne ikke finne data for {symbol}', 'error')
             return redirect(url_for('main.index'))
 
+        # Get stock data from DataService; while its breaker is open the page
+        # is rendered from the last cached quote instead
+        stock_info = call_data_service('get_stock_info', symbol, fallback=_BREAKER_OPEN)
+        degraded = stock_info is _BREAKER_OPEN
+        if degraded:
+            stock_info = cached_quote(symbol) or {'name': symbol}
+            flash(f'Kursdata for {symbol} er midlertidig utilgjengelig, viser sist kjente data.', 'warning')
+        elif not stock_info:
+            # Remembered as invalid only when a provider confirms it, not on an outage
+            confirm_unknown(symbol)
+            flash(f'Kunne ikke finne data for {symbol}', 'error')
+            return redirect(url_for('main.index'))
+        else:
+            ticker_registry.mark_valid(symbol)
+
         # Extract current price
         current_price = stock_info.get('last_price')
         # Technical data
-        technical_data = DataService.get_technical_data(symbol) or {}
+        technical_data = call_data_service('get_technical_data', symbol, fallback={}) or {}
         # AI recommendations
-        ai_recommendations = DataService.get_ai_recommendations(symbol) or []
+        ai_recommendations = call_data_service('get_ai_recommendations', symbol, fallback=[]) or []
         # Company officers
-        company_officers = DataService.get_company_officers(symbol) or []
+        company_officers = call_data_service('get_company_officers', symbol, fallback=[]) or []
         # Financials
-        financials = DataService.get_financials(symbol) or {}
+        financials = call_data_service('get_financials', symbol, fallback={}) or {}
         # Chart data
-        chart_data = DataService.get_chart_data(symbol) or []
+        chart_data = call_data_service('get_chart_data', symbol, fallback=[]) or []
         # Insider trading
-        insider_trading_data = DataService.get_insider_trading(symbol) or []
+        insider_trading_data = call_data_service('get_insider_trading', symbol, fallback=[]) or []
         # Related stocks
         # Use get_related_symbols for real related stocks
-        related_symbols = DataService.get_related_symbols(symbol) or []
+        related_symbols = call_data_service('get_related_symbols', symbol, fallback=[]) or []
         similar_stocks = []
         for rel_symbol in related_symbols:
-            rel_info = DataService.get_stock_info(rel_symbol)
+            rel_info = call_data_service('get_stock_info', rel_symbol, fallback=None)
             if rel_info:
                 similar_stocks.append({
                     'symbol': rel_symbol,
@@ -661,6 +686,7 @@ def details(symbol):
                              company_info=stock,
                              chart_data=chart_data,
                              similar_stocks=similar_stocks,
+                             degraded=degraded,
                              current_user=current_user)
     except Exception as e:
         logger.error(f"Error in stock details for {symbol}: {e}")
@@ -746,7 +772,12 @@ def api_search():
         return jsonify({'error': 'No search query provided'}), 400
     
     try:
-        results = DataService.search_stocks(query)
+        if ticker_registry.has_no_results(query):
+            results = []
+        else:
+            results = DataService.search_stocks(query)
+            if not results:
+                ticker_registry.mark_no_results(query)
         return jsonify({
             'success': True,
             'results': results,
@@ -979,6 +1010,8 @@ def toggle_favorite(symbol):
 @demo_access
 def compare():
     """Stock comparison page - Enhanced with better error handling"""
+    if not is_valid_period(request.args.get('period', '6mo')) or not is_valid_interval(request.args.get('interval', '1d')):
+        abort(400)
 
     try:
         # Support both 'symbols' and 'tickers' parameters for backward compatibility
@@ -1026,7 +1059,9 @@ def compare():
 
         logger.debug(f"Fetching comparative data for symbols: {symbols}")
         try:
-            historical_data = DataService.get_comparative_data(symbols, period=period, interval=interval)
+            historical_data = get_histories(symbols, period=period, interval=interval)
+            if not historical_data:
+                historical_data = DataService.get_comparative_data(symbols, period=period, interval=interval)
             logger.debug(f"Received historical data keys: {list(historical_data.keys()) if historical_data else 'None'}")
         except Exception as e:
             logger.error(f"Error getting comparative data: {e}")
@@ -1078,7 +1113,7 @@ def compare():
         
         for symbol in symbols:
             df = historical_data.get(symbol)
-            info = DataService.get_stock_info(symbol)
+            info = call_data_service('get_stock_info', symbol, fallback=None)
             ticker_names[symbol] = info.get('name', symbol) if info else symbol
 
             if df is None or df.empty:
@@ -1266,8 +1301,7 @@ def prices():
         logger.info("🔄 Loading prices page with performance optimization")
 
         # Use cache for very fast response
-        from ..services.simple_cache import simple_cache
-        cached_data = simple_cache.get('prices_page_data', 'market_data')
+        cached_data = tiered_cache.get('prices_page_data', 'market_data')
         if cached_data:
             logger.info("✅ Returning cached prices data")
             return render_template('stocks/prices.html', **cached_data)
@@ -1313,7 +1347,7 @@ def prices():
         }
 
         # Cache for 5 minutes for faster subsequent loads
-        simple_cache.set('prices_page_data', render_data, 'market_data')
+        tiered_cache.set('prices_page_data', render_data, 'market_data')
 
         logger.info(f"✅ Rendering template with optimized data")
         print(f"[DEBUG] Data to template: Oslo={len(render_data['market_data']['oslo_stocks'])}, Global={len(render_data['market_data']['global_stocks'])}")
@@ -1339,59 +1373,23 @@ def prices():
 @stocks.route('/api/chart-data/<symbol>')
 def api_chart_data(symbol):
     """API endpoint for stock chart data"""
+    if not is_valid_period(request.args.get('period', '30d')) or not is_valid_interval(request.args.get('interval', '1d')):
+        return jsonify({'error': 'Ugyldig periode eller intervall'}), 400
+    # Optional LTTB downsampling to about the chart's pixel width
+    max_points = request.args.get('max_points', type=int)
+    if 'max_points' in request.args and not (max_points and MIN_POINTS <= max_points <= MAX_POINTS):
+        return jsonify({'error': f'max_points må være mellom {MIN_POINTS} og {MAX_POINTS}'}), 400
+
     try:
         # Get historical data
         period = request.args.get('period', '30d')  # Default 30 days
         interval = request.args.get('interval', '1d')  # Default daily
         
-        # Get data from DataService
-        df = DataService.get_stock_data(symbol, period=period, interval=interval)
+        # Local history store, refreshed from DataService when needed
+        df = get_history(symbol, period=period, interval=interval)
         
-        if df is None or (hasattr(df, 'empty') and df.empty):
-            # Markedsdata utilgjengelig - kontakter alternative kilder
-            chart_data = {
-                'dates': [],
-                'prices': [],
-                'volumes': [],
-                'currency': 'NOK' if 'OSL:' in symbol else 'USD'
-            }
-        else:
-            # Convert DataFrame to chart format
-            df = df.reset_index()
-            dates = []
-            prices = []
-            volumes = []
-            
-            for index, row in df.iterrows():
-                # Handle different date column names
-                if 'Date' in row:
-                    date_val = row['Date']
-                elif 'Datetime' in row:
-                    date_val = row['Datetime'] 
-                else:
-                    # Use index if no date column
-                    date_val = row.name if hasattr(row, 'name') else index
-                
-                # Format date
-                if hasattr(date_val, 'strftime'):
-                    dates.append(date_val.strftime('%Y-%m-%d'))
-                else:
-                    dates.append(str(date_val))
-                
-                # Get price (prefer Close, then Open)
-                price = row.get('Close', row.get('Open', 100))
-                prices.append(float(price) if price else 100.0)
-                
-                # Get volume
-                volume = row.get('Volume', 100000)
-                volumes.append(int(volume) if volume else 100000)
-            
-            chart_data = {
-                'dates': dates,
-                'prices': prices,
-                'volumes': volumes,
-                'currency': 'USD' if not 'OSL:' in symbol else 'NOK'
-            }
+        chart_data = build_chart_payload(df, max_points=max_points)
+        chart_data['currency'] = 'NOK' if 'OSL:' in symbol else 'USD'
         
         return jsonify(chart_data)
         
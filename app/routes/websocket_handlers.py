@@ -0,0 +1,232 @@
+"""
+WebSocket price channel for Aksjeradar
+
+Clients connect to the /market-data namespace and subscribe to tickers
+(`subscribe_quote` / `unsubscribe_quote` with {"symbols": [...]}). A
+background task in every worker pushes quotes to its own clients, by sid:
+
+- coalescing: at most one update per ticker per PUSH_INTERVAL, and only for
+  tickers whose quote changed, sent as one `quote_batch` per client
+- backpressure: a client gets its next batch only after acknowledging the
+  previous one; changes in between are merged into a single pending batch,
+  and clients that stop acknowledging are disconnected
+
+The client connects with the websocket transport only, so gunicorn must run
+an async worker class (see gunicorn.conf.py); with the default sync worker
+the socket never connects and the page falls back to polling.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+
+from flask import current_app, request
+from flask_socketio import emit
+
+from ..extensions import socketio
+from ..utils.ticker_registry import ticker_registry, normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = '/market-data'
+# Seconds between pushes (at most one update per ticker per interval)
+PUSH_INTERVAL = float(os.getenv('SOCKET_PUSH_INTERVAL', 2))
+MAX_SYMBOLS_PER_CLIENT = 50
+# Clients that leave a batch unacknowledged this long are disconnected
+STALL_TIMEOUT = 30
+
+
+class PriceChannel:
+    """Subscriptions, change detection and per-client flow control"""
+
+    def __init__(self, stall_timeout: float = STALL_TIMEOUT):
+        self.stall_timeout = stall_timeout
+        self.subscriptions: Dict[str, Set[str]] = {}
+        self.pending: Dict[str, Dict[str, Dict]] = {}
+        self.awaiting: Dict[str, float] = {}
+        self.last_quotes: Dict[str, Tuple] = {}
+        self.lock = threading.Lock()
+        self.stats = {'batches': 0, 'updates': 0, 'coalesced': 0, 'stalled': 0}
+
+    def subscribe(self, sid: str, symbols: Iterable[str]) -> List[str]:
+        """Add subscriptions; returns the symbols accepted"""
+        with self.lock:
+            current = self.subscriptions.setdefault(sid, set())
+            accepted = []
+            for symbol in symbols:
+                symbol = normalize_symbol(symbol)
+                if symbol in current:
+                    accepted.append(symbol)
+                    continue
+                if len(current) >= MAX_SYMBOLS_PER_CLIENT or ticker_registry.is_known_invalid(symbol):
+                    continue
+                current.add(symbol)
+                accepted.append(symbol)
+            return accepted
+
+    def unsubscribe(self, sid: str, symbols: Iterable[str]) -> List[str]:
+        with self.lock:
+            current = self.subscriptions.get(sid, set())
+            removed = [normalize_symbol(symbol) for symbol in symbols if normalize_symbol(symbol) in current]
+            current.difference_update(removed)
+            for symbol in removed:
+                self.pending.get(sid, {}).pop(symbol, None)
+            return removed
+
+    def remove_client(self, sid: str):
+        with self.lock:
+            self.subscriptions.pop(sid, None)
+            self.pending.pop(sid, None)
+            self.awaiting.pop(sid, None)
+
+    def symbols(self) -> Set[str]:
+        """Every ticker at least one client of this worker watches"""
+        with self.lock:
+            return set().union(*self.subscriptions.values()) if self.subscriptions else set()
+
+    def snapshot_for(self, sid: str) -> Dict[str, Dict]:
+        """Last known quotes for a client's tickers (sent right after subscribing)"""
+        with self.lock:
+            return {
+                symbol: dict(zip(('price', 'change', 'change_percent', 'volume'), self.last_quotes[symbol]))
+                for symbol in self.subscriptions.get(sid, ())
+                if symbol in self.last_quotes
+            }
+
+    def collect(self, quotes: Dict[str, Dict]) -> int:
+        """Queue changed quotes for the clients watching them; returns tickers changed"""
+        changed = {}
+        with self.lock:
+            for symbol, quote in quotes.items():
+                values = (quote.get('price'), quote.get('change'), quote.get('change_percent'), quote.get('volume'))
+                if self.last_quotes.get(symbol) != values:
+                    self.last_quotes[symbol] = values
+                    changed[symbol] = quote
+            if not changed:
+                return 0
+            for sid, symbols in self.subscriptions.items():
+                for symbol in symbols.intersection(changed):
+                    queue = self.pending.setdefault(sid, {})
+                    if symbol in queue:
+                        self.stats['coalesced'] += 1
+                    queue[symbol] = changed[symbol]
+        return len(changed)
+
+    def take_batches(self, now: float = None) -> Tuple[Dict[str, Dict[str, Dict]], List[str]]:
+        """
+        Batches ready to send, and clients that stalled
+
+        Clients still working on their previous batch keep accumulating
+        (newer quotes replace older ones) until they acknowledge it.
+        """
+        now = now or time.time()
+        batches, stalled = {}, []
+        with self.lock:
+            for sid in list(self.pending):
+                sent_at = self.awaiting.get(sid)
+                if sent_at is not None:
+                    if now - sent_at > self.stall_timeout:
+                        stalled.append(sid)
+                    continue
+                batch = self.pending.pop(sid)
+                if batch:
+                    batches[sid] = batch
+                    self.awaiting[sid] = now
+        self.stats['batches'] += len(batches)
+        self.stats['updates'] += sum(len(batch) for batch in batches.values())
+        self.stats['stalled'] += len(stalled)
+        return batches, stalled
+
+    def ack(self, sid: str):
+        with self.lock:
+            self.awaiting.pop(sid, None)
+
+
+price_channel = PriceChannel()
+
+_pusher_pid = None
+_pusher_lock = threading.Lock()
+
+
+def _push_loop(app):
+    """Per-worker pusher: read latest quotes, coalesce, send"""
+    from ..utils.quote_batch import get_batch_quotes
+
+    while True:
+        socketio.sleep(PUSH_INTERVAL)
+        symbols = price_channel.symbols()
+        if not symbols:
+            continue
+        try:
+            with app.app_context():
+                price_channel.collect(get_batch_quotes(sorted(symbols)))
+        except Exception as e:
+            logger.warning(f"Price push failed: {e}")
+            continue
+
+        batches, stalled = price_channel.take_batches()
+        for sid, batch in batches.items():
+            socketio.emit(
+                'quote_batch',
+                {'quotes': batch, 'timestamp': time.time()},
+                to=sid,
+                namespace=NAMESPACE,
+                callback=lambda *args, sid=sid: price_channel.ack(sid)
+            )
+        for sid in stalled:
+            logger.info(f"Disconnecting slow price client {sid}")
+            price_channel.remove_client(sid)
+            socketio.server.disconnect(sid, namespace=NAMESPACE)
+
+
+def _ensure_pusher():
+    """Start the pusher once per worker process"""
+    global _pusher_pid
+    with _pusher_lock:
+        if _pusher_pid == os.getpid():
+            return
+        _pusher_pid = os.getpid()
+    socketio.start_background_task(_push_loop, current_app._get_current_object())
+
+
+def _requested_symbols(data) -> List[str]:
+    data = data or {}
+    symbols = data.get('symbols') or data.get('tickers') or []
+    if isinstance(symbols, str):
+        symbols = symbols.split(',')
+    return [symbol for symbol in symbols if isinstance(symbol, str) and symbol.strip()]
+
+
+@socketio.on('connect', namespace=NAMESPACE)
+def handle_connect():
+    _ensure_pusher()
+    emit('connected', {'push_interval': PUSH_INTERVAL, 'max_symbols': MAX_SYMBOLS_PER_CLIENT})
+
+
+@socketio.on('disconnect', namespace=NAMESPACE)
+def handle_disconnect():
+    price_channel.remove_client(request.sid)
+
+
+@socketio.on('subscribe_quote', namespace=NAMESPACE)
+def handle_subscribe(data):
+    accepted = price_channel.subscribe(request.sid, _requested_symbols(data))
+    emit('subscription_response', {'subscribed': accepted})
+    snapshot = price_channel.snapshot_for(request.sid)
+    if snapshot:
+        emit('quote_batch', {'quotes': snapshot, 'timestamp': time.time()})
+
+
+@socketio.on('unsubscribe_quote', namespace=NAMESPACE)
+def handle_unsubscribe(data):
+    removed = price_channel.unsubscribe(request.sid, _requested_symbols(data))
+    emit('subscription_response', {'unsubscribed': removed})
+
+
+def get_channel_stats() -> Dict:
+    stats = dict(price_channel.stats)
+    stats['clients'] = len(price_channel.subscriptions)
+    stats['symbols'] = len(price_channel.symbols())
+    return stats
@@ -1,27 +1,91 @@
 // Enhanced real-time functionality for Aksjeradar
 
+// Served from our own static files (base.html passes the versioned URL)
+const SOCKET_IO_URL = '/static/js/vendor/socket.io.min.js';
+const PRICE_NAMESPACE = '/market-data';
+
 class RealtimeManager {
-    constructor() {
+    constructor(settings = window.AKSJERADAR_REALTIME || {}) {
         this.websocket = null;
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 5;
         this.reconnectDelay = 1000;
         this.subscribedTickers = new Set();
         this.priceUpdateCallbacks = new Map();
-        this.useWebSocket = false; // Disabled - WebSocket not implemented on server
+        // Price channel served by routes/websocket_handlers.py; only enabled by the
+        // server when it runs an async worker that can hold websockets
+        this.useWebSocket = settings.useWebSocket === true;
+        this.socketIoUrl = settings.socketIoUrl || SOCKET_IO_URL;
         this.fallbackInterval = null;
+        this.pollIntervalMs = 10000;
+        this.quoteVersion = null; // Last version seen by polling (delta updates)
         this.connectionStatus = 'disconnected';
         this.statusElement = null;
     }
 
     init() {
-        console.log('🚀 Initializing RealtimeManager (Polling Mode)');
-        
         // Remove or hide connection status messages
         this.hideConnectionStatus();
         
-        // Always use polling since WebSocket is not implemented
+        // Poll until the socket is connected, so prices stay fresh if it never is
         this.setupFallbackPolling();
+        if (this.useWebSocket) {
+            this.loadSocketIo()
+                .then(() => this.connectWebSocket())
+                .catch(() => {});
+        }
+    }
+
+    loadSocketIo() {
+        if (window.io) return Promise.resolve();
+        return new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = this.socketIoUrl;
+            script.onload = resolve;
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+
+    connectWebSocket() {
+        // One socket per tab; the server pushes coalesced batches for subscribed tickers
+        this.websocket = window.io(PRICE_NAMESPACE, {
+            transports: ['websocket'],
+            reconnectionAttempts: this.maxReconnectAttempts,
+            reconnectionDelay: this.reconnectDelay
+        });
+        
+        this.websocket.on('connect', () => {
+            this.connectionStatus = 'connected';
+            this.reconnectAttempts = 0;
+            this.stopFallbackPolling();
+            this.sendSubscriptions('subscribe_quote', [...this.subscribedTickers]);
+        });
+        
+        this.websocket.on('quote_batch', (data, ack) => {
+            const quotes = (data && data.quotes) || {};
+            Object.keys(quotes).forEach(ticker => this.handlePriceUpdate(ticker, quotes[ticker]));
+            // Acknowledge so the server sends the next batch (backpressure)
+            if (typeof ack === 'function') ack();
+        });
+        
+        this.websocket.on('disconnect', () => {
+            // Poll while socket.io reconnects (or after it gives up)
+            this.connectionStatus = 'disconnected';
+            this.quoteVersion = null;
+            this.setupFallbackPolling();
+        });
+        
+        this.websocket.io.on('reconnect_failed', () => {
+            // Give up on the socket; polling started on disconnect keeps running
+            this.websocket = null;
+        });
+    }
+
+    sendSubscriptions(event, tickers) {
+        if (this.websocket && this.websocket.connected && tickers.length) {
+            this.websocket.emit(event, { symbols: tickers });
+        }
     }
 
     hideConnectionStatus() {
@@ -39,17 +103,13 @@ class RealtimeManager {
     }
 
     setupFallbackPolling() {
-        console.log('📊 Using polling for real-time updates');
-        
         // Clear any existing interval
-        if (this.fallbackInterval) {
-            clearInterval(this.fallbackInterval);
-        }
+        this.stopFallbackPolling();
         
-        // Poll for updates every 5 seconds
+        // One batched request for all tickers per interval
         this.fallbackInterval = setInterval(() => {
             this.pollPriceUpdates();
-        }, 5000);
+        }, this.pollIntervalMs);
         
         // Initial poll
         this.pollPriceUpdates();
@@ -58,25 +118,50 @@ class RealtimeManager {
         this.connectionStatus = 'connected';
     }
 
+    stopFallbackPolling() {
+        if (this.fallbackInterval) {
+            clearInterval(this.fallbackInterval);
+            this.fallbackInterval = null;
+        }
+    }
+
     async pollPriceUpdates() {
         if (this.subscribedTickers.size === 0) return;
         
-        for (const ticker of this.subscribedTickers) {
-            try {
-                const response = await fetch(`/api/realtime/price/${ticker}`);
-                if (response.ok) {
-                    const data = await response.json();
-                    this.handlePriceUpdate(ticker, data);
-                }
-            } catch (error) {
-                // Silently handle errors - no console logging
-                // This prevents "Tilkobling tapt" messages
+        try {
+            const tickers = [...this.subscribedTickers].join(',');
+            let url = `/api/stocks/quick-prices?tickers=${encodeURIComponent(tickers)}`;
+            if (this.quoteVersion !== null) {
+                // Only quotes that changed since the last poll; 304 when none did
+                url += `&since=${this.quoteVersion}`;
             }
+            const response = await fetch(url);
+            if (response.status === 304 || !response.ok) return;
+            const payload = await response.json();
+            if (payload.version !== undefined) this.quoteVersion = payload.version;
+            const quotes = payload.data || {};
+            Object.keys(quotes).forEach(ticker => {
+                const quote = quotes[ticker];
+                if (quote.last_price === null || quote.last_price === undefined) return;
+                this.handlePriceUpdate(ticker, {
+                    price: quote.last_price,
+                    change: quote.change,
+                    change_percent: quote.change_percent,
+                    volume: quote.volume
+                });
+            });
+        } catch (error) {
+            // Silently handle errors - no console logging
+            // This prevents "Tilkobling tapt" messages
         }
     }
 
     subscribe(ticker, callback) {
-        this.subscribedTickers.add(ticker);
+        if (!this.subscribedTickers.has(ticker)) {
+            this.subscribedTickers.add(ticker);
+            this.quoteVersion = null; // New ticker needs a full poll
+            this.sendSubscriptions('subscribe_quote', [ticker]);
+        }
         
         if (!this.priceUpdateCallbacks.has(ticker)) {
             this.priceUpdateCallbacks.set(ticker, new Set());
@@ -91,6 +176,7 @@ class RealtimeManager {
             if (this.priceUpdateCallbacks.get(ticker).size === 0) {
                 this.priceUpdateCallbacks.delete(ticker);
                 this.subscribedTickers.delete(ticker);
+                this.sendSubscriptions('unsubscribe_quote', [ticker]);
             }
         }
     }
@@ -168,9 +254,12 @@ class RealtimeManager {
 
     destroy() {
         // Clear polling interval
-        if (this.fallbackInterval) {
-            clearInterval(this.fallbackInterval);
-            this.fallbackInterval = null;
+        this.stopFallbackPolling();
+        
+        // Close the price socket
+        if (this.websocket) {
+            this.websocket.close();
+            this.websocket = null;
         }
         
         // Clear callbacks
@@ -5,15 +5,22 @@ from app.services.integrations import IntegrationService, WeeklyReportService
 from app.models import User
 from app.models.watchlist import Watchlist
 from app.services.ai_service import AIService
+from app.utils.redis_pool import get_redis_url
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Configure Celery
+# Streamed prices older than this fall back to a direct lookup (seconds)
+TICK_PRICE_TTL = 600
+
+# Configure Celery. The broker lives in its own Redis db (REDIS_DB_CELERY,
+# default 2); tasks queued in db 0 before the move are not picked up, so
+# drain the queues before deploying or set REDIS_DB_CELERY=0 until they are
 celery = Celery('aksjeradar')
 celery.conf.update(
-    broker_url=os.getenv('REDIS_URL', 'redis://localhost:6379'),
-    result_backend=os.getenv('REDIS_URL', 'redis://localhost:6379'),
+    broker_url=get_redis_url('celery'),
+    result_backend=get_redis_url('celery'),
+    broker_pool_limit=int(os.getenv('CELERY_BROKER_POOL_LIMIT', 5)),
     task_serializer='json',
     accept_content=['json'],
     result_serializer='json',
@@ -261,9 +268,56 @@ def cleanup_old_data():
         logger.error(f"Error in cleanup task: {e}")
         raise
 
+@celery.task(name='app.tasks.consume_quote_ticks')
+def consume_quote_ticks(max_batches: int = 20):
+    """Read new quote ticks from the stream (shared 'celery' consumer group)"""
+    try:
+        from app.utils.quote_stream import QuoteStreamConsumer
+        from app.utils.tiered_cache import tiered_cache
+        
+        def store(quotes):
+            tiered_cache.set_many(
+                {f"tick:{symbol}": quote for symbol, quote in quotes.items()},
+                'stocks',
+                ttl=TICK_PRICE_TTL
+            )
+        
+        consumer = QuoteStreamConsumer('celery', store, block_ms=0)
+        consumer.ensure_group()
+        # Ticks delivered to this worker before a crash first, then ticks
+        # left by recycled worker processes, then new ones
+        while consumer.read_batch(pending=True):
+            pass
+        consumer.claim_idle()
+        for _ in range(max_batches):
+            if not consumer.read_batch():
+                break
+        return consumer.stats
+        
+    except Exception as e:
+        logger.error(f"Error in consume_quote_ticks task: {e}")
+        raise
+
+def get_latest_tick_price(symbol: str):
+    """Latest streamed price for a symbol, or None"""
+    try:
+        from app.utils.tiered_cache import tiered_cache
+        for candidate in (symbol, f"{symbol}.OL"):
+            tick = tiered_cache.get(f"tick:{candidate}", 'stocks')
+            if tick and tick.get('price') is not None:
+                return float(tick['price'])
+    except Exception as e:
+        logger.debug(f"No streamed price for {symbol}: {e}")
+    return None
+
 def get_current_stock_price(symbol: str) -> float:
     """Get current stock price - implement with your preferred data source"""
     try:
+        # Prices from the quote stream cost no upstream calls
+        streamed_price = get_latest_tick_price(symbol)
+        if streamed_price is not None:
+            return streamed_price
+        
         # This is a placeholder - replace with actual price fetching logic
         # You could use yfinance, Alpha Vantage, or your existing price service
         
@@ -305,6 +359,11 @@ celery.conf.beat_schedule = {
         'schedule': 300.0,  # Every 5 minutes
         'options': {'queue': 'alerts'}
     },
+    'consume-quote-ticks': {
+        'task': 'app.tasks.consume_quote_ticks',
+        'schedule': 30.0,  # Every 30 seconds
+        'options': {'queue': 'alerts'}
+    },
     'cleanup-old-data': {
         'task': 'app.tasks.cleanup_old_data',
         'schedule': 86400.0,  # Daily
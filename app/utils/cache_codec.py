@@ -0,0 +1,229 @@
+"""
+Binary cache codec for Aksjeradar
+
+Encodes cache values compactly while keeping their types:
+
+- plain structures (dicts, lists, numbers, strings) as msgpack
+- pandas DataFrames/Series as Arrow IPC (pickle if pyarrow is missing)
+- NumPy arrays as raw .npy buffers
+- datetimes, dates, Decimals and sets as typed msgpack extensions
+- payloads above a size threshold compressed with zstd
+
+msgpack, pyarrow and zstandard are optional; without them the codec falls
+back to pickle and no compression. Values written before the codec existed
+(JSON text or bare pickle) are still decoded.
+"""
+
+import io
+import json
+import logging
+import os
+import pickle
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    pd = None
+    PANDAS_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    ARROW_AVAILABLE = False
+
+# Payloads larger than this are zstd-compressed when zstandard is installed
+DEFAULT_COMPRESS_THRESHOLD = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', 4096))
+DEFAULT_COMPRESS_LEVEL = 3
+
+# Header: 2 magic bytes, 1 format byte, 1 flags byte. The magic can never
+# start legacy values (JSON text or pickle, which begins with 0x80).
+MAGIC = b'\x00\xac'
+FORMAT_MSGPACK = 1
+FORMAT_PICKLE = 2
+FLAG_ZSTD = 0x01
+
+# msgpack extension type codes
+EXT_DATAFRAME_ARROW = 1
+EXT_DATAFRAME_PICKLE = 2
+EXT_SERIES = 3
+EXT_NDARRAY = 4
+EXT_DATETIME = 5
+EXT_DATE = 6
+EXT_TIMESTAMP = 7
+EXT_DECIMAL = 8
+EXT_SET = 9
+EXT_TUPLE = 10
+EXT_PICKLE = 127
+
+
+class CacheCodec:
+    """Type-preserving serializer used by the cache layers"""
+
+    def __init__(self, compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+                 compress_level: int = DEFAULT_COMPRESS_LEVEL):
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self._compressor = zstandard.ZstdCompressor(level=compress_level) if ZSTD_AVAILABLE else None
+        self._decompressor = zstandard.ZstdDecompressor() if ZSTD_AVAILABLE else None
+
+    def encode(self, value: Any) -> bytes:
+        """Serialize value to bytes"""
+        if MSGPACK_AVAILABLE:
+            fmt = FORMAT_MSGPACK
+            payload = msgpack.packb(value, default=self._pack_default, use_bin_type=True, strict_types=True)
+        else:
+            fmt = FORMAT_PICKLE
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+        flags = 0
+        if self._compressor is not None and len(payload) >= self.compress_threshold:
+            payload = self._compressor.compress(payload)
+            flags |= FLAG_ZSTD
+
+        return MAGIC + bytes((fmt, flags)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        """Deserialize bytes produced by encode() (or a legacy JSON/pickle value)"""
+        if not data.startswith(MAGIC):
+            return self._decode_legacy(data)
+
+        fmt, flags = data[2], data[3]
+        payload = data[4:]
+
+        if flags & FLAG_ZSTD:
+            if self._decompressor is None:
+                raise ValueError("zstandard is required to decode this cache entry")
+            payload = self._decompressor.decompress(payload)
+
+        if fmt == FORMAT_MSGPACK:
+            if not MSGPACK_AVAILABLE:
+                raise ValueError("msgpack is required to decode this cache entry")
+            return msgpack.unpackb(payload, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+        if fmt == FORMAT_PICKLE:
+            return pickle.loads(payload)
+
+        raise ValueError(f"Unknown cache codec format {fmt}")
+
+    @staticmethod
+    def _decode_legacy(data: bytes) -> Any:
+        """Values written by the old JSON-then-pickle serializer"""
+        try:
+            return json.loads(data.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return pickle.loads(data)
+
+    def _pack_default(self, obj: Any):
+        """Map types msgpack does not know to extension types"""
+        # strict_types sends subclasses (e.g. pandas Timestamp) through here
+        if PANDAS_AVAILABLE:
+            if isinstance(obj, pd.DataFrame):
+                return self._pack_frame(obj)
+            if isinstance(obj, pd.Series):
+                return msgpack.ExtType(EXT_SERIES, self._pack_frame_bytes(obj.to_frame(name=obj.name if obj.name is not None else '__series__')))
+            if isinstance(obj, pd.Timestamp):
+                return msgpack.ExtType(EXT_TIMESTAMP, obj.isoformat().encode('utf-8'))
+
+        if NUMPY_AVAILABLE:
+            if isinstance(obj, np.ndarray) and obj.dtype != object:
+                buffer = io.BytesIO()
+                np.save(buffer, obj, allow_pickle=False)
+                return msgpack.ExtType(EXT_NDARRAY, buffer.getvalue())
+            if isinstance(obj, np.generic):
+                return obj.item()
+
+        if isinstance(obj, datetime):
+            return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode('utf-8'))
+        if isinstance(obj, date):
+            return msgpack.ExtType(EXT_DATE, obj.isoformat().encode('utf-8'))
+        if isinstance(obj, Decimal):
+            return msgpack.ExtType(EXT_DECIMAL, str(obj).encode('utf-8'))
+        if isinstance(obj, (set, frozenset)):
+            return msgpack.ExtType(EXT_SET, msgpack.packb(list(obj), default=self._pack_default, use_bin_type=True, strict_types=True))
+        if isinstance(obj, tuple):
+            return msgpack.ExtType(EXT_TUPLE, msgpack.packb(list(obj), default=self._pack_default, use_bin_type=True, strict_types=True))
+
+        # Subclasses of builtins (str/int/dict enums etc.) and anything else
+        return msgpack.ExtType(EXT_PICKLE, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _pack_frame(self, frame):
+        if ARROW_AVAILABLE:
+            try:
+                return msgpack.ExtType(EXT_DATAFRAME_ARROW, self._pack_frame_bytes(frame))
+            except Exception as e:
+                # Mixed-type object columns are not always Arrow-convertible
+                logger.debug(f"Arrow encoding failed, pickling DataFrame: {e}")
+        return msgpack.ExtType(EXT_DATAFRAME_PICKLE, pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _pack_frame_bytes(frame) -> bytes:
+        if not ARROW_AVAILABLE:
+            return pickle.dumps(frame, protocol=pickle.HIGHEST_PROTOCOL)
+        table = pa.Table.from_pandas(frame, preserve_index=True)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    @staticmethod
+    def _unpack_frame_bytes(data: bytes):
+        if data[:1] == b'\x80':  # written without pyarrow
+            return pickle.loads(data)
+        return pa.ipc.open_stream(data).read_all().to_pandas()
+
+    def _ext_hook(self, code: int, data: bytes):
+        if code == EXT_DATAFRAME_ARROW:
+            return self._unpack_frame_bytes(data)
+        if code == EXT_DATAFRAME_PICKLE or code == EXT_PICKLE:
+            return pickle.loads(data)
+        if code == EXT_SERIES:
+            frame = self._unpack_frame_bytes(data)
+            series = frame.iloc[:, 0]
+            return series.rename(None) if series.name == '__series__' else series
+        if code == EXT_NDARRAY:
+            return np.load(io.BytesIO(data), allow_pickle=False)
+        if code == EXT_TIMESTAMP:
+            return pd.Timestamp(data.decode('utf-8'))
+        if code == EXT_DATETIME:
+            return datetime.fromisoformat(data.decode('utf-8'))
+        if code == EXT_DATE:
+            return date.fromisoformat(data.decode('utf-8'))
+        if code == EXT_DECIMAL:
+            return Decimal(data.decode('utf-8'))
+        if code == EXT_SET:
+            return set(msgpack.unpackb(data, ext_hook=self._ext_hook, raw=False, strict_map_key=False))
+        if code == EXT_TUPLE:
+            return tuple(msgpack.unpackb(data, ext_hook=self._ext_hook, raw=False, strict_map_key=False))
+        return msgpack.ExtType(code, data)
+
+
+# Default codec shared by the cache layers
+default_codec = CacheCodec()
@@ -1,35 +1,86 @@
-import redis
-import json
-import pickle
 import hashlib
+import json
+import logging
+import os
+import sys
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Any, Optional, Dict, List
-from flask import current_app
+from typing import Any, Callable, Optional, Dict, List, Tuple, Union
+from flask import current_app, has_app_context
 import threading
+import uuid
 from functools import wraps
+from .single_flight import cached_call, single_flight
+from .cache_codec import default_codec
+from .cache_tags import register_tags, invalidate_tags, registered_tags, namespace_of, pattern_namespace
+from .redis_pool import get_redis
+
+# Per-worker memory budget for the local tier (bytes). Every gunicorn worker
+# holds its own copy, so keep this well below worker RSS limits.
+DEFAULT_LOCAL_MAX_BYTES = int(os.getenv('CACHE_LOCAL_MAX_BYTES', 64 * 1024 * 1024))
+DEFAULT_LOCAL_MAX_ENTRIES = int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', 10000))
+
+# Local TTL cap while the invalidation bus is connected, and the short cap
+# used when it is not (other workers' deletes may then go unnoticed)
+DEFAULT_LOCAL_MAX_TTL = int(os.getenv('CACHE_LOCAL_MAX_TTL', 3600))
+INCOHERENT_LOCAL_MAX_TTL = 60
+
+# Redis pub/sub channel carrying local-tier invalidations between workers
+INVALIDATION_CHANNEL = 'cache:invalidate'
+
+# Marker for stale-while-revalidate envelopes
+SWR_MARKER = '__swr__'
+
+logger = logging.getLogger(__name__)
 
 class CacheManager:
     """Advanced multi-layer cache management system"""
     
-    def __init__(self, redis_url=None):
+    def __init__(self, redis_url=None, max_local_bytes=None, max_local_entries=None, codec=None):
         try:
-            self.redis_client = redis.Redis.from_url(redis_url or 'redis://localhost:6379', decode_responses=False)
+            # Shared, lazily connecting pool - nothing touches Redis at import
+            self.redis_client = get_redis('cache', redis_url)
             self.redis_available = True
         except:
             self.redis_client = None
             self.redis_available = False
             
-        self.local_cache = {}
+        # Local tier: key -> (value, expires_at, size_bytes, namespace, tags), kept in
+        # LRU order (oldest first) so eviction is a single popitem().
+        self.local_cache = OrderedDict()
+        self.max_local_bytes = max_local_bytes or DEFAULT_LOCAL_MAX_BYTES
+        self.max_local_entries = max_local_entries or DEFAULT_LOCAL_MAX_ENTRIES
+        self.local_bytes = 0
+        self.namespace_usage = {}  # namespace -> [entries, bytes]
         self.cache_stats = {
             'hits': 0,
             'misses': 0,
             'sets': 0,
             'deletes': 0,
             'local_hits': 0,
-            'redis_hits': 0
+            'redis_hits': 0,
+            'local_evictions': 0,
+            'local_expirations': 0,
+            'local_rejected': 0,
+            'swr_stale_served': 0,
+            'swr_refreshes': 0,
+            'swr_refresh_errors': 0
         }
         self.lock = threading.RLock()
+        self._swr_refreshing = set()
+        self.codec = codec or default_codec
+        
+        # Invalidation bus (started lazily per process, see _ensure_listener)
+        self.max_local_ttl = DEFAULT_LOCAL_MAX_TTL
+        self.bus_connected = False
+        self._listener_pid = None
+        self._origin = None
+        self.bus_stats = {
+            'published': 0,
+            'received': 0,
+            'reconnects': 0
+        }
         
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache with multi-layer lookup"""
@@ -43,10 +94,10 @@ class CacheManager:
             
             # Check Redis cache if available
             if self.redis_available:
-                redis_result = self._get_redis(key)
+                redis_result, remaining_ttl = self._get_redis(key)
                 if redis_result is not None:
-                    # Store in local cache for faster access
-                    self._set_local(key, redis_result, ttl=300)  # 5 min local TTL
+                    # Store in local cache for faster access, never beyond the Redis expiry
+                    self._set_local(key, redis_result, ttl=self._local_ttl(remaining_ttl))
                     self.cache_stats['redis_hits'] += 1
                     self.cache_stats['hits'] += 1
                     return redis_result
@@ -60,20 +111,26 @@ class CacheManager:
             self.cache_stats['misses'] += 1
             return None
     
-    def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
-        """Set value in cache with multi-layer storage"""
+    def set(self, key: str, value: Any, ttl: int = 3600, tags: Optional[List[str]] = None) -> bool:
+        """
+        Set value in cache with multi-layer storage
+        
+        Every key is tagged with its namespace (prefix before ':'); extra
+        tags allow invalidating related keys together via invalidate_tags().
+        """
         try:
             success = False
+            tags = tuple(tags or ())
             
             # Set in Redis with longer TTL if available
             if self.redis_available:
-                redis_success = self._set_redis(key, value, ttl)
+                redis_success = self._set_redis(key, value, ttl, tags)
                 if redis_success:
                     success = True
             
-            # Set in local cache with shorter TTL
-            local_ttl = min(ttl, 300)  # Max 5 minutes for local cache
-            local_success = self._set_local(key, value, local_ttl)
+            # Set in local cache, capped while other workers can't notify us
+            local_ttl = self._local_ttl(ttl)
+            local_success = self._set_local(key, value, local_ttl, tags)
             if local_success:
                 success = True
             
@@ -96,6 +153,7 @@ class CacheManager:
                 redis_success = self._delete_redis(key)
                 if redis_success:
                     success = True
+                self._publish_invalidation('keys', [key])
                     
             local_success = self._delete_local(key)
             if local_success:
@@ -111,28 +169,191 @@ class CacheManager:
                 current_app.logger.error(f"Cache delete error for key {key}: {str(e)}")
             return False
     
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Get several values at once
+        
+        The local tier is consulted first; all remaining keys are fetched
+        from Redis with a single MGET. Returns a dict of the keys found.
+        """
+        results = {}
+        missing = []
+        try:
+            for key in keys:
+                local_result = self._get_local(key)
+                if local_result is not None:
+                    results[key] = local_result
+                    self.cache_stats['local_hits'] += 1
+                else:
+                    missing.append(key)
+            
+            if missing and self.redis_available:
+                try:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    pipe.mget(missing)
+                    for key in missing:
+                        pipe.ttl(key)
+                    replies = pipe.execute()
+                    for key, data, remaining_ttl in zip(missing, replies[0], replies[1:]):
+                        if data is None:
+                            continue
+                        value = self._deserialize(data)
+                        results[key] = value
+                        self._set_local(key, value, ttl=self._local_ttl(remaining_ttl))
+                        self.cache_stats['redis_hits'] += 1
+                except Exception as e:
+                    if current_app:
+                        current_app.logger.warning(f"Cache MGET failed for {len(missing)} keys: {str(e)}")
+            
+        except Exception as e:
+            if current_app:
+                current_app.logger.error(f"Cache get_many error: {str(e)}")
+        
+        self.cache_stats['hits'] += len(results)
+        self.cache_stats['misses'] += len(keys) - len(results)
+        return results
+    
+    def set_many(self, mapping: Dict[str, Any], ttl: int = 3600, tags: Optional[List[str]] = None) -> bool:
+        """Set several values at once using a single Redis pipeline"""
+        try:
+            success = False
+            tags = tuple(tags or ())
+            
+            if self.redis_available and mapping:
+                try:
+                    pipe = self.redis_client.pipeline(transaction=False)
+                    for key, value in mapping.items():
+                        pipe.setex(key, ttl, self._serialize(value))
+                        register_tags(pipe, key, (namespace_of(key),) + tags, ttl)
+                    pipe.execute()
+                    success = True
+                except Exception as e:
+                    if current_app:
+                        current_app.logger.warning(f"Cache pipeline set failed for {len(mapping)} keys: {str(e)}")
+            
+            local_ttl = self._local_ttl(ttl)
+            for key, value in mapping.items():
+                if self._set_local(key, value, local_ttl, tags):
+                    success = True
+            
+            if success:
+                self.cache_stats['sets'] += len(mapping)
+            return success
+            
+        except Exception as e:
+            if current_app:
+                current_app.logger.error(f"Cache set_many error: {str(e)}")
+            return False
+    
+    def delete_many(self, keys: List[str]) -> int:
+        """Delete several keys from both layers with one Redis call"""
+        if not keys:
+            return 0
+        try:
+            deleted = 0
+            if self.redis_available:
+                try:
+                    deleted = self.redis_client.delete(*keys)
+                except Exception:
+                    pass
+                self._publish_invalidation('keys', list(keys))
+            
+            with self.lock:
+                local_deleted = sum(1 for key in keys if self._remove_local(key))
+            
+            deleted = max(deleted, local_deleted)
+            self.cache_stats['deletes'] += deleted
+            return deleted
+            
+        except Exception as e:
+            if current_app:
+                current_app.logger.error(f"Cache delete_many error: {str(e)}")
+            return 0
+    
+    def invalidate_tags(self, *tags: str) -> int:
+        """
+        Delete every key registered under any of the given tags
+        
+        Cost is O(keys in the tags); the Redis keyspace is never scanned.
+        """
+        try:
+            total_deleted = 0
+            
+            if self.redis_available:
+                try:
+                    deleted_keys = invalidate_tags(self.redis_client, tags)
+                    total_deleted += len(deleted_keys)
+                    with self.lock:
+                        for key in deleted_keys:
+                            self._remove_local(key)
+                except Exception as e:
+                    if current_app:
+                        current_app.logger.warning(f"Redis tag invalidation failed for {tags}: {str(e)}")
+                self._publish_invalidation('tags', list(tags))
+            
+            # Local entries remember their own tags (covers Redis being down)
+            local_deleted = self._invalidate_local_tags(tags)
+            if not self.redis_available:
+                total_deleted += local_deleted
+            
+            self.cache_stats['deletes'] += total_deleted
+            return total_deleted
+            
+        except Exception as e:
+            if current_app:
+                current_app.logger.error(f"Cache tag invalidation error for {tags}: {str(e)}")
+            return 0
+    
+    def clear_all(self) -> int:
+        """
+        Delete every cached key in every namespace
+        
+        Each key is registered under its namespace tag, so this invalidates
+        all tags in use instead of scanning for keys; never FLUSHDB, since
+        Redis is shared with Celery.
+        """
+        tags = set()
+        if self.redis_available:
+            try:
+                tags.update(registered_tags(self.redis_client))
+            except Exception as e:
+                logger.warning(f"Listing cache tags failed: {e}")
+        with self.lock:
+            tags.update(entry[3] for entry in self.local_cache.values())
+        return self.invalidate_tags(*tags) if tags else 0
+    
     def clear_pattern(self, pattern: str) -> int:
-        """Clear all keys matching pattern"""
+        """
+        Clear all keys matching pattern
+        
+        'namespace:*' patterns are served from the namespace tag. Other
+        patterns fall back to an incremental SCAN, which unlike KEYS does not
+        block Redis for other clients.
+        """
+        namespace = pattern_namespace(pattern)
+        if namespace:
+            return self.invalidate_tags(namespace)
+        
         try:
             total_deleted = 0
             
             # Clear from Redis if available
             if self.redis_available:
                 try:
-                    redis_keys = self.redis_client.keys(pattern)
-                    if redis_keys:
-                        redis_deleted = self.redis_client.delete(*redis_keys)
-                        total_deleted += redis_deleted
-                except:
+                    batch = []
+                    for redis_key in self.redis_client.scan_iter(match=pattern, count=500):
+                        batch.append(redis_key)
+                        if len(batch) >= 500:
+                            total_deleted += self.redis_client.delete(*batch)
+                            batch = []
+                    if batch:
+                        total_deleted += self.redis_client.delete(*batch)
+                except Exception:
                     pass
+                self._publish_invalidation('pattern', [pattern])
             
             # Clear from local cache
-            with self.lock:
-                keys_to_delete = [k for k in self.local_cache.keys() if self._match_pattern(k, pattern)]
-                for key in keys_to_delete:
-                    if key in self.local_cache:
-                        del self.local_cache[key]
-                        total_deleted += 1
+            total_deleted += self._invalidate_local_pattern(pattern)
             
             self.cache_stats['deletes'] += total_deleted
             return total_deleted
@@ -142,6 +363,123 @@ class CacheManager:
                 current_app.logger.error(f"Cache clear pattern error for {pattern}: {str(e)}")
             return 0
     
+    def get_swr(self, key: str, loader: Callable[[], Any], soft_ttl: int = 60,
+                hard_ttl: int = 3600, block: bool = True) -> Optional[Any]:
+        """
+        Stale-while-revalidate read
+        
+        Fresh values (younger than soft_ttl) are returned directly. Past the
+        soft TTL the last value is still returned immediately and a single
+        background refresh is scheduled. Only when the value is gone entirely
+        (past hard_ttl) does the caller block on loader(), collapsed with any
+        concurrent callers. With block=False a miss schedules the refresh and
+        returns None instead.
+        """
+        entry = self.get(key)
+        if isinstance(entry, dict) and entry.get(SWR_MARKER) == 1:
+            if time.time() >= entry.get('soft_expiry', 0):
+                self.cache_stats['swr_stale_served'] += 1
+                self._schedule_swr_refresh(key, loader, soft_ttl, hard_ttl)
+            return entry.get('value')
+        
+        if not block:
+            self._schedule_swr_refresh(key, loader, soft_ttl, hard_ttl)
+            return None
+        
+        def recheck():
+            fresh = self.get(key)
+            if isinstance(fresh, dict) and fresh.get(SWR_MARKER) == 1:
+                return fresh.get('value')
+            return None
+        
+        return single_flight.do(
+            f"swr:{key}",
+            lambda: self._refresh_swr(key, loader, soft_ttl, hard_ttl),
+            redis_client=self.redis_client if self.redis_available else None,
+            recheck=recheck
+        )
+    
+    def get_swr_many(self, loaders: Dict[str, Callable[[], Any]], soft_ttl: Union[int, Dict[str, int]] = 60,
+                     hard_ttl: Union[int, Dict[str, int]] = 3600) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Stale-while-revalidate read of several keys in one round trip
+        
+        Returns (values, missing): fresh and stale values (stale ones get a
+        background refresh scheduled) plus the keys that need a blocking
+        get_swr() because they are past their hard TTL. TTLs may be given
+        per key as dicts.
+        """
+        entries = self.get_many(list(loaders.keys()))
+        values = {}
+        missing = []
+        now = time.time()
+        for key, loader in loaders.items():
+            entry = entries.get(key)
+            if isinstance(entry, dict) and entry.get(SWR_MARKER) == 1:
+                if now >= entry.get('soft_expiry', 0):
+                    self.cache_stats['swr_stale_served'] += 1
+                    self._schedule_swr_refresh(
+                        key,
+                        loader,
+                        soft_ttl[key] if isinstance(soft_ttl, dict) else soft_ttl,
+                        hard_ttl[key] if isinstance(hard_ttl, dict) else hard_ttl
+                    )
+                values[key] = entry.get('value')
+            else:
+                missing.append(key)
+        return values, missing
+    
+    def _refresh_swr(self, key: str, loader: Callable[[], Any], soft_ttl: int, hard_ttl: int) -> Optional[Any]:
+        """Run loader() and store the result with a fresh soft expiry"""
+        value = loader()
+        self.cache_stats['swr_refreshes'] += 1
+        if value is None or (isinstance(value, (dict, list, tuple)) and not value):
+            # Keep serving the previous value rather than caching an empty result
+            return value
+        self.set(key, {
+            SWR_MARKER: 1,
+            'value': value,
+            'soft_expiry': time.time() + soft_ttl
+        }, ttl=hard_ttl)
+        return value
+    
+    def _schedule_swr_refresh(self, key: str, loader: Callable[[], Any], soft_ttl: int, hard_ttl: int):
+        """Refresh key in a background thread unless a refresh is already running"""
+        with self.lock:
+            if key in self._swr_refreshing:
+                return
+            self._swr_refreshing.add(key)
+        
+        # Only one worker per host/cluster needs to refresh a given key
+        if self.redis_available:
+            try:
+                lock_ttl_ms = max(1000, min(soft_ttl, 30) * 1000)
+                if not self.redis_client.set(f"swr_refresh:{key}", 1, nx=True, px=lock_ttl_ms):
+                    with self.lock:
+                        self._swr_refreshing.discard(key)
+                    return
+            except Exception:
+                pass
+        
+        app = current_app._get_current_object() if has_app_context() else None
+        
+        def run():
+            try:
+                if app is not None:
+                    with app.app_context():
+                        self._refresh_swr(key, loader, soft_ttl, hard_ttl)
+                else:
+                    self._refresh_swr(key, loader, soft_ttl, hard_ttl)
+            except Exception as e:
+                self.cache_stats['swr_refresh_errors'] += 1
+                if app is not None:
+                    app.logger.warning(f"Background refresh failed for {key}: {str(e)}")
+            finally:
+                with self.lock:
+                    self._swr_refreshing.discard(key)
+        
+        threading.Thread(target=run, name=f"swr-refresh-{key}", daemon=True).start()
+    
     def get_stats(self) -> Dict:
         """Get cache performance statistics"""
         total_requests = self.cache_stats['hits'] + self.cache_stats['misses']
@@ -156,30 +494,181 @@ class CacheManager:
             'local_hits': self.cache_stats['local_hits'],
             'redis_hits': self.cache_stats['redis_hits'],
             'local_cache_size': len(self.local_cache),
-            'redis_available': self.redis_available
+            'local_bytes': self.local_bytes,
+            'local_max_bytes': self.max_local_bytes,
+            'local_max_entries': self.max_local_entries,
+            'local_evictions': self.cache_stats['local_evictions'],
+            'local_expirations': self.cache_stats['local_expirations'],
+            'local_rejected': self.cache_stats['local_rejected'],
+            'swr_stale_served': self.cache_stats['swr_stale_served'],
+            'swr_refreshes': self.cache_stats['swr_refreshes'],
+            'swr_refresh_errors': self.cache_stats['swr_refresh_errors'],
+            'local_namespaces': {
+                namespace: {'entries': entries, 'bytes': size}
+                for namespace, (entries, size) in self.namespace_usage.items()
+            },
+            'redis_available': self.redis_available,
+            'local_max_ttl': self._local_ttl_cap(),
+            'invalidation_bus': {
+                'connected': self.bus_connected,
+                'published': self.bus_stats['published'],
+                'received': self.bus_stats['received'],
+                'reconnects': self.bus_stats['reconnects']
+            }
         }
     
+    # Invalidation bus: keeps every worker's local tier coherent
+    
+    def _local_ttl(self, ttl: Optional[int] = None) -> int:
+        """Local TTL for a value, capped tighter while the bus is down"""
+        self._ensure_listener()
+        cap = self._local_ttl_cap()
+        if ttl is None or ttl < 0:
+            return cap
+        return max(1, min(ttl, cap))
+    
+    def _local_ttl_cap(self) -> int:
+        """Current local TTL cap; read-only, never starts the listener"""
+        return self.max_local_ttl if self.bus_connected else INCOHERENT_LOCAL_MAX_TTL
+    
+    def _ensure_listener(self):
+        """Start the invalidation listener once per process (gunicorn forks after import)"""
+        if not self.redis_available or self._listener_pid == os.getpid():
+            return
+        with self.lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._origin = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            self.bus_connected = False
+            # Anything inherited from the parent was never covered by our listener
+            self.local_cache.clear()
+            self.local_bytes = 0
+            self.namespace_usage = {}
+        threading.Thread(target=self._listen_for_invalidations, name='cache-invalidation-bus', daemon=True).start()
+    
+    def _listen_for_invalidations(self):
+        """Apply invalidations published by other workers; reconnect with backoff"""
+        backoff = 1
+        first_attempt = True
+        while self._listener_pid == os.getpid():
+            pubsub = None
+            try:
+                if not first_attempt:
+                    self.bus_stats['reconnects'] += 1
+                first_attempt = False
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Messages may have been missed while disconnected
+                with self.lock:
+                    for key in list(self.local_cache.keys()):
+                        self._remove_local(key)
+                self.bus_connected = True
+                backoff = 1
+                while self._listener_pid == os.getpid():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._apply_invalidation(message.get('data'))
+            except Exception as e:
+                logger.warning(f"Cache invalidation bus disconnected: {e}")
+            finally:
+                self.bus_connected = False
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+    
+    def _publish_invalidation(self, op: str, items: List[str], pipe=None):
+        """Tell other workers to drop local entries (op: keys, tags or pattern)"""
+        if not self.redis_available or not items:
+            return
+        try:
+            self._ensure_listener()
+            message = json.dumps({'origin': self._origin, 'op': op, 'items': items})
+            (pipe or self.redis_client).publish(INVALIDATION_CHANNEL, message)
+            self.bus_stats['published'] += 1
+        except Exception as e:
+            logger.debug(f"Cache invalidation publish failed: {e}")
+    
+    def _apply_invalidation(self, data):
+        """Handle one message from the invalidation channel"""
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get('origin') == self._origin:
+            return
+        self.bus_stats['received'] += 1
+        op, items = message.get('op'), message.get('items') or []
+        if op == 'keys':
+            with self.lock:
+                for key in items:
+                    self._remove_local(key)
+        elif op == 'tags':
+            self._invalidate_local_tags(items)
+        elif op == 'pattern':
+            for pattern in items:
+                self._invalidate_local_pattern(pattern)
+    
+    def _invalidate_local_tags(self, tags) -> int:
+        """Drop local entries whose namespace or tags match"""
+        wanted = set(tags)
+        with self.lock:
+            keys_to_delete = [
+                k for k, entry in self.local_cache.items()
+                if entry[3] in wanted or wanted.intersection(entry[4])
+            ]
+            for key in keys_to_delete:
+                self._remove_local(key)
+        return len(keys_to_delete)
+    
+    def _invalidate_local_pattern(self, pattern: str) -> int:
+        """Drop local entries matching a glob pattern"""
+        with self.lock:
+            keys_to_delete = [k for k in self.local_cache.keys() if self._match_pattern(k, pattern)]
+            for key in keys_to_delete:
+                self._remove_local(key)
+        return len(keys_to_delete)
+    
     def _get_local(self, key: str) -> Optional[Any]:
-        """Get from local cache"""
+        """Get from local cache, refreshing the entry's LRU position"""
         with self.lock:
-            if key in self.local_cache:
-                value, expires_at = self.local_cache[key]
-                if datetime.now() < expires_at:
+            entry = self.local_cache.get(key)
+            if entry is not None:
+                value, expires_at = entry[0], entry[1]
+                if time.time() < expires_at:
+                    self.local_cache.move_to_end(key)
                     return value
-                else:
-                    del self.local_cache[key]
+                self._remove_local(key)
+                self.cache_stats['local_expirations'] += 1
         return None
     
-    def _set_local(self, key: str, value: Any, ttl: int) -> bool:
-        """Set in local cache"""
+    def _set_local(self, key: str, value: Any, ttl: int, tags: tuple = ()) -> bool:
+        """Set in local cache, evicting least recently used entries to stay within budget"""
         try:
+            size = self._estimate_size(value)
+            
+            # Never let a single value take more than a quarter of the budget
+            if size > self.max_local_bytes // 4:
+                with self.lock:
+                    self._remove_local(key)
+                    self.cache_stats['local_rejected'] += 1
+                return False
+            
             with self.lock:
-                expires_at = datetime.now() + timedelta(seconds=ttl)
-                self.local_cache[key] = (value, expires_at)
+                self._remove_local(key)
+                namespace = self._namespace_of(key)
+                self.local_cache[key] = (value, time.time() + ttl, size, namespace, tags)
+                self._account_local(namespace, 1, size)
                 
-                # Clean up expired entries if cache is getting large
-                if len(self.local_cache) > 1000:
-                    self._cleanup_local_cache()
+                while self.local_cache and (
+                    self.local_bytes > self.max_local_bytes or
+                    len(self.local_cache) > self.max_local_entries
+                ):
+                    self._evict_local()
                 
             return True
         except Exception:
@@ -188,32 +677,107 @@ class CacheManager:
     def _delete_local(self, key: str) -> bool:
         """Delete from local cache"""
         with self.lock:
-            if key in self.local_cache:
-                del self.local_cache[key]
-                return True
-        return False
+            return self._remove_local(key)
+    
+    def _remove_local(self, key: str) -> bool:
+        """Remove a local entry and release its accounting (caller holds lock)"""
+        entry = self.local_cache.pop(key, None)
+        if entry is None:
+            return False
+        self._account_local(entry[3], -1, -entry[2])
+        return True
+    
+    def _evict_local(self):
+        """Evict the least recently used entry (caller holds lock)"""
+        key, (value, expires_at, size, namespace, tags) = self.local_cache.popitem(last=False)
+        self._account_local(namespace, -1, -size)
+        if time.time() >= expires_at:
+            self.cache_stats['local_expirations'] += 1
+        else:
+            self.cache_stats['local_evictions'] += 1
+    
+    def _account_local(self, namespace: str, entries: int, size: int):
+        """Track total and per-namespace occupancy of the local tier"""
+        self.local_bytes += size
+        usage = self.namespace_usage.setdefault(namespace, [0, 0])
+        usage[0] += entries
+        usage[1] += size
+        if usage[0] <= 0:
+            del self.namespace_usage[namespace]
+    
+    @staticmethod
+    def _namespace_of(key: str) -> str:
+        """Namespace is the key prefix before the first ':' (e.g. 'homepage_data')"""
+        return namespace_of(key)
+    
+    def _estimate_size(self, value: Any, _depth: int = 0) -> int:
+        """Approximate in-memory footprint of a cached value in bytes"""
+        # pandas objects know their own (deep) memory usage
+        memory_usage = getattr(value, 'memory_usage', None)
+        if callable(memory_usage):
+            try:
+                usage = memory_usage(deep=True)
+                return int(usage.sum() if hasattr(usage, 'sum') else usage)
+            except Exception:
+                pass
+        
+        # NumPy arrays expose their buffer size
+        nbytes = getattr(value, 'nbytes', None)
+        if isinstance(nbytes, int):
+            return nbytes + sys.getsizeof(value)
+        
+        size = sys.getsizeof(value)
+        if _depth >= 3:
+            return size
+        
+        if isinstance(value, dict):
+            items = list(value.items())
+            sample = items[:100]
+            inner = sum(self._estimate_size(k, _depth + 1) + self._estimate_size(v, _depth + 1) for k, v in sample)
+            if sample:
+                inner = inner * len(items) // len(sample)
+            return size + inner
+        
+        if isinstance(value, (list, tuple, set, frozenset)):
+            items = list(value)
+            sample = items[:100]
+            inner = sum(self._estimate_size(v, _depth + 1) for v in sample)
+            if sample:
+                inner = inner * len(items) // len(sample)
+            return size + inner
+        
+        return size
     
-    def _get_redis(self, key: str) -> Optional[Any]:
-        """Get from Redis cache"""
+    def _get_redis(self, key: str) -> Tuple[Optional[Any], int]:
+        """Get from Redis cache, returning (value, remaining TTL in seconds)"""
         if not self.redis_available:
-            return None
+            return None, 0
             
         try:
-            data = self.redis_client.get(key)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.ttl(key)
+            data, remaining_ttl = pipe.execute()
             if data:
-                return self._deserialize(data)
+                return self._deserialize(data), remaining_ttl
         except Exception:
             pass
-        return None
+        return None, 0
     
-    def _set_redis(self, key: str, value: Any, ttl: int) -> bool:
-        """Set in Redis cache"""
+    def _set_redis(self, key: str, value: Any, ttl: int, tags: tuple = ()) -> bool:
+        """Set in Redis cache and register the key under its tags in one round trip"""
         if not self.redis_available:
             return False
             
         try:
             serialized_data = self._serialize(value)
-            return bool(self.redis_client.setex(key, ttl, serialized_data))
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, ttl, serialized_data)
+            register_tags(pipe, key, (namespace_of(key),) + tuple(tags), ttl)
+            # No invalidation is published: other workers' local copies of an
+            # ordinary refresh expire with their local TTL (only deletes and
+            # invalidations are broadcast)
+            return bool(pipe.execute()[0])
         except Exception:
             return False
     
@@ -228,32 +792,24 @@ class CacheManager:
             return False
     
     def _serialize(self, value: Any) -> bytes:
-        """Serialize value for storage"""
-        try:
-            # Try JSON first for better readability
-            return json.dumps(value, default=str).encode('utf-8')
-        except (TypeError, ValueError):
-            # Fall back to pickle for complex objects
-            return pickle.dumps(value)
+        """Serialize value for storage (type-preserving, see cache_codec)"""
+        return self.codec.encode(value)
     
     def _deserialize(self, data: bytes) -> Any:
         """Deserialize value from storage"""
-        try:
-            # Try JSON first
-            return json.loads(data.decode('utf-8'))
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            # Fall back to pickle
-            return pickle.loads(data)
+        return self.codec.decode(data)
     
     def _cleanup_local_cache(self):
         """Clean up expired entries from local cache"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, (value, expires_at) in self.local_cache.items()
-            if now >= expires_at
-        ]
-        for key in expired_keys:
-            del self.local_cache[key]
+        with self.lock:
+            now = time.time()
+            expired_keys = [
+                key for key, entry in self.local_cache.items()
+                if now >= entry[1]
+            ]
+            for key in expired_keys:
+                self._remove_local(key)
+            self.cache_stats['local_expirations'] += len(expired_keys)
     
     def _match_pattern(self, key: str, pattern: str) -> bool:
         """Simple pattern matching for local cache"""
@@ -261,7 +817,7 @@ class CacheManager:
         return fnmatch.fnmatch(key, pattern)
 
 # Cache decorators
-def cached(ttl=3600, key_func=None):
+def cached(ttl=3600, key_func=None, tags=None):
     """Decorator for caching function results"""
     def decorator(func):
         @wraps(func)
@@ -272,26 +828,33 @@ def cached(ttl=3600, key_func=None):
             else:
                 cache_key = f"{func.__module__}.{func.__name__}:{_generate_key(*args, **kwargs)}"
             
-            # Try to get from cache
-            result = cache_manager.get(cache_key)
-            if result is not None:
-                return result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            cache_manager.set(cache_key, result, ttl)
-            
-            return result
+            # Single-flight read-through with probabilistic early refresh
+            return cached_call(
+                cache_key,
+                lambda: func(*args, **kwargs),
+                ttl,
+                get=cache_manager.get,
+                set=lambda key, value, timeout: cache_manager.set(key, value, timeout, tags=tags),
+                redis_client=cache_manager.redis_client if cache_manager.redis_available else None
+            )
         return wrapper
     return decorator
 
-def invalidate_cache(pattern):
-    """Decorator to invalidate cache after function execution"""
+def invalidate_cache(pattern=None, tags=None):
+    """
+    Decorator to invalidate cache after function execution
+    
+    Prefer tags (or 'namespace:*' patterns), which invalidate without
+    scanning the Redis keyspace.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             result = func(*args, **kwargs)
-            cache_manager.clear_pattern(pattern)
+            if tags:
+                cache_manager.invalidate_tags(*tags)
+            if pattern:
+                cache_manager.clear_pattern(pattern)
             return result
         return wrapper
     return decorator
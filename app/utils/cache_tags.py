@@ -0,0 +1,129 @@
+"""
+Tag-based cache invalidation for Aksjeradar
+
+Every cached key is registered in one Redis sorted set per tag (at minimum
+its namespace), scored by the key's expiry time. Invalidating a tag walks
+only that set, so clearing news or market data never scans the whole
+keyspace with KEYS. Registrations drop members whose keys have expired, so
+hot tags stay as large as their live keys, and a tag set expires with the
+last of them.
+"""
+
+import logging
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+TAG_PREFIX = 'tag:'
+
+# Batch size for ZSCAN/UNLINK when invalidating large tags
+INVALIDATE_BATCH = 500
+
+# KEYS: tag sets. ARGV: key, ttl. Adds the key scored by its expiry, drops
+# expired members, and keeps each set's TTL at the expiry of its last key.
+_REGISTER_SCRIPT = """
+local now = tonumber(redis.call('time')[1])
+local ttl = tonumber(ARGV[2])
+for i = 1, #KEYS do
+    redis.call('zadd', KEYS[i], now + ttl, ARGV[1])
+    redis.call('zremrangebyscore', KEYS[i], '-inf', now)
+    local current = redis.call('ttl', KEYS[i])
+    if current == -1 or current < ttl then
+        redis.call('expire', KEYS[i], ttl)
+    end
+end
+return 1
+"""
+_register_script = None
+
+
+def tag_key(tag: str, prefix: str = '') -> str:
+    """Redis key of the sorted set holding all keys registered under ``tag``"""
+    return f"{prefix}{TAG_PREFIX}{tag}"
+
+
+def namespace_of(key: str) -> str:
+    """Namespace tag of a key is its prefix before the first ':'"""
+    namespace = key.split(':', 1)[0] if ':' in key else ''
+    return namespace or 'default'
+
+
+def register_tags(client, key: str, tags: Iterable[str], ttl: int, prefix: str = ''):
+    """Register ``key`` under all its tags with one script call (client may be a pipeline)"""
+    global _register_script
+    tag_keys = sorted({tag_key(tag, prefix) for tag in tags})
+    if tag_keys:
+        if _register_script is None:
+            # EVALSHA; pipelines load the script before executing if Redis lacks it
+            _register_script = client.register_script(_REGISTER_SCRIPT)
+        _register_script(keys=tag_keys, args=[key, int(ttl)], client=client)
+
+
+def invalidate_tags(client, tags: Iterable[str], prefix: str = '') -> list:
+    """
+    Delete every key registered under the given tags
+
+    Returns the list of deleted keys (as str) so callers can drop them from
+    local tiers too. Cost is O(keys in the tags), not O(keyspace).
+    """
+    deleted = []
+    for tag in set(tags):
+        set_key = tag_key(tag, prefix)
+        members = (member for member, _ in client.zscan_iter(set_key, count=INVALIDATE_BATCH))
+        deleted.extend(_unlink_all(client, members))
+        client.delete(set_key)
+    # A key registered under several of the tags is reported once
+    return list(dict.fromkeys(k.decode('utf-8') if isinstance(k, bytes) else k for k in deleted))
+
+
+def registered_tags(client, prefix: str = '') -> list:
+    """
+    Every tag that currently has a tag set
+
+    Incremental SCAN matching only the tag sets; since every cached key is
+    registered under its namespace, this lists every namespace in use.
+    """
+    start = len(prefix) + len(TAG_PREFIX)
+    tags = []
+    for set_key in client.scan_iter(match=f"{prefix}{TAG_PREFIX}*", count=INVALIDATE_BATCH):
+        if isinstance(set_key, bytes):
+            set_key = set_key.decode('utf-8')
+        tags.append(set_key[start:])
+    return tags
+
+
+def _unlink_all(client, members) -> list:
+    """UNLINK keys in batches of INVALIDATE_BATCH; returns them"""
+    unlinked = []
+    batch = []
+    for member in members:
+        batch.append(member)
+        if len(batch) >= INVALIDATE_BATCH:
+            _unlink(client, batch)
+            unlinked.extend(batch)
+            batch = []
+    if batch:
+        _unlink(client, batch)
+        unlinked.extend(batch)
+    return unlinked
+
+
+def _unlink(client, keys):
+    """UNLINK frees memory off the main thread; fall back to DEL on old servers"""
+    try:
+        client.unlink(*keys)
+    except Exception:
+        client.delete(*keys)
+
+
+def pattern_namespace(pattern: str):
+    """
+    Return the namespace when ``pattern`` is exactly 'namespace:*'
+
+    Lets legacy clear_pattern() calls take the tag fast path.
+    """
+    if pattern.endswith(':*'):
+        namespace = pattern[:-2]
+        if namespace and not any(ch in namespace for ch in '*?[]:'):
+            return namespace
+    return None
@@ -0,0 +1,90 @@
+"""
+Chart payloads for Aksjeradar
+
+History frames are turned into chart JSON with whole-column NumPy
+operations instead of a Python loop per row. Long ranges can be reduced to
+the number of points the chart can actually draw with
+Largest-Triangle-Three-Buckets (LTTB), which keeps the peaks and troughs
+that plain every-nth sampling drops.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Fewer points than this are never downsampled (first, last and one per bucket)
+MIN_POINTS = 3
+# Largest max_points accepted from clients (wider than any chart)
+MAX_POINTS = 10000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the points LTTB keeps out of len(x)
+
+    Always keeps the first and last point. Every bucket in between
+    contributes the point forming the largest triangle with the point kept
+    from the previous bucket and the average of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket edges over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+        next_start = end
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:max(next_end, next_start + 1)].mean()
+        next_y = y[next_start:max(next_end, next_start + 1)].mean()
+
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def build_chart_payload(frame: Optional[pd.DataFrame], max_points: Optional[int] = None,
+                        date_format: str = '%Y-%m-%d') -> Dict:
+    """
+    {'dates', 'prices', 'volumes'} lists from an OHLCV frame
+
+    Prices are Close (Open when there is no Close); bars without a price are
+    left out. With max_points the series is reduced with LTTB on price.
+    """
+    if frame is None or frame.empty:
+        return {'dates': [], 'prices': [], 'volumes': []}
+
+    price_column = 'Close' if 'Close' in frame.columns else 'Open'
+    prices = pd.to_numeric(frame[price_column], errors='coerce').to_numpy(dtype=float)
+    index = pd.DatetimeIndex(pd.to_datetime(frame.index))
+    if 'Volume' in frame.columns:
+        volumes = pd.to_numeric(frame['Volume'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    else:
+        volumes = np.zeros(len(prices))
+
+    valid = ~np.isnan(prices)
+    prices, volumes, index = prices[valid], volumes[valid], index[valid]
+
+    if max_points and len(prices) > max_points:
+        kept = lttb_indices(index.asi8, prices, max_points)
+        prices, volumes, index = prices[kept], volumes[kept], index[kept]
+
+    return {
+        'dates': index.strftime(date_format).tolist(),
+        'prices': prices.round(4).tolist(),
+        'volumes': volumes.astype(np.int64).tolist()
+    }
@@ -0,0 +1,182 @@
+"""
+Circuit breakers for upstream providers
+
+When a provider is degraded every request used to pay the full upstream
+timeout before falling back, and with slow calls piling up the gunicorn
+workers ran out. Each (provider, endpoint class) pair now has a breaker:
+
+- CLOSED: calls go through; the last WINDOW_SIZE outcomes are tracked
+- OPEN: tripped by too many failures or too many slow calls; callers skip
+  the provider at once (cache, stale data or fallback) for OPEN_SECONDS
+- HALF_OPEN: after that one probe call is let through; success closes the
+  breaker, failure opens it again
+
+State is per worker process, so one worker's probes never block another.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Outcomes remembered per breaker, and how many are needed before it can trip
+WINDOW_SIZE = 20
+MIN_CALLS = 10
+# Trip when this share of recent calls failed, or was slower than SLOW_CALL_SECONDS
+FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', 0.5))
+SLOW_CALL_RATE = float(os.getenv('BREAKER_SLOW_CALL_RATE', 0.5))
+SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', 5.0))
+# How long a tripped breaker stays open before probing
+OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', 30))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a rolling window of calls"""
+
+    def __init__(self, name: str, failure_rate: float = FAILURE_RATE, slow_call_rate: float = SLOW_CALL_RATE,
+                 slow_call_seconds: float = SLOW_CALL_SECONDS, open_seconds: float = OPEN_SECONDS,
+                 window_size: int = WINDOW_SIZE, min_calls: int = MIN_CALLS):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_rate = slow_call_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.min_calls = min_calls
+        self.outcomes = deque(maxlen=window_size)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'trips': 0}
+
+    def _current_state(self, now: float) -> str:
+        if self.state == OPEN and now - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.probing = False
+        return self.state
+
+    def available(self) -> bool:
+        """True if a call would be let through (does not take the probe slot)"""
+        with self.lock:
+            state = self._current_state(time.time())
+            return state == CLOSED or (state == HALF_OPEN and not self.probing)
+
+    def allow(self) -> bool:
+        """Ask to make a call; in HALF_OPEN only one probe is let through"""
+        with self.lock:
+            state = self._current_state(time.time())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record(self, success: bool, seconds: float):
+        """Record the outcome of a call that allow() let through"""
+        slow = seconds >= self.slow_call_seconds
+        with self.lock:
+            self.stats['calls'] += 1
+            self.stats['failures'] += 0 if success else 1
+            self.stats['slow_calls'] += 1 if slow else 0
+
+            if self.state == HALF_OPEN:
+                self.probing = False
+                if success and not slow:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    logger.info(f"Circuit {self.name} closed")
+                else:
+                    self._trip()
+                return
+
+            self.outcomes.append((success, slow))
+            if self.state == CLOSED and len(self.outcomes) >= self.min_calls:
+                failures = sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+                slow_calls = sum(1 for _, was_slow in self.outcomes if was_slow) / len(self.outcomes)
+                if failures >= self.failure_rate or slow_calls >= self.slow_call_rate:
+                    self._trip()
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        self.outcomes.clear()
+        self.stats['trips'] += 1
+        logger.warning(f"Circuit {self.name} opened for {self.open_seconds:.0f}s")
+
+    def call(self, fn: Callable[[], Any], fallback: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Run fn() through the breaker
+
+        While the breaker is open (or fn fails) fallback() is returned when
+        given; otherwise CircuitOpenError (or fn's exception) is raised.
+        """
+        if not self.allow():
+            if fallback is not None:
+                return fallback()
+            raise CircuitOpenError(self.name)
+        started = time.time()
+        try:
+            result = fn()
+        except Exception:
+            self.record(False, time.time() - started)
+            if fallback is not None:
+                return fallback()
+            raise
+        self.record(True, time.time() - started)
+        return result
+
+    def reset(self):
+        with self.lock:
+            self.state = CLOSED
+            self.probing = False
+            self.outcomes.clear()
+
+    def get_stats(self) -> Dict:
+        with self.lock:
+            state = self._current_state(time.time())
+            stats = dict(self.stats)
+            stats['state'] = state
+            stats['window'] = len(self.outcomes)
+            if state == OPEN:
+                stats['retry_in'] = round(max(0.0, self.opened_at + self.open_seconds - time.time()), 1)
+            return stats
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str, endpoint_class: str = 'default') -> CircuitBreaker:
+    """The breaker for a provider and endpoint class (created on first use)"""
+    name = f"{provider}:{endpoint_class}"
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def reset_breaker(name: str) -> bool:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        return False
+    breaker.reset()
+    return True
+
+
+def get_breaker_stats() -> Dict[str, Dict]:
+    return {name: breaker.get_stats() for name, breaker in sorted(_breakers.items())}
@@ -0,0 +1,348 @@
+"""
+Local OHLCV history store for Aksjeradar
+
+Charts, comparisons and technical pages used to download their whole
+history window from upstream on every request. Bars are now kept on disk,
+one file per symbol and interval, as fixed-size binary records (timestamp,
+open, high, low, close, volume):
+
+- new bars are appended to the end of the file
+- reads memory-map the file with NumPy, so only the pages of the requested
+  window are touched and nothing is parsed
+- a small JSON sidecar remembers how far back the file is complete and when
+  it was last refreshed
+
+Timestamps are the exchange's wall-clock time in epoch seconds, so daily
+bars keep their trading date.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .ticker_registry import normalize_symbol, is_valid_format
+from .market_open import symbol_ttl
+
+logger = logging.getLogger(__name__)
+
+HISTORY_STORE_PATH = os.getenv(
+    'HISTORY_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'history')
+)
+
+RECORD_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8')
+])
+FRAME_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+# How long stored bars are served before asking upstream again while the
+# symbol's market is open (seconds); once it has closed, until the next open
+REFRESH_AFTER = {
+    'intraday': int(os.getenv('HISTORY_REFRESH_INTRADAY', 300)),
+    'daily': int(os.getenv('HISTORY_REFRESH_DAILY', 3600))
+}
+
+PERIOD_DAYS = {
+    '1d': 1, '5d': 5, '7d': 7, '30d': 30,
+    '1mo': 31, '3mo': 92, '6mo': 183,
+    '1y': 366, '2y': 731, '5y': 1827, '10y': 3653
+}
+# Periods tried, shortest first, when only the bars after the last stored one
+# are needed. Upstream '1d' is only the latest session, not "since yesterday",
+# so the shortest gap fetch is '5d'
+GAP_PERIODS = ['5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y']
+INTRADAY_INTERVALS = {'1m', '2m', '5m', '15m', '30m', '60m', '90m', '1h'}
+# Interval and period names are path components and upstream arguments, so
+# only the ones upstream knows are accepted
+VALID_INTERVALS = INTRADAY_INTERVALS | {'1d', '5d', '1wk', '1mo', '3mo'}
+VALID_PERIODS = set(PERIOD_DAYS) | {'ytd', 'max'}
+
+
+def is_valid_interval(interval: Optional[str]) -> bool:
+    return interval in VALID_INTERVALS
+
+
+def is_valid_period(period: Optional[str]) -> bool:
+    return period in VALID_PERIODS
+
+
+def period_start(period: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """First moment a period covers (None for 'max' or unknown periods)"""
+    now = now or datetime.now()
+    if period == 'ytd':
+        return datetime(now.year, 1, 1)
+    days = PERIOD_DAYS.get(period)
+    if days is None:
+        return None
+    start = now - timedelta(days=days)
+    return start.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def gap_period(last_bar: datetime, now: Optional[datetime] = None) -> str:
+    """
+    Shortest period that reaches back to the start of the last stored bar's
+    session, so that session (possibly stored while live) is fetched again
+    """
+    now = now or datetime.now()
+    session_start = last_bar.replace(hour=0, minute=0, second=0, microsecond=0)
+    for period in GAP_PERIODS:
+        start = period_start(period, now)
+        if start <= session_start:
+            return period
+    return 'max'
+
+
+def frame_to_records(frame: pd.DataFrame) -> np.ndarray:
+    """Sorted, de-duplicated records from an OHLCV DataFrame"""
+    if frame is None or frame.empty:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    index = pd.DatetimeIndex(pd.to_datetime(frame.index))
+    if index.tz is not None:
+        index = index.tz_localize(None)
+
+    records = np.empty(len(frame), dtype=RECORD_DTYPE)
+    records['ts'] = index.as_unit('s').asi8
+    for field, column in FRAME_COLUMNS.items():
+        if column in frame.columns:
+            records[field] = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=float)
+        else:
+            records[field] = np.nan
+    records = records[~np.isnan(records['close'])]
+    return merge_records(records[:0], records)
+
+
+def merge_records(existing: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Union of two record arrays by timestamp; new bars replace stored ones"""
+    combined = np.concatenate([new, existing])
+    # np.unique keeps the first occurrence, so bars from `new` win
+    _, first = np.unique(combined['ts'], return_index=True)
+    return combined[first]
+
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    """OHLCV DataFrame (DatetimeIndex, Open/High/Low/Close/Volume) from records"""
+    index = pd.DatetimeIndex(pd.to_datetime(records['ts'], unit='s'), name='Date')
+    return pd.DataFrame({column: records[field] for field, column in FRAME_COLUMNS.items()}, index=index)
+
+
+class HistoryStore:
+    """Per-symbol, per-interval OHLCV files with memory-mapped reads"""
+
+    def __init__(self, root: str = HISTORY_STORE_PATH):
+        self.root = root
+        self.stats = {
+            'reads': 0,
+            'bars_read': 0,
+            'writes': 0,
+            'bars_written': 0,
+            'rewrites': 0,
+            'live_updates': 0,
+            'gap_fetches': 0
+        }
+
+    def path(self, symbol: str, interval: str) -> str:
+        if not is_valid_interval(interval) or not is_valid_format(symbol):
+            raise ValueError(f"Invalid history key {symbol!r}/{interval!r}")
+        # Exchange-prefixed symbols (XSTU:SAP) must not put ':' in file names
+        return os.path.join(self.root, interval, f"{normalize_symbol(symbol).replace(':', '_')}.bin")
+
+    def _meta_path(self, symbol: str, interval: str) -> str:
+        return self.path(symbol, interval)[:-len('.bin')] + '.json'
+
+    def read(self, symbol: str, interval: str = '1d', start: Optional[datetime] = None) -> np.ndarray:
+        """
+        Stored records from `start` on, memory-mapped (read-only, no copy)
+
+        Records are sorted by timestamp, so the window is found with a binary
+        search and only its pages are read from disk.
+        """
+        try:
+            path = self.path(symbol, interval)
+            size = os.path.getsize(path)
+        except (OSError, ValueError):
+            return np.empty(0, dtype=RECORD_DTYPE)
+        count = size // RECORD_DTYPE.itemsize
+        if not count:
+            return np.empty(0, dtype=RECORD_DTYPE)
+
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+        if start is not None:
+            first = int(np.searchsorted(records['ts'], int(pd.Timestamp(start).timestamp())))
+            records = records[first:]
+        self.stats['reads'] += 1
+        self.stats['bars_read'] += len(records)
+        return records
+
+    def read_frame(self, symbol: str, interval: str = '1d', period: Optional[str] = None) -> pd.DataFrame:
+        return records_to_frame(self.read(symbol, interval, period_start(period) if period else None))
+
+    def last_timestamp(self, symbol: str, interval: str = '1d') -> Optional[datetime]:
+        records = self.read(symbol, interval)
+        if not len(records):
+            return None
+        return pd.Timestamp(int(records['ts'][-1]), unit='s').to_pydatetime()
+
+    def load_meta(self, symbol: str, interval: str) -> Dict:
+        try:
+            with open(self._meta_path(symbol, interval)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, symbol: str, interval: str, meta: Dict):
+        path = self._meta_path(symbol, interval)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def write(self, symbol: str, interval: str, frame: pd.DataFrame,
+              covered_from: Optional[datetime] = None, covered_max: bool = False,
+              incremental: bool = False) -> int:
+        """
+        Merge bars into the store; returns the number of bars written
+
+        Bars newer than the last stored one are appended. With
+        incremental=True (a refresh of the most recent bars) stored bars are
+        final except the last one, which may have been a live bar: it is
+        overwritten in place and older fetched bars are dropped. Anything
+        else (corrections, back-fills) rewrites the file into a new inode, so
+        readers that already mapped the old file are unaffected.
+        `covered_from` records that the store is complete from that point on
+        (`covered_max`: complete back to the first bar upstream has).
+        """
+        if not is_valid_format(symbol) or not is_valid_interval(interval):
+            return 0
+        new = frame_to_records(frame)
+        path = self.path(symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(f"{path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            stored = self.read(symbol, interval)
+            if len(stored) and incremental:
+                last_ts = stored['ts'][-1]
+                new = new[new['ts'] >= last_ts]
+                if len(new) and new['ts'][0] == last_ts:
+                    with open(path, 'r+b') as f:
+                        f.seek((len(stored) - 1) * RECORD_DTYPE.itemsize)
+                        f.write(new[:1].tobytes())
+                    self.stats['live_updates'] += 1
+                    new = new[1:]
+            if len(new):
+                if not len(stored) or new['ts'][0] > stored['ts'][-1]:
+                    with open(path, 'ab') as f:
+                        f.write(new.tobytes())
+                else:
+                    merged = merge_records(stored, new)
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp_path, 'wb') as f:
+                        f.write(merged.tobytes())
+                    os.replace(tmp_path, path)
+                    self.stats['rewrites'] += 1
+
+            meta = self.load_meta(symbol, interval)
+            if covered_from is not None:
+                covered = int(pd.Timestamp(covered_from).timestamp())
+                meta['covered_from'] = min(meta.get('covered_from', covered), covered)
+            if covered_max:
+                meta['covered_max'] = True
+            kind = 'intraday' if interval in INTRADAY_INTERVALS else 'daily'
+            meta['refreshed_at'] = time.time()
+            meta['fresh_until'] = meta['refreshed_at'] + symbol_ttl(symbol, REFRESH_AFTER[kind])
+            self._save_meta(symbol, interval, meta)
+
+        self.stats['writes'] += 1
+        self.stats['bars_written'] += len(new)
+        return len(new)
+
+    def is_complete(self, symbol: str, interval: str, period: str) -> bool:
+        """True if the stored bars cover the whole period"""
+        meta = self.load_meta(symbol, interval)
+        start = period_start(period)
+        if start is None:
+            # 'max' is only complete once a 'max' download was stored
+            return period == 'max' and meta.get('covered_max', False)
+        covered_from = meta.get('covered_from')
+        return covered_from is not None and covered_from <= pd.Timestamp(start).timestamp()
+
+    def is_fresh(self, symbol: str, interval: str) -> bool:
+        """True if the store was refreshed recently enough to skip upstream"""
+        return time.time() < self.load_meta(symbol, interval).get('fresh_until', 0)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['path'] = self.root
+        return stats
+
+
+# Global history store instance
+history_store = HistoryStore()
+
+
+def _fetch_upstream(symbol: str, period: str, interval: str) -> Optional[pd.DataFrame]:
+    from .upstream_coalescer import get_stock_data
+    return get_stock_data(symbol, period=period, interval=interval)
+
+
+def get_history(symbol: str, period: str = '1mo', interval: str = '1d') -> pd.DataFrame:
+    """
+    OHLCV history for a symbol, served from the local store when it covers
+    the period and is fresh, otherwise refreshed from DataService first
+
+    Once the store covers the period, refreshes only ask upstream for the
+    last few sessions, reaching back past the last stored bar's session.
+    """
+    symbol = normalize_symbol(symbol)
+    if not is_valid_format(symbol) or not is_valid_interval(interval) or not is_valid_period(period):
+        return pd.DataFrame()
+
+    complete = history_store.is_complete(symbol, interval, period)
+    if complete and history_store.is_fresh(symbol, interval):
+        return history_store.read_frame(symbol, interval, period)
+
+    last_bar = history_store.last_timestamp(symbol, interval) if complete else None
+    fetch_period = gap_period(last_bar) if last_bar is not None else period
+
+    try:
+        frame = _fetch_upstream(symbol, fetch_period, interval)
+    except Exception as e:
+        logger.warning(f"History fetch failed for {symbol} ({fetch_period}/{interval}): {e}")
+        frame = None
+
+    if frame is None or frame.empty:
+        # Upstream unavailable: serve whatever is stored (possibly stale)
+        return history_store.read_frame(symbol, interval, period)
+
+    try:
+        if last_bar is not None:
+            history_store.stats['gap_fetches'] += 1
+            history_store.write(symbol, interval, frame, incremental=True)
+        else:
+            history_store.write(symbol, interval, frame, covered_from=period_start(period), covered_max=period == 'max')
+        return history_store.read_frame(symbol, interval, period)
+    except Exception as e:
+        logger.warning(f"Could not store history for {symbol}: {e}")
+        return frame
+
+
+def get_histories(symbols: Iterable[str], period: str = '1mo', interval: str = '1d') -> Dict[str, pd.DataFrame]:
+    """{symbol: history} for the symbols with data"""
+    histories = {}
+    for symbol in symbols:
+        frame = get_history(symbol, period, interval)
+        if frame is not None and not frame.empty:
+            histories[symbol] = frame
+    return histories
@@ -1,21 +1,41 @@
 # Market open utility
-from datetime import datetime, time
+import os
+import re
+from datetime import datetime, time, timedelta
 import pytz
 
+OSLO_TZ = pytz.timezone('Europe/Oslo')
+
+# Trading sessions in Oslo time, Mon-Fri
+MARKET_SESSIONS = {
+    # Oslo Børs: 09:00-16:30 CET
+    'oslo': (time(9, 0), time(16, 30)),
+    # S&P 500 (New York): 15:30-22:00 CET
+    'global': (time(15, 30), time(22, 0)),
+    # Currencies trade around the clock on weekdays
+    'currency': (time(0, 0), time(23, 59, 59))
+}
+# Markets that never close
+ALWAYS_OPEN = {'crypto'}
+
+# Closing prices can arrive a little after the close; keep short TTLs this long
+SETTLE_MINUTES = int(os.getenv('MARKET_SETTLE_MINUTES', 15))
+# Upper bound for "valid until next open" (long weekends, holidays we do not model)
+MAX_CLOSED_TTL = int(os.getenv('MARKET_MAX_CLOSED_TTL', 3 * 24 * 3600))
+
+CRYPTO_PATTERN = re.compile(r'-(USD|EUR|NOK|USDT|BTC)$')
+
+
 def is_market_open(market):
-    now = datetime.now(pytz.timezone('Europe/Oslo'))
+    now = datetime.now(OSLO_TZ)
     weekday = now.weekday()
-    if market == 'oslo':
-        # Oslo Børs: 09:00-16:30 CET, Mon-Fri
-        open_time = time(9, 0)
-        close_time = time(16, 30)
-        return 0 <= weekday <= 4 and open_time <= now.time() <= close_time
-    elif market == 'global':
-        # S&P 500 (New York): 15:30-22:00 CET, Mon-Fri
-        open_time = time(15, 30)
-        close_time = time(22, 0)
-        return 0 <= weekday <= 4 and open_time <= now.time() <= close_time
-    return False
+    if market in ALWAYS_OPEN:
+        return True
+    session = MARKET_SESSIONS.get(market)
+    if session is None:
+        return False
+    open_time, close_time = session
+    return 0 <= weekday <= 4 and open_time <= now.time() <= close_time
 
 def is_oslo_bors_open():
     """Check if Oslo Børs is currently open"""
@@ -24,3 +44,63 @@ def is_oslo_bors_open():
 def is_global_markets_open():
     """Check if global markets (S&P 500) are currently open"""
     return is_market_open('global')
+
+def market_for_symbol(symbol):
+    """Market whose calendar applies to a symbol: 'oslo', 'global', 'crypto' or 'currency'"""
+    symbol = (symbol or '').upper()
+    if symbol.endswith('.OL') or symbol.startswith('OSL:') or symbol.startswith('^OSE'):
+        return 'oslo'
+    if symbol.endswith('=X'):
+        return 'currency'
+    if CRYPTO_PATTERN.search(symbol):
+        return 'crypto'
+    return 'global'
+
+def _in_session(market, now, grace=timedelta(0)):
+    if market in ALWAYS_OPEN:
+        return True
+    open_time, close_time = MARKET_SESSIONS[market]
+    if now.weekday() > 4:
+        return False
+    opens = OSLO_TZ.localize(datetime.combine(now.date(), open_time))
+    closes = OSLO_TZ.localize(datetime.combine(now.date(), close_time)) + grace
+    return opens <= now <= closes
+
+def next_market_open(market, now=None):
+    """Next session start after `now` (Oslo time)"""
+    now = now or datetime.now(OSLO_TZ)
+    open_time = MARKET_SESSIONS[market][0]
+    for days in range(8):
+        day = now.date() + timedelta(days=days)
+        if day.weekday() > 4:
+            continue
+        opens = OSLO_TZ.localize(datetime.combine(day, open_time))
+        if opens > now:
+            return opens
+    return now + timedelta(days=1)
+
+def market_ttl(market, open_ttl, now=None):
+    """
+    Cache TTL that follows the market calendar
+
+    While the market is open (or just closed and still settling) values
+    live `open_ttl` seconds. Once it has closed they stay valid until the
+    next open, capped at MAX_CLOSED_TTL. Crypto is always open. market='all'
+    covers Oslo and New York together.
+    """
+    now = now or datetime.now(OSLO_TZ)
+    if market == 'all':
+        markets = ['oslo', 'global']
+    elif market in MARKET_SESSIONS or market in ALWAYS_OPEN:
+        markets = [market]
+    else:
+        markets = ['global']
+    grace = timedelta(minutes=SETTLE_MINUTES)
+    if any(_in_session(name, now, grace) for name in markets):
+        return open_ttl
+    until_open = min((next_market_open(name, now) - now).total_seconds() for name in markets)
+    return int(min(max(open_ttl, until_open), MAX_CLOSED_TTL))
+
+def symbol_ttl(symbol, open_ttl, now=None):
+    """market_ttl for the market a symbol trades on"""
+    return market_ttl(market_for_symbol(symbol), open_ttl, now)
@@ -0,0 +1,150 @@
+"""
+Homepage market snapshot for Aksjeradar
+
+The homepage, /stocks and /api/homepage/market-data all show the same four
+market overviews. They are served stale-while-revalidate from the cache so
+page loads never wait on upstream providers once a snapshot exists.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+from .cache_manager import cache_manager
+from .tiered_cache import make_key
+from .market_open import market_ttl
+
+logger = logging.getLogger(__name__)
+
+# Serve from cache without refreshing for this long while the section's
+# market is open (until its next open while it is closed)
+SNAPSHOT_SOFT_TTL = 120
+# After this the snapshot is gone and the next request has to wait
+SNAPSHOT_HARD_TTL = 6 * 3600
+# Keep enough rows for the longest overview (stocks.index shows 10)
+SNAPSHOT_MAX_ITEMS = 20
+
+SNAPSHOT_KEYS = {
+    'oslo': make_key('market_data', 'homepage_oslo_data'),
+    'global': make_key('market_data', 'homepage_global_data'),
+    'crypto': make_key('market_data', 'homepage_crypto_data'),
+    'currency': make_key('market_data', 'homepage_currency_data')
+}
+
+
+def _get_data_service():
+    """Lazy import DataService to avoid circular imports"""
+    from ..services.data_service import DataService
+    return DataService
+
+
+def _as_list(data):
+    """DataService overviews come back as either dicts or lists"""
+    if isinstance(data, dict):
+        data = list(data.values())
+    return list(data or [])[:SNAPSHOT_MAX_ITEMS]
+
+
+def _load_oslo():
+    return _as_list(_get_data_service().get_oslo_stocks())
+
+
+def _load_global():
+    return _as_list(_get_data_service().get_global_stocks())
+
+
+def _load_crypto():
+    return _as_list(_get_data_service().get_crypto_overview())
+
+
+def _load_currency():
+    return _get_data_service().get_currency_overview() or {}
+
+
+# Market calendar each section follows
+SNAPSHOT_MARKETS = {
+    'oslo': 'oslo',
+    'global': 'global',
+    'crypto': 'crypto',
+    'currency': 'currency'
+}
+
+
+def _soft_ttl(section):
+    return market_ttl(SNAPSHOT_MARKETS[section], SNAPSHOT_SOFT_TTL)
+
+
+def _hard_ttl(section):
+    # Outlive the soft TTL so a weekend snapshot is still there on Monday
+    return max(SNAPSHOT_HARD_TTL, _soft_ttl(section) + SNAPSHOT_SOFT_TTL)
+
+
+SNAPSHOT_LOADERS = {
+    'oslo': _load_oslo,
+    'global': _load_global,
+    'crypto': _load_crypto,
+    'currency': _load_currency
+}
+
+
+def get_snapshot(section, block=True):
+    """Get one snapshot section ('oslo', 'global', 'crypto' or 'currency')"""
+    try:
+        return cache_manager.get_swr(
+            SNAPSHOT_KEYS[section],
+            SNAPSHOT_LOADERS[section],
+            soft_ttl=_soft_ttl(section),
+            hard_ttl=_hard_ttl(section),
+            block=block
+        )
+    except Exception as e:
+        logger.warning(f"Market snapshot {section} unavailable: {e}")
+        return None
+
+
+def get_snapshots(sections=None, block=True):
+    """
+    Get several snapshot sections at once
+
+    All sections are read with one batched cache lookup. Sections that have
+    to be loaded synchronously are fetched in parallel rather than one
+    after another.
+    """
+    return read_snapshots(sections, block)[0]
+
+
+def read_snapshots(sections=None, block=True):
+    """
+    (snapshots, sections that were not cached) - like get_snapshots(), for
+    callers that report whether they served cached data
+    """
+    sections = list(sections or SNAPSHOT_KEYS.keys())
+    try:
+        values, missing_keys = cache_manager.get_swr_many(
+            {SNAPSHOT_KEYS[section]: SNAPSHOT_LOADERS[section] for section in sections},
+            soft_ttl={SNAPSHOT_KEYS[section]: _soft_ttl(section) for section in sections},
+            hard_ttl={SNAPSHOT_KEYS[section]: _hard_ttl(section) for section in sections}
+        )
+    except Exception as e:
+        logger.warning(f"Market snapshot batch read failed: {e}")
+        values, missing_keys = {}, [SNAPSHOT_KEYS[section] for section in sections]
+
+    snapshots = {section: values.get(SNAPSHOT_KEYS[section]) for section in sections}
+    missing = [section for section in sections if SNAPSHOT_KEYS[section] in missing_keys]
+    if not missing:
+        return snapshots, missing
+
+    if not block or len(missing) == 1:
+        snapshots.update({section: get_snapshot(section, block=block) for section in missing})
+        return snapshots, missing
+
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def load(section):
+        if app is not None:
+            with app.app_context():
+                return get_snapshot(section)
+        return get_snapshot(section)
+
+    with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+        snapshots.update(zip(missing, executor.map(load, missing)))
+    return snapshots, missing
@@ -0,0 +1,419 @@
+"""
+Hedged multi-provider quote router for Aksjeradar
+
+Quotes used to come from one provider, with a fallback only after it had
+failed or timed out, so the slowest requests paid the full timeout. The
+router keeps a rolling latency window per provider and:
+
+- sends each request to the provider with the best median latency
+- when that provider has not answered within its own p95, sends a hedged
+  request to the next provider and takes whichever good answer comes first
+- fails over to the next provider at once when a request fails
+
+A provider answering without data (unknown symbol) ends the request with
+None; only failures and timeouts move on to the next provider, and when no
+provider answers at all QuoteUnavailableError is raised, so callers can
+tell an unknown symbol from an upstream outage.
+
+Hedges fire only for the slowest few percent of requests and are capped at
+HEDGE_MAX_RATIO of all requests, so average upstream load barely moves.
+Providers without an API key, out of rate-limit budget or with an open
+circuit breaker are skipped. Every answer is normalized to the same quote
+fields (last_price, change, change_percent, volume, name, market_state).
+
+yfinance (through DataService) has no timeout of its own, so it runs on a
+small pool of its own and is abandoned after the request timeout instead of
+holding a router thread.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app, has_app_context
+
+from .rate_limiter import rate_limiter, INTERACTIVE
+from .circuit_breaker import get_breaker
+
+try:
+    import requests
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    requests = None
+    REQUESTS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Latencies kept per provider, and the minimum before percentiles are trusted
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+# Hedge delay while a provider has too few samples (seconds)
+DEFAULT_HEDGE_DELAY = float(os.getenv('PROVIDER_HEDGE_DELAY', 1.0))
+MIN_HEDGE_DELAY = 0.05
+# At most this share of requests may send a hedge
+HEDGE_MAX_RATIO = float(os.getenv('PROVIDER_HEDGE_MAX_RATIO', 0.1))
+ROUTER_TIMEOUT = float(os.getenv('PROVIDER_TIMEOUT', 5.0))
+ROUTER_WORKERS = int(os.getenv('PROVIDER_ROUTER_WORKERS', 8))
+# Concurrent yfinance lookups per process; more are failed over at once
+YFINANCE_WORKERS = int(os.getenv('PROVIDER_YFINANCE_WORKERS', 2))
+
+# Quote field -> provider keys it may come under, in order of preference
+QUOTE_FIELD_ALIASES = {
+    'last_price': ('last_price', 'regularMarketPrice', 'currentPrice', 'price'),
+    'change': ('change', 'regularMarketChange'),
+    'change_percent': ('change_percent', 'regularMarketChangePercent', 'changePercent'),
+    'volume': ('volume', 'regularMarketVolume'),
+    'name': ('name', 'longName', 'shortName'),
+    'market_state': ('market_state', 'marketState')
+}
+
+
+# _call() result for a request that failed (as opposed to an empty answer)
+_FAILED = object()
+
+
+class QuoteUnavailableError(Exception):
+    """No provider answered (timeouts, errors, open breakers or no budget)"""
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency percentile, or None until MIN_SAMPLES calls were seen"""
+        with self.lock:
+            if len(self.samples) < MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def normalize_quote(data: Optional[Dict]) -> Optional[Dict]:
+    """Provider answer in the shared quote fields; None when it has no price"""
+    if not data:
+        return None
+    quote = {}
+    for field, aliases in QUOTE_FIELD_ALIASES.items():
+        quote[field] = next((data[key] for key in aliases if data.get(key) is not None), None)
+    return quote if quote['last_price'] else None
+
+
+def _is_us_symbol(symbol: str) -> bool:
+    return bool(symbol) and not any(mark in symbol for mark in ('.', '-', '^', '='))
+
+
+def _get_json(url: str, params: Dict, timeout: float):
+    response = requests.get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+class _YFinancePool:
+    """Bounded pool for DataService lookups (recreated after fork)"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = None
+        self._slots = None
+        self._pid = None
+
+    def run(self, fn: Callable, timeout: float):
+        """fn() on the pool; TimeoutError after timeout, RuntimeError when every slot is busy"""
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='provider-yfinance')
+            self._slots = threading.BoundedSemaphore(self.workers)
+            self._pid = os.getpid()
+        slots = self._slots
+        # Never queue behind lookups that hang: fail over instead
+        if not slots.acquire(blocking=False):
+            raise RuntimeError('all yfinance lookups busy')
+        try:
+            future = self._executor.submit(fn)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future.result(timeout=timeout)
+
+
+_yfinance_pool = _YFinancePool(YFINANCE_WORKERS)
+
+
+def _fetch_yfinance(symbol: str, api_key: Optional[str], timeout: float) -> Optional[Dict]:
+    from ..services.data_service import DataService
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def lookup():
+        if app is None:
+            return DataService.get_stock_info(symbol)
+        with app.app_context():
+            return DataService.get_stock_info(symbol)
+
+    # A lookup still running at the timeout finishes in the background
+    return _yfinance_pool.run(lookup, timeout)
+
+
+def _fetch_fmp(symbol: str, api_key: str, timeout: float) -> Optional[Dict]:
+    data = _get_json(f"https://financialmodelingprep.com/api/v3/quote/{symbol}", {'apikey': api_key}, timeout)
+    if not data:
+        return None
+    row = data[0]
+    return {
+        'last_price': row.get('price'),
+        'change': row.get('change'),
+        'change_percent': row.get('changesPercentage'),
+        'volume': row.get('volume'),
+        'name': row.get('name')
+    }
+
+
+def _fetch_finnhub(symbol: str, api_key: str, timeout: float) -> Optional[Dict]:
+    data = _get_json('https://finnhub.io/api/v1/quote', {'symbol': symbol, 'token': api_key}, timeout)
+    if not data or not data.get('c'):
+        return None
+    return {'last_price': data['c'], 'change': data.get('d'), 'change_percent': data.get('dp')}
+
+
+def _fetch_alpha_vantage(symbol: str, api_key: str, timeout: float) -> Optional[Dict]:
+    data = _get_json(
+        'https://www.alphavantage.co/query',
+        {'function': 'GLOBAL_QUOTE', 'symbol': symbol, 'apikey': api_key},
+        timeout
+    )
+    row = (data or {}).get('Global Quote') or {}
+    if not row.get('05. price'):
+        return None
+    return {
+        'last_price': float(row['05. price']),
+        'change': float(row.get('09. change') or 0),
+        'change_percent': float((row.get('10. change percent') or '0').rstrip('%')),
+        'volume': int(row.get('06. volume') or 0)
+    }
+
+
+def _fetch_polygon(symbol: str, api_key: str, timeout: float) -> Optional[Dict]:
+    data = _get_json(
+        f"https://api.polygon.io/v2/snapshot/locale/us/markets/stocks/tickers/{symbol}",
+        {'apiKey': api_key},
+        timeout
+    )
+    ticker = (data or {}).get('ticker') or {}
+    day = ticker.get('day') or {}
+    if not day.get('c'):
+        return None
+    return {
+        'last_price': day['c'],
+        'change': ticker.get('todaysChange'),
+        'change_percent': ticker.get('todaysChangePerc'),
+        'volume': day.get('v')
+    }
+
+
+class Provider:
+    """One upstream quote source"""
+
+    def __init__(self, name: str, fetch: Callable, config_key: Optional[str] = None,
+                 supports: Callable[[str], bool] = lambda symbol: True):
+        self.name = name
+        self.fetch = fetch
+        self.config_key = config_key
+        self.supports = supports
+        self.latency = LatencyTracker()
+        self.breaker = get_breaker(name, 'quote')
+        self.stats = {'calls': 0, 'errors': 0, 'empty': 0, 'wins': 0}
+
+    def api_key(self) -> Optional[str]:
+        """Configured key ('demo' keys count as missing); '' for keyless providers"""
+        if self.config_key is None:
+            return ''
+        key = current_app.config.get(self.config_key) if has_app_context() else os.getenv(self.config_key)
+        return None if key in (None, '', 'demo') else key
+
+    def hedge_delay(self) -> float:
+        p95 = self.latency.percentile(95)
+        return max(MIN_HEDGE_DELAY, p95 if p95 is not None else DEFAULT_HEDGE_DELAY)
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['p50'] = self.latency.percentile(50)
+        stats['p95'] = self.latency.percentile(95)
+        stats['breaker'] = self.breaker.state
+        return stats
+
+
+DEFAULT_PROVIDERS = [
+    Provider('yfinance', _fetch_yfinance),
+    Provider('fmp', _fetch_fmp, 'FMP_API_KEY'),
+    Provider('finnhub', _fetch_finnhub, 'FINNHUB_API_KEY', _is_us_symbol),
+    Provider('polygon', _fetch_polygon, 'POLYGON_API_KEY', _is_us_symbol),
+    Provider('alpha_vantage', _fetch_alpha_vantage, 'ALPHA_VANTAGE_API_KEY', _is_us_symbol)
+]
+
+
+class ProviderRouter:
+    """Routes quote requests across providers by latency, with hedging"""
+
+    def __init__(self, providers: Optional[List[Provider]] = None):
+        self.providers = providers if providers is not None else DEFAULT_PROVIDERS
+        self.stats = {'requests': 0, 'hedges': 0, 'failovers': 0, 'failures': 0, 'empty': 0}
+        self._executor = None
+        self._executor_pid = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Shared pool (recreated after fork, threads do not survive it)"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=ROUTER_WORKERS, thread_name_prefix='provider')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def candidates(self, symbol: str) -> List[tuple]:
+        """(provider, api_key) that can serve the symbol, fastest median first"""
+        usable = []
+        for order, provider in enumerate(self.providers):
+            api_key = provider.api_key()
+            if api_key is None or not provider.supports(symbol) or not provider.breaker.available():
+                continue
+            if provider.config_key and not REQUESTS_AVAILABLE:
+                continue
+            p50 = provider.latency.percentile(50)
+            # Providers without enough samples keep their configured order
+            usable.append((p50 if p50 is not None else float('inf'), order, provider, api_key))
+        usable.sort(key=lambda item: (item[0], item[1]))
+        return [(provider, api_key) for _, _, provider, api_key in usable]
+
+    def _call(self, provider: Provider, api_key: str, symbol: str, timeout: float, app):
+        started = time.time()
+        provider.stats['calls'] += 1
+        try:
+            if app is not None:
+                with app.app_context():
+                    result = provider.fetch(symbol, api_key, timeout)
+            else:
+                result = provider.fetch(symbol, api_key, timeout)
+        except Exception as e:
+            provider.stats['errors'] += 1
+            provider.breaker.record(False, time.time() - started)
+            logger.debug(f"{provider.name} quote for {symbol} failed: {e}")
+            return _FAILED
+        # An empty answer (unknown symbol) still means the provider is healthy
+        provider.breaker.record(True, time.time() - started)
+        result = normalize_quote(result)
+        if not result:
+            provider.stats['empty'] += 1
+            return None
+        provider.latency.record(time.time() - started)
+        return result
+
+    def _submit(self, queue: List[tuple], symbol: str, timeout: float, app):
+        """Start the next provider its breaker and budget allow; (future, provider) or None"""
+        while queue:
+            provider, api_key = queue.pop(0)
+            # Keyed HTTP providers have budgets in config; DataService limits itself
+            if provider.config_key and not rate_limiter.acquire(provider.name, INTERACTIVE).granted:
+                continue
+            # Last, so a half-open probe slot is only taken for a call that is made
+            if not provider.breaker.allow():
+                continue
+            return self._get_executor().submit(self._call, provider, api_key, symbol, timeout, app), provider
+        return None
+
+    def fetch_quote(self, symbol: str, timeout: float = ROUTER_TIMEOUT) -> Optional[Dict]:
+        """
+        First good quote from the providers; None when a provider answered
+        without data, QuoteUnavailableError when none answered in time
+
+        The losing request of a hedge is cancelled if it has not started;
+        one already in flight runs to completion and its answer is dropped
+        (its latency still counts).
+        """
+        self.stats['requests'] += 1
+        app = current_app._get_current_object() if has_app_context() else None
+        queue = self.candidates(symbol)
+        deadline = time.time() + timeout
+
+        started = self._submit(queue, symbol, timeout, app)
+        if started is None:
+            self.stats['failures'] += 1
+            raise QuoteUnavailableError(symbol)
+        in_flight = {started[0]: started[1]}
+        hedge_at = time.time() + started[1].hedge_delay()
+        hedged = False
+
+        while in_flight:
+            now = time.time()
+            if now >= deadline:
+                break
+            wake = deadline if hedged or not queue else min(deadline, hedge_at)
+            done, _ = wait(list(in_flight), timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+
+            failed = False
+            for future in done:
+                provider = in_flight.pop(future)
+                result = future.result()
+                if result is _FAILED:
+                    failed = True
+                    continue
+                for loser in in_flight:
+                    loser.cancel()
+                if not result:
+                    # The symbol is unknown upstream; other providers would only spend budget
+                    self.stats['empty'] += 1
+                    return None
+                provider.stats['wins'] += 1
+                return result
+
+            if queue and failed and (hedged or not in_flight):
+                # A request failed: replace it with the next provider right away
+                self.stats['failovers'] += 1
+                started = self._submit(queue, symbol, max(0.0, deadline - time.time()), app)
+                if started is not None:
+                    in_flight[started[0]] = started[1]
+                    hedge_at = time.time() + started[1].hedge_delay()
+            elif queue and not hedged and time.time() >= hedge_at:
+                # One hedge per request at most, and only within the hedge budget
+                hedged = True
+                if self._hedge_allowed():
+                    started = self._submit(queue, symbol, max(0.0, deadline - time.time()), app)
+                    if started is not None:
+                        self.stats['hedges'] += 1
+                        in_flight[started[0]] = started[1]
+
+        for future in in_flight:
+            future.cancel()
+        self.stats['failures'] += 1
+        raise QuoteUnavailableError(symbol)
+
+    def _hedge_allowed(self) -> bool:
+        return self.stats['hedges'] < HEDGE_MAX_RATIO * self.stats['requests']
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats['providers'] = {provider.name: provider.get_stats() for provider in self.providers}
+        return stats
+
+
+# Global router instance
+provider_router = ProviderRouter()
+
+
+def get_quote(symbol: str) -> Optional[Dict]:
+    """
+    Routed quote for a symbol, coalesced across users
+
+    None means the symbol is unknown upstream; QuoteUnavailableError that
+    no provider answered (not cached, the next caller tries again).
+    """
+    from .upstream_coalescer import upstream_coalescer
+    return upstream_coalescer.call('router', 'quote', symbol, lambda: provider_router.fetch_quote(symbol))
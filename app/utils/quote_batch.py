@@ -0,0 +1,217 @@
+"""
+Shared batch quote engine for Aksjeradar
+
+Real-time endpoints that poll a list of symbols used to fetch them one at a
+time. Here the whole list is fetched with one multi-ticker download; last
+price, change and change percent are computed for all symbols at once with
+pandas/NumPy, and the resulting summary frame is cached, so 20 symbols cost
+about the same as one.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .tiered_cache import tiered_cache
+from .ticker_registry import ticker_registry
+from .quote_board import quote_board
+from .rate_limiter import rate_limiter, BACKGROUND
+
+try:
+    import yfinance as yf
+    YFINANCE_AVAILABLE = True
+except ImportError:
+    yf = None
+    YFINANCE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# How long a batch summary is reused (seconds)
+BATCH_TTL = int(os.getenv('QUOTE_BATCH_TTL', 60))
+# Daily bars to download; a few days so the previous close survives holidays
+BATCH_PERIOD = '5d'
+MAX_BATCH_SYMBOLS = 50
+
+# Budget the ingest processes take one BACKGROUND token from per download;
+# separate from 'yfinance' so per-symbol lookups keep their own budget
+INGEST_RATE_LIMIT = os.getenv('QUOTE_INGEST_RATE_LIMIT', 'quote_ingest')
+
+SUMMARY_COLUMNS = ['price', 'previous_close', 'change', 'change_percent', 'volume']
+
+
+def _batch_key(symbols: List[str], period: str) -> str:
+    digest = hashlib.md5(','.join(sorted(symbols)).encode('utf-8')).hexdigest()
+    return f"batch_quotes:{period}:{digest}"
+
+
+def _download(symbols: List[str], period: str) -> Optional[pd.DataFrame]:
+    """One multi-ticker download; columns are a (field, symbol) MultiIndex"""
+    if YFINANCE_AVAILABLE:
+        frame = yf.download(
+            symbols,
+            period=period,
+            interval='1d',
+            group_by='column',
+            auto_adjust=False,
+            threads=True,
+            progress=False
+        )
+        if frame is None or frame.empty:
+            return None
+        if not isinstance(frame.columns, pd.MultiIndex):
+            # Single symbol downloads come back with flat columns
+            frame.columns = pd.MultiIndex.from_product([frame.columns, symbols])
+        return frame
+
+    # Without yfinance fall back to DataService history, one frame per symbol
+    from ..services.data_service import DataService
+    frames = {}
+    for symbol in symbols:
+        try:
+            data = DataService.get_stock_data(symbol, period=period)
+            if data is not None and not data.empty:
+                frames[symbol] = data
+        except Exception as e:
+            logger.warning(f"History fallback failed for {symbol}: {e}")
+    if not frames:
+        return None
+    return pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+
+def summarize(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Latest price, previous close, change and volume per symbol
+
+    Vectorized over all symbols. Each symbol uses its own last valid bar
+    (markets close on different holidays) and the valid bar before it.
+    """
+    field = 'Close' if 'Close' in frame.columns.get_level_values(0) else 'Adj Close'
+    close = frame[field].astype(float)
+    values = close.to_numpy()
+    valid = ~np.isnan(values)
+    has_data = valid.any(axis=0)
+
+    rows = np.arange(len(close))[:, None]
+    columns = np.arange(close.shape[1])
+    last_pos = len(close) - 1 - np.argmax(valid[::-1], axis=0)
+    price = values[last_pos, columns]
+
+    # Last valid value strictly before each symbol's last bar
+    before = np.where(valid & (rows < last_pos), values, np.nan)
+    previous = pd.DataFrame(before).ffill().to_numpy()[-1]
+    previous = np.where(np.isnan(previous), price, previous)
+
+    change = price - previous
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_percent = np.where(previous != 0, change / previous * 100, 0.0)
+
+    if 'Volume' in frame.columns.get_level_values(0):
+        volume = frame['Volume'].reindex(columns=close.columns).to_numpy()[last_pos, columns]
+    else:
+        volume = np.zeros(len(columns))
+
+    summary = pd.DataFrame({
+        'price': price,
+        'previous_close': previous,
+        'change': change,
+        'change_percent': change_percent,
+        'volume': np.nan_to_num(volume)
+    }, index=close.columns)
+    return summary[has_data].round({'price': 2, 'previous_close': 2, 'change': 2, 'change_percent': 2})
+
+
+def load_summary(symbols: List[str], period: str = BATCH_PERIOD) -> pd.DataFrame:
+    """Download and summarize without caching (used by the quote board ingest)"""
+    frame = _download(symbols, period)
+    if frame is None:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    return summarize(frame)
+
+
+def get_batch_summary(symbols: Iterable[str], period: str = BATCH_PERIOD) -> pd.DataFrame:
+    """Summary frame (index: symbol, columns: SUMMARY_COLUMNS) for the symbols found"""
+    symbols = [symbol for symbol in dict.fromkeys(symbols) if not ticker_registry.is_known_invalid(symbol)]
+    symbols = symbols[:MAX_BATCH_SYMBOLS]
+    if not symbols:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    summary = tiered_cache.cached(
+        namespace='stocks',
+        ttl=BATCH_TTL,
+        key_func=lambda: _batch_key(symbols, period)
+    )(lambda: load_summary(symbols, period))()
+
+    for symbol in symbols:
+        if symbol in summary.index:
+            ticker_registry.mark_valid(symbol)
+    return summary
+
+
+def get_batch_quotes(symbols: Iterable[str], period: str = BATCH_PERIOD) -> Dict[str, Dict]:
+    """Quotes as {symbol: {price, change, change_percent, volume}} for the symbols found"""
+    symbols = list(dict.fromkeys(symbols))
+    quotes = {}
+    if period == BATCH_PERIOD:
+        # Latest quotes written by the host's ingest process, if it runs
+        for symbol, quote in quote_board.get_many(symbols).items():
+            quote.pop('timestamp', None)
+            quotes[symbol] = quote
+        symbols = [symbol for symbol in symbols if symbol not in quotes]
+    if not symbols:
+        return quotes
+
+    quotes.update(summary_to_quotes(get_batch_summary(symbols, period)))
+    return quotes
+
+
+def summary_to_quotes(summary: pd.DataFrame) -> Dict[str, Dict]:
+    return {
+        symbol: {
+            'price': float(row.price),
+            'change': float(row.change),
+            'change_percent': float(row.change_percent),
+            'volume': int(row.volume)
+        }
+        for symbol, row in zip(summary.index, summary.itertuples(index=False))
+    }
+
+
+def load_quotes(symbols: List[str], period: str = BATCH_PERIOD) -> Dict[str, Dict]:
+    """Uncached quotes for any number of symbols, one download per MAX_BATCH_SYMBOLS"""
+    quotes = {}
+    for start in range(0, len(symbols), MAX_BATCH_SYMBOLS):
+        chunk = symbols[start:start + MAX_BATCH_SYMBOLS]
+        try:
+            quotes.update(summary_to_quotes(load_summary(chunk, period)))
+        except Exception as e:
+            logger.warning(f"Quote batch of {len(chunk)} symbols failed: {e}")
+    return quotes
+
+
+def load_quotes_budgeted(symbols: List[str], cursor: int = 0, api_name: str = INGEST_RATE_LIMIT,
+                         period: str = BATCH_PERIOD) -> Tuple[Dict[str, Dict], int]:
+    """
+    Uncached quotes for as many downloads as the rate limiter grants
+    BACKGROUND tokens for
+
+    Starts at symbol `cursor` and wraps around; returns (quotes, cursor for
+    the next call), so batches deferred for lack of budget go first next time.
+    """
+    if not symbols:
+        return {}, 0
+    cursor %= len(symbols)
+    ordered = symbols[cursor:] + symbols[:cursor]
+    quotes = {}
+    fetched = 0
+    for start in range(0, len(ordered), MAX_BATCH_SYMBOLS):
+        if not rate_limiter.acquire(api_name, BACKGROUND).granted:
+            logger.debug(f"Quote ingest out of {api_name} budget, {len(ordered) - fetched} symbols deferred")
+            break
+        chunk = ordered[start:start + MAX_BATCH_SYMBOLS]
+        quotes.update(load_quotes(chunk, period))
+        fetched += len(chunk)
+    return quotes, (cursor + fetched) % len(symbols)
@@ -0,0 +1,318 @@
+"""
+Shared-memory quote board for Aksjeradar
+
+A fixed-layout file, memory-mapped by every gunicorn worker on the host,
+holding the latest quote per symbol:
+
+    header | symbols S16[capacity] | last f8 | change f8 | change_percent f8
+           | volume i8 | timestamp f8
+
+One ingest process (`python -m app.utils.quote_board`, started from
+gunicorn's when_ready hook) polls upstream for every known symbol and
+writes the board; workers read it through NumPy views without copying or
+touching Redis. Writes are guarded by a sequence
+counter (odd while a write is in progress) so readers never see a torn row.
+"""
+
+import logging
+import mmap
+import os
+import tempfile
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BOARD_MAGIC = 0x41514231  # 'AQB1'
+BOARD_CAPACITY = int(os.getenv('QUOTE_BOARD_CAPACITY', 1024))
+# Seconds between ingest cycles
+INGEST_INTERVAL = int(os.getenv('QUOTE_BOARD_INTERVAL', 30))
+# Quotes older than this are treated as missing (seconds)
+MAX_QUOTE_AGE = int(os.getenv('QUOTE_BOARD_MAX_AGE', 120))
+# Readers retry opening a missing board at most this often (seconds)
+REOPEN_INTERVAL = 5
+
+SYMBOL_BYTES = 16
+HEADER_DTYPE = np.dtype([
+    ('magic', '<u8'),
+    ('epoch', '<u8'),       # random per board initialisation
+    ('capacity', '<u8'),
+    ('count', '<u8'),       # slots in use (append-only within an epoch)
+    ('sequence', '<u8'),    # odd while the writer is updating
+    ('updated_at', '<f8')
+])
+HEADER_SIZE = 64
+COLUMNS = (
+    ('last', '<f8'),
+    ('change', '<f8'),
+    ('change_percent', '<f8'),
+    ('volume', '<i8'),
+    ('timestamp', '<f8')
+)
+
+
+def default_board_path() -> str:
+    """Board file location (tmpfs when available)"""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.getenv('QUOTE_BOARD_PATH', os.path.join(base, 'aksjeradar-quotes.board'))
+
+
+def board_size(capacity: int) -> int:
+    size = HEADER_SIZE + SYMBOL_BYTES * capacity
+    for _, dtype in COLUMNS:
+        size += np.dtype(dtype).itemsize * capacity
+    return size
+
+
+class QuoteBoard:
+    """Memory-mapped quote board; one writer, any number of readers"""
+
+    def __init__(self, path: Optional[str] = None, capacity: int = BOARD_CAPACITY):
+        self.path = path or default_board_path()
+        self.capacity = capacity
+        self._mmap = None
+        self._pid = None
+        self._opened_at = 0.0
+        self._inode = None
+        self._index = {}
+        self._index_epoch = None
+        self._index_count = 0
+        self.header = None
+        self.symbols = None
+        self.columns = {}
+
+    # Mapping
+
+    def _map(self, fileno: int):
+        self._mmap = mmap.mmap(fileno, board_size(self.capacity))
+        self._inode = os.fstat(fileno).st_ino
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._mmap, offset=0)
+        offset = HEADER_SIZE
+        self.symbols = np.ndarray((self.capacity,), dtype=f'S{SYMBOL_BYTES}', buffer=self._mmap, offset=offset)
+        offset += SYMBOL_BYTES * self.capacity
+        for name, dtype in COLUMNS:
+            self.columns[name] = np.ndarray((self.capacity,), dtype=dtype, buffer=self._mmap, offset=offset)
+            offset += np.dtype(dtype).itemsize * self.capacity
+        self._pid = os.getpid()
+        self._index_epoch = None
+
+    def create(self):
+        """Open the board for writing, initialising it if missing or incompatible"""
+        size = board_size(self.capacity)
+        if os.path.exists(self.path) and os.path.getsize(self.path) != size:
+            # Never resize in place: readers still map the old file
+            os.unlink(self.path)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != size
+            if fresh:
+                os.ftruncate(fd, size)
+            self._map(fd)
+        finally:
+            os.close(fd)
+        if fresh or int(self.header['magic']) != BOARD_MAGIC or int(self.header['capacity']) != self.capacity:
+            self.header['sequence'] = 0
+            self.header['count'] = 0
+            self.header['capacity'] = self.capacity
+            self.header['epoch'] = uuid.uuid4().int & 0xFFFFFFFFFFFFFFFF
+            self.header['updated_at'] = 0.0
+            self.header['magic'] = BOARD_MAGIC
+            logger.info(f"Initialised quote board at {self.path} ({self.capacity} slots)")
+        return self
+
+    def _ensure_open(self) -> bool:
+        """Map the board for a reader (re-mapped after fork or when the file is replaced)"""
+        now = time.time()
+        if self._mmap is not None and self._pid == os.getpid():
+            if now - self._opened_at < REOPEN_INTERVAL:
+                return True
+            self._opened_at = now
+            try:
+                if os.stat(self.path).st_ino == self._inode:
+                    return True
+            except OSError:
+                return True  # keep serving the last mapping until a new board appears
+        elif now - self._opened_at < REOPEN_INTERVAL:
+            return False
+        self._opened_at = now
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except OSError:
+            return False
+        try:
+            if os.fstat(fd).st_size != board_size(self.capacity):
+                return False
+            self._map(fd)
+        finally:
+            os.close(fd)
+        if int(self.header['magic']) != BOARD_MAGIC:
+            self._mmap = None
+            return False
+        return True
+
+    @property
+    def available(self) -> bool:
+        return self._ensure_open()
+
+    # Symbol index
+
+    def _refresh_index(self):
+        """Rebuild symbol -> slot when the writer added symbols or re-initialised"""
+        epoch = int(self.header['epoch'])
+        count = int(self.header['count'])
+        if epoch == self._index_epoch and count == self._index_count:
+            return
+        if epoch != self._index_epoch:
+            self._index = {}
+            start = 0
+        else:
+            start = self._index_count
+        for slot in range(start, count):
+            self._index[self.symbols[slot].decode('ascii')] = slot
+        self._index_epoch = epoch
+        self._index_count = count
+
+    # Writer
+
+    def write(self, quotes: Dict[str, Dict], timestamp: Optional[float] = None) -> int:
+        """Write {symbol: {price|last, change, change_percent, volume[, timestamp]}}; returns rows written"""
+        self._refresh_index()
+        timestamp = timestamp or time.time()
+        slots, rows = [], []
+        for symbol, quote in quotes.items():
+            slot = self._index.get(symbol)
+            if slot is None:
+                count = int(self.header['count'])
+                encoded = symbol.encode('ascii', 'ignore')
+                if count >= self.capacity or len(encoded) > SYMBOL_BYTES:
+                    continue
+                self.symbols[count] = encoded
+                self.header['count'] = count + 1
+                self._refresh_index()
+                slot = count
+            slots.append(slot)
+            rows.append(quote)
+        if not slots:
+            return 0
+
+        slots = np.asarray(slots)
+        self.header['sequence'] += 1
+        try:
+            self.columns['last'][slots] = [quote.get('last', quote.get('price')) or np.nan for quote in rows]
+            self.columns['change'][slots] = [quote.get('change') or 0.0 for quote in rows]
+            self.columns['change_percent'][slots] = [quote.get('change_percent') or 0.0 for quote in rows]
+            self.columns['volume'][slots] = [int(quote.get('volume') or 0) for quote in rows]
+            self.columns['timestamp'][slots] = [quote.get('timestamp') or timestamp for quote in rows]
+            self.header['updated_at'] = timestamp
+        finally:
+            self.header['sequence'] += 1
+        return len(slots)
+
+    # Readers
+
+    def get_many(self, symbols: Iterable[str], max_age: int = MAX_QUOTE_AGE) -> Dict[str, Dict]:
+        """Fresh quotes for the symbols on the board (others are left out)"""
+        if not self._ensure_open():
+            return {}
+        self._refresh_index()
+        wanted = [(symbol, self._index[symbol]) for symbol in symbols if symbol in self._index]
+        if not wanted:
+            return {}
+        slots = np.asarray([slot for _, slot in wanted])
+
+        for _ in range(5):
+            sequence = int(self.header['sequence'])
+            if sequence % 2:
+                time.sleep(0.0001)
+                continue
+            values = {name: column[slots].tolist() for name, column in self.columns.items()}
+            if int(self.header['sequence']) == sequence:
+                break
+        else:
+            return {}
+
+        cutoff = time.time() - max_age
+        quotes = {}
+        for position, (symbol, _) in enumerate(wanted):
+            if values['timestamp'][position] < cutoff:
+                continue
+            quotes[symbol] = {
+                'price': values['last'][position],
+                'change': values['change'][position],
+                'change_percent': values['change_percent'][position],
+                'volume': values['volume'][position],
+                'timestamp': values['timestamp'][position]
+            }
+        return quotes
+
+    def get(self, symbol: str, max_age: int = MAX_QUOTE_AGE) -> Optional[Dict]:
+        return self.get_many([symbol], max_age).get(symbol)
+
+    def get_stats(self) -> Dict:
+        if not self._ensure_open():
+            return {'available': False, 'path': self.path}
+        return {
+            'available': True,
+            'path': self.path,
+            'capacity': self.capacity,
+            'symbols': int(self.header['count']),
+            'updated_at': float(self.header['updated_at'])
+        }
+
+
+# Per-process reader; the ingest process makes its own writer
+quote_board = QuoteBoard()
+
+
+def ingest_once(board: QuoteBoard, symbols: List[str], cursor: int = 0) -> Tuple[int, int]:
+    """
+    Fetch quotes for the batches the upstream budget allows and write them
+    to the board; returns (symbols written, cursor for the next cycle)
+    """
+    from .quote_batch import load_quotes_budgeted
+    quotes, cursor = load_quotes_budgeted(symbols, cursor)
+    return board.write(quotes), cursor
+
+
+def run_ingest(interval: int = INGEST_INTERVAL):
+    """
+    Ingest loop for this host's board
+
+    With Redis configured the board is fed from the quote stream and only
+    the deployment's ingest leader polls upstream (see quote_stream);
+    without Redis this process polls upstream itself.
+    """
+    os.environ['AKSJERADAR_PROCESS_ROLE'] = 'ingest'
+    from .. import create_app
+    from .redis_pool import is_redis_configured
+    from .ticker_registry import ticker_registry
+
+    parent = os.getppid()
+    app = create_app()
+    board = QuoteBoard().create()
+    get_symbols = lambda: ticker_registry.known_symbols()[:board.capacity]
+    # Stop when the gunicorn master goes away instead of polling as an orphan
+    keep_running = lambda: os.getppid() == parent
+    logger.info(f"Quote board ingest started (pid {os.getpid()}, every {interval}s)")
+
+    with app.app_context():
+        if is_redis_configured():
+            from .quote_stream import run_stream_ingest
+            run_stream_ingest(board, interval, get_symbols, keep_running)
+            return
+
+        cursor = 0
+        while keep_running():
+            started = time.time()
+            symbols = get_symbols()
+            written, cursor = ingest_once(board, symbols, cursor)
+            logger.debug(f"Quote board: {written}/{len(symbols)} symbols in {time.time() - started:.1f}s")
+            time.sleep(max(1.0, interval - (time.time() - started)))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    run_ingest()
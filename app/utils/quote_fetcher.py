@@ -0,0 +1,169 @@
+"""
+Batched quote fetching for Aksjeradar
+
+Price widgets ask for many tickers at once. Cached quotes are read with one
+multi-get; misses are fetched concurrently on a small shared thread pool
+and the request waits at most until its deadline. Quotes that arrive after
+the deadline are still cached, so the next poll picks them up.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+from .tiered_cache import tiered_cache
+from .ticker_registry import ticker_registry
+from .market_open import symbol_ttl
+from .provider_router import get_quote
+
+logger = logging.getLogger(__name__)
+
+# Quotes are short-lived; widgets poll every 30-60 seconds
+QUOTE_TTL = int(os.getenv('QUOTE_CACHE_TTL', 60))
+# Upper bound on concurrent upstream calls per worker process
+QUOTE_FETCH_WORKERS = int(os.getenv('QUOTE_FETCH_WORKERS', 8))
+# Default time budget for fetching misses (seconds)
+DEFAULT_DEADLINE = float(os.getenv('QUOTE_FETCH_DEADLINE', 3.0))
+
+QUOTE_FIELDS = ('last_price', 'change_percent', 'change', 'volume', 'name', 'market_state')
+
+_executor = None
+_executor_pid = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Shared pool (recreated after fork, threads do not survive it)"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=QUOTE_FETCH_WORKERS, thread_name_prefix='quote-fetch')
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def _quote_key(ticker: str) -> str:
+    return f"quote:{ticker}"
+
+
+def empty_quote(ticker: str, market_state: str = 'UNKNOWN') -> Dict:
+    """Placeholder for tickers without data"""
+    return {
+        'last_price': None,
+        'change_percent': None,
+        'change': None,
+        'volume': None,
+        'name': ticker,
+        'market_state': market_state
+    }
+
+
+def _to_quote(ticker: str, stock_info: Optional[Dict]) -> Optional[Dict]:
+    if not stock_info:
+        return None
+    quote = {field: stock_info.get(field) for field in QUOTE_FIELDS}
+    quote['name'] = quote['name'] or ticker
+    quote['market_state'] = quote['market_state'] or 'OPEN'
+    return quote
+
+
+def _fetch_one(ticker: str) -> Optional[Dict]:
+    """
+    Fetch one quote through the provider router (coalesced with other callers)
+
+    Only an empty answer marks the ticker invalid; QuoteUnavailableError
+    (no provider answered) propagates and the ticker gets an error placeholder.
+    """
+    quote = _to_quote(ticker, get_quote(ticker))
+    if quote is None:
+        ticker_registry.mark_invalid(ticker)
+    else:
+        ticker_registry.mark_valid(ticker)
+        tiered_cache.set(_quote_key(ticker), quote, 'stocks', ttl=symbol_ttl(ticker, QUOTE_TTL))
+    return quote
+
+
+def cached_quote(ticker: str) -> Optional[Dict]:
+    """Last quote cached for the ticker, if any (no upstream call)"""
+    return tiered_cache.get(_quote_key(ticker), 'stocks')
+
+
+def confirm_unknown(ticker: str) -> bool:
+    """
+    Check an empty DataService answer with the provider router
+
+    True (and the ticker marked invalid) only when a provider answered
+    without data; during an outage nothing is marked and False is returned.
+    """
+    try:
+        return _fetch_one(ticker) is None
+    except Exception as e:
+        logger.debug(f"Could not confirm {ticker} as unknown: {e}")
+        return False
+
+
+def fetch_quotes(tickers: Iterable[str], deadline: float = DEFAULT_DEADLINE) -> Tuple[Dict[str, Dict], List[str]]:
+    """
+    Get quotes for several tickers
+
+    Returns (quotes, pending): quotes maps every requested ticker to a
+    quote dict (placeholders for unknown or failed tickers); pending lists
+    the tickers still being fetched when the deadline passed.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    quotes = {}
+
+    lookup = []
+    for ticker in tickers:
+        if ticker_registry.is_known_invalid(ticker):
+            quotes[ticker] = empty_quote(ticker)
+        else:
+            lookup.append(ticker)
+
+    cached = tiered_cache.get_many([_quote_key(ticker) for ticker in lookup], 'stocks')
+    misses = []
+    for ticker in lookup:
+        quote = cached.get(_quote_key(ticker))
+        if quote is not None:
+            quotes[ticker] = quote
+        else:
+            misses.append(ticker)
+
+    if not misses:
+        return {ticker: quotes[ticker] for ticker in tickers}, []
+
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def fetch(ticker):
+        try:
+            if app is not None:
+                with app.app_context():
+                    return _fetch_one(ticker)
+            return _fetch_one(ticker)
+        except Exception as e:
+            logger.warning(f"Quote fetch failed for {ticker}: {e}")
+            raise
+
+    started = time.time()
+    executor = _get_executor()
+    futures = {executor.submit(fetch, ticker): ticker for ticker in misses}
+    done, not_done = wait(futures, timeout=deadline)
+
+    for future in done:
+        ticker = futures[future]
+        if future.exception() is not None:
+            quotes[ticker] = empty_quote(ticker, 'ERROR')
+        else:
+            quotes[ticker] = future.result() or empty_quote(ticker)
+
+    pending = [futures[future] for future in not_done]
+    for ticker in pending:
+        quotes[ticker] = empty_quote(ticker, 'PENDING')
+
+    logger.debug(
+        f"Quotes: {len(tickers)} requested, {len(cached)} cached, {len(misses)} fetched, "
+        f"{len(pending)} pending after {time.time() - started:.2f}s"
+    )
+    return {ticker: quotes[ticker] for ticker in tickers}, pending
@@ -0,0 +1,300 @@
+"""
+Redis-streams quote distribution for Aksjeradar
+
+With several nodes, each node used to poll upstream for the same quotes.
+Now exactly one ingest process in the deployment (the holder of a Redis
+leader lease) polls upstream and appends normalized ticks to a Redis
+stream. Consumers read the stream through consumer groups:
+
+- every node's quote board process reads with its own group
+  (``board:<hostname>``), so every node sees every tick
+- Celery workers share the ``celery`` group, so each tick is handled once
+
+Consumer groups remember the last delivered ID, so a consumer that
+reconnects first re-reads its own unacknowledged ticks and then continues
+where it stopped. Ticks left pending by consumers that never come back
+(recycled Celery children) are claimed by live consumers after
+CLAIM_IDLE_MS, and the ingest leader deletes consumers and node groups that
+have been idle for long (hosts that are gone).
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import redis
+
+from .redis_pool import get_redis
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'quotes:ticks'
+# Approximate stream length: about ten ingest cycles of a full board
+STREAM_MAXLEN = int(os.getenv('QUOTE_STREAM_MAXLEN', 10000))
+LEADER_KEY = 'quotes:ingest_leader'
+
+# Pending ticks idle this long are taken over from their consumer
+CLAIM_IDLE_MS = int(os.getenv('QUOTE_STREAM_CLAIM_IDLE_MS', 60000))
+# Consumers (without pending ticks) and node groups idle this long are deleted
+CONSUMER_IDLE_MS = int(os.getenv('QUOTE_STREAM_CONSUMER_IDLE_MS', 3600 * 1000))
+GROUP_IDLE_MS = int(os.getenv('QUOTE_STREAM_GROUP_IDLE_MS', 86400 * 1000))
+PRUNE_INTERVAL = 600
+BOARD_GROUP_PREFIX = 'board:'
+
+TICK_FIELDS = ('price', 'change', 'change_percent', 'volume')
+
+# Extend the lease only while we still hold it
+EXTEND_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def get_stream_client():
+    return get_redis('quotes')
+
+
+def encode_tick(symbol: str, quote: Dict, timestamp: float) -> Dict[str, str]:
+    """Normalized stream entry for one quote"""
+    tick = {'symbol': symbol, 'ts': repr(float(timestamp))}
+    for field in TICK_FIELDS:
+        value = quote.get(field)
+        tick[field] = '' if value is None else repr(float(value))
+    return tick
+
+
+def decode_tick(fields: Dict) -> Optional[tuple]:
+    """(symbol, quote) from a stream entry"""
+    fields = {
+        (key.decode() if isinstance(key, bytes) else key): (value.decode() if isinstance(value, bytes) else value)
+        for key, value in fields.items()
+    }
+    symbol = fields.get('symbol')
+    if not symbol:
+        return None
+    quote = {}
+    for field in TICK_FIELDS:
+        value = fields.get(field)
+        if value:
+            quote[field] = int(float(value)) if field == 'volume' else float(value)
+    quote['timestamp'] = float(fields.get('ts') or 0)
+    return symbol, quote
+
+
+def publish_ticks(quotes: Dict[str, Dict], client=None, timestamp: Optional[float] = None) -> int:
+    """Append one tick per quote to the stream; returns ticks published"""
+    if not quotes:
+        return 0
+    client = client or get_stream_client()
+    timestamp = timestamp or time.time()
+    pipe = client.pipeline(transaction=False)
+    for symbol, quote in quotes.items():
+        pipe.xadd(STREAM_KEY, encode_tick(symbol, quote, timestamp), maxlen=STREAM_MAXLEN, approximate=True)
+    pipe.execute()
+    return len(quotes)
+
+
+class QuoteIngestor:
+    """Upstream poller; only the lease holder in the deployment polls"""
+
+    def __init__(self, interval: int, client=None):
+        self.interval = interval
+        self.client = client or get_stream_client()
+        self.identity = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ms = interval * 3 * 1000
+        self.cursor = 0
+        self.pruned_at = 0.0
+        self._extend_lease = self.client.register_script(EXTEND_LEASE_SCRIPT)
+
+    def is_leader(self) -> bool:
+        """Take or renew the leader lease"""
+        try:
+            if self.client.set(LEADER_KEY, self.identity, nx=True, px=self.lease_ms):
+                logger.info(f"Quote ingest leader: {self.identity}")
+                return True
+            return bool(self._extend_lease(keys=[LEADER_KEY], args=[self.identity, self.lease_ms]))
+        except redis.RedisError as e:
+            logger.warning(f"Quote ingest lease check failed: {e}")
+            return False
+
+    def run_once(self, symbols: List[str]) -> int:
+        """
+        Poll the batches the upstream budget allows and publish them if we
+        are the leader; returns ticks published
+        """
+        if not self.is_leader():
+            return 0
+        from .quote_batch import load_quotes_budgeted
+        quotes, self.cursor = load_quotes_budgeted(symbols, self.cursor)
+        published = publish_ticks(quotes, self.client)
+        if time.time() - self.pruned_at >= PRUNE_INTERVAL:
+            self.pruned_at = time.time()
+            try:
+                prune_consumers(self.client)
+            except redis.RedisError as e:
+                logger.warning(f"Quote stream pruning failed: {e}")
+        return published
+
+    def run(self, get_symbols: Callable[[], List[str]], keep_running: Callable[[], bool] = lambda: True):
+        while keep_running():
+            started = time.time()
+            try:
+                published = self.run_once(get_symbols())
+                if published:
+                    logger.debug(f"Published {published} ticks in {time.time() - started:.1f}s")
+            except Exception as e:
+                logger.warning(f"Quote ingest cycle failed: {e}")
+            time.sleep(max(1.0, self.interval - (time.time() - started)))
+
+
+class QuoteStreamConsumer:
+    """Consumer-group reader that hands batches of ticks to a handler"""
+
+    def __init__(self, group: str, handler: Callable[[Dict[str, Dict]], object], consumer: Optional[str] = None,
+                 client=None, count: int = 1000, block_ms: int = 2000):
+        self.group = group
+        self.handler = handler
+        self.consumer = consumer or f"{socket.gethostname()}:{os.getpid()}"
+        self.client = client or get_stream_client()
+        self.count = count
+        self.block_ms = block_ms
+        self.stats = {'ticks': 0, 'batches': 0, 'reconnects': 0}
+
+    def ensure_group(self):
+        """Create the group if needed; new groups start with the retained ticks"""
+        try:
+            self.client.xgroup_create(STREAM_KEY, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read_batch(self, pending: bool = False) -> int:
+        """
+        Read, handle and acknowledge one batch; returns entries read
+
+        With pending=True this re-reads entries delivered to this consumer
+        but never acknowledged (e.g. it crashed mid-batch).
+        """
+        response = self.client.xreadgroup(
+            self.group,
+            self.consumer,
+            {STREAM_KEY: '0' if pending else '>'},
+            count=self.count,
+            block=None if pending or not self.block_ms else self.block_ms
+        )
+        return self._handle([entry for _, entries in response or [] for entry in entries])
+
+    def claim_idle(self, min_idle_ms: int = CLAIM_IDLE_MS) -> int:
+        """
+        Take over, handle and acknowledge ticks other consumers of the group
+        left pending for min_idle_ms (consumers that went away); returns
+        entries claimed
+        """
+        claimed = 0
+        start = '0-0'
+        while True:
+            response = self.client.xautoclaim(
+                STREAM_KEY, self.group, self.consumer, min_idle_ms, start_id=start, count=self.count
+            )
+            start, entries = response[0], response[1]
+            claimed += self._handle(entries)
+            if start in (b'0-0', '0-0'):
+                return claimed
+
+    def _handle(self, entries: List[tuple]) -> int:
+        ids, quotes = [], {}
+        for entry_id, fields in entries:
+            ids.append(entry_id)
+            # Entries trimmed from the stream come back without fields
+            tick = decode_tick(fields) if fields else None
+            if tick:
+                # Later ticks for a symbol replace earlier ones in the batch
+                quotes[tick[0]] = tick[1]
+        if not ids:
+            return 0
+        if quotes:
+            self.handler(quotes)
+        self.client.xack(STREAM_KEY, self.group, *ids)
+        self.stats['ticks'] += len(ids)
+        self.stats['batches'] += 1
+        return len(ids)
+
+    def run(self, keep_running: Callable[[], bool] = lambda: True):
+        """Consume until keep_running() is false, reconnecting with backoff"""
+        backoff = 1.0
+        replay = True
+        while keep_running():
+            try:
+                if replay:
+                    self.ensure_group()
+                    while self.read_batch(pending=True):
+                        pass
+                    self.claim_idle()
+                    replay = False
+                self.read_batch()
+                backoff = 1.0
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"Quote stream connection lost ({e}); retrying in {backoff:.0f}s")
+                self.stats['reconnects'] += 1
+                replay = True
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            except redis.ResponseError as e:
+                # NOGROUP after the stream was deleted: recreate and replay
+                logger.warning(f"Quote stream error: {e}")
+                replay = True
+                time.sleep(backoff)
+
+
+def _text(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def prune_consumers(client=None, consumer_idle_ms: int = CONSUMER_IDLE_MS,
+                    group_idle_ms: int = GROUP_IDLE_MS) -> Dict[str, int]:
+    """
+    Delete consumers idle for consumer_idle_ms with nothing pending, and node
+    groups (board:<hostname>) whose consumers have all been idle for
+    group_idle_ms; a node that comes back recreates its group
+    """
+    client = client or get_stream_client()
+    removed = {'consumers': 0, 'groups': 0}
+    for group in client.xinfo_groups(STREAM_KEY):
+        name = _text(group['name'])
+        consumers = client.xinfo_consumers(STREAM_KEY, name)
+        # A group without consumers may just have been created; leave it
+        if name.startswith(BOARD_GROUP_PREFIX) and consumers and all(
+                c['idle'] >= group_idle_ms for c in consumers):
+            client.xgroup_destroy(STREAM_KEY, name)
+            removed['groups'] += 1
+            logger.info(f"Removed quote stream group {name} (idle)")
+            continue
+        for consumer in consumers:
+            if consumer['pending'] == 0 and consumer['idle'] >= consumer_idle_ms:
+                client.xgroup_delconsumer(STREAM_KEY, name, _text(consumer['name']))
+                removed['consumers'] += 1
+    return removed
+
+
+def run_stream_ingest(board, interval: int, get_symbols: Callable[[], List[str]],
+                      keep_running: Callable[[], bool] = lambda: True):
+    """
+    Node ingest: poll upstream when we hold the lease, and always feed this
+    node's quote board from the stream
+    """
+    ingestor = QuoteIngestor(interval)
+    poller = threading.Thread(
+        target=ingestor.run,
+        args=(get_symbols, keep_running),
+        name='quote-ingest-poller',
+        daemon=True
+    )
+    poller.start()
+
+    consumer = QuoteStreamConsumer(f"{BOARD_GROUP_PREFIX}{socket.gethostname()}", board.write, consumer='board')
+    consumer.run(keep_running)
@@ -0,0 +1,131 @@
+"""
+Quote versions for delta polling
+
+Every time a symbol's quote changes it gets a new version from one
+monotonically increasing counter. Polling clients send the highest version
+they have seen (``since=``) and receive only the symbols with a newer
+version, or 304 Not Modified when nothing changed.
+
+Versions live in Redis (one counter, one hash per payload scope) so every
+worker and node hands out the same numbers. Without Redis they are kept per
+process and mean nothing to another worker, so ``since`` is ignored and the
+full payload is sent.
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from .redis_pool import get_redis, is_redis_configured
+
+logger = logging.getLogger(__name__)
+
+COUNTER_KEY = 'quotes:version'
+VERSIONS_KEY = 'quotes:versions:{scope}'
+
+# ARGV: symbol, fingerprint pairs. Keeps a symbol's version while its
+# fingerprint is unchanged, otherwise assigns the next counter value.
+TRACK_SCRIPT = """
+local result = {}
+for i = 1, #ARGV, 2 do
+    local symbol = ARGV[i]
+    local fingerprint = ARGV[i + 1]
+    local current = redis.call('hget', KEYS[1], symbol)
+    local version = nil
+    if current then
+        local sep = string.find(current, ':', 1, true)
+        if sep and string.sub(current, sep + 1) == fingerprint then
+            version = tonumber(string.sub(current, 1, sep - 1))
+        end
+    end
+    if not version then
+        version = redis.call('incr', KEYS[2])
+        redis.call('hset', KEYS[1], symbol, version .. ':' .. fingerprint)
+    end
+    result[#result + 1] = version
+end
+return result
+"""
+
+
+def fingerprint(quote: Dict, fields: Iterable[str]) -> str:
+    return '|'.join(repr(quote.get(field)) for field in fields)
+
+
+def parse_since(value) -> Optional[int]:
+    """Client's last seen version (None when missing or malformed)"""
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+class QuoteVersions:
+    """Assigns versions to quotes and filters payloads down to changes"""
+
+    def __init__(self, client=None):
+        self._client = client
+        self._script = None
+        self._local_counter = 0
+        self._local_versions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None and is_redis_configured():
+            self._client = get_redis('quotes')
+        return self._client
+
+    def track(self, quotes: Dict[str, Dict], fields: Iterable[str], scope: str) -> Dict[str, int]:
+        """Version of every quote (new versions for quotes that changed)"""
+        return self._track(quotes, fields, scope)[0]
+
+    def _track(self, quotes: Dict[str, Dict], fields: Iterable[str], scope: str) -> Tuple[Dict[str, int], bool]:
+        """(versions, True if they are shared by all workers)"""
+        fields = tuple(fields)
+        symbols = list(quotes)
+        if not symbols:
+            return {}, self.client is not None
+        fingerprints = [fingerprint(quotes[symbol], fields) for symbol in symbols]
+
+        if self.client is not None:
+            try:
+                if self._script is None:
+                    self._script = self.client.register_script(TRACK_SCRIPT)
+                args = [item for pair in zip(symbols, fingerprints) for item in pair]
+                versions = self._script(keys=[VERSIONS_KEY.format(scope=scope), COUNTER_KEY], args=args)
+                return dict(zip(symbols, (int(version) for version in versions))), True
+            except Exception as e:
+                logger.debug(f"Quote versions falling back to this process: {e}")
+
+        with self._lock:
+            scoped = self._local_versions.setdefault(scope, {})
+            versions = {}
+            for symbol, fp in zip(symbols, fingerprints):
+                current = scoped.get(symbol)
+                if current is None or current[1] != fp:
+                    self._local_counter += 1
+                    current = (self._local_counter, fp)
+                    scoped[symbol] = current
+                versions[symbol] = current[0]
+            return versions, False
+
+    def changes_since(self, quotes: Dict[str, Dict], fields: Iterable[str], scope: str,
+                      since: Optional[int]) -> Tuple[Dict[str, Dict], int]:
+        """
+        (quotes changed after `since`, current version)
+
+        With since=None, or when versions are per process, every quote is
+        returned. The current version is the highest version among the
+        quotes (or `since` when nothing changed).
+        """
+        versions, shared = self._track(quotes, fields, scope)
+        version = max(versions.values(), default=since or 0)
+        if since is None or not shared:
+            return quotes, version
+        changed = {symbol: quote for symbol, quote in quotes.items() if versions.get(symbol, 0) > since}
+        return changed, max(version, since)
+
+
+# Global quote version tracker
+quote_versions = QuoteVersions()
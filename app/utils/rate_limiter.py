@@ -1,102 +1,207 @@
-import redis
+"""
+Upstream API rate limiter for Aksjeradar
+
+Token bucket per provider that never sleeps in a request: a call either
+gets a token or is deferred with the number of seconds until one is
+available, so the caller can serve cached or stale data instead of tying
+up the worker. Interactive requests may use the whole bucket; background
+refresh jobs only get tokens while a reserve is left for interactive
+traffic, but never less than one token per window. Budgets come from
+RATE_LIMIT_<PROVIDER> in the app config; a budget's ``reserve`` overrides
+the default reserve share (0 for budgets only background jobs use).
+
+With Redis the limit is an exact sliding window shared by every gunicorn
+worker and Celery process: check and record happen in one Lua script, one
+round trip, timed by the Redis server clock. A ``burst`` smaller than
+``calls`` adds a second, shorter window of ``burst`` calls that refills at
+the same rate as the local bucket, so both backends allow the same bursts.
+"""
+
 import time
-from flask import current_app, has_app_context
-from typing import Optional
+from flask import current_app, has_app_context, has_request_context
+from typing import Dict, NamedTuple, Optional
 import logging
 import os
-from collections import defaultdict, deque
-from datetime import datetime, timedelta
+import socket
+import threading
+from collections import defaultdict
+from .redis_pool import get_redis
 
 logger = logging.getLogger(__name__)
 
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Share of each bucket background jobs may not touch
+BACKGROUND_RESERVE = float(os.getenv('RATE_LIMIT_BACKGROUND_RESERVE', 0.5))
+
+# KEYS[1]: call zset. ARGV: caller id, then (window µs, limit) pairs; the
+# call must fit every window. Returns {1, 0} when the call is recorded, else
+# {0, µs until a slot frees in every window}.
+SLIDING_WINDOW_SCRIPT = """
+local time = redis.call('time')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+local longest = 0
+for i = 2, #ARGV, 2 do
+    longest = math.max(longest, tonumber(ARGV[i]))
+end
+redis.call('zremrangebyscore', KEYS[1], '-inf', now - longest)
+local denied = false
+local retry = 0
+for i = 2, #ARGV, 2 do
+    local window = tonumber(ARGV[i])
+    local limit = tonumber(ARGV[i + 1])
+    local count = redis.call('zcount', KEYS[1], '(' .. (now - window), '+inf')
+    if count >= limit then
+        denied = true
+        -- The call that has to leave this window before one more fits
+        local offset = count - math.max(limit, 1)
+        local entry = redis.call('zrangebyscore', KEYS[1], '(' .. (now - window), '+inf', 'WITHSCORES', 'LIMIT', offset, 1)
+        local wait = window
+        if entry[2] ~= nil then
+            wait = tonumber(entry[2]) + window - now
+        end
+        retry = math.max(retry, wait)
+    end
+end
+if denied then
+    return {0, retry}
+end
+redis.call('zadd', KEYS[1], now, now .. ':' .. ARGV[1])
+redis.call('pexpire', KEYS[1], math.ceil(longest / 1000))
+return {1, 0}
+"""
+
+
+class RateDecision(NamedTuple):
+    """Outcome of a token request; retry_after is 0 when granted"""
+    granted: bool
+    retry_after: float
+
+
 class RateLimiter:
-    """Simple in-memory rate limiter with optional Redis support"""
-    
+    """Non-blocking token-bucket limiter with optional Redis support"""
+
     def __init__(self, redis_url: Optional[str] = None):
         try:
             # Configure Redis if URL is provided
             self.redis_url = redis_url or os.environ.get('REDIS_URL')
             self.redis = None
             if self.redis_url:
-                self.redis = redis.from_url(self.redis_url)
-                self.redis.ping()  # Test connection
+                # Shared pool, connects lazily; failures fall back to in-memory per call
+                self.redis = get_redis('ratelimit', self.redis_url)
                 logger.info("Rate limiter using Redis backend")
             else:
                 logger.info("Rate limiter using in-memory backend")
         except Exception as e:
             logger.warning(f"Redis connection failed, using in-memory rate limiting: {str(e)}")
             self.redis = None
-        
-        # In-memory rate limiting (fallback or default)
-        self.api_calls = defaultdict(lambda: deque(maxlen=1000))
+        self._window_script = None
+        self._caller_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        # In-memory token buckets (fallback or default): api_name -> [tokens, updated_at]
+        self.buckets = {}
+        self.lock = threading.Lock()
         self.api_limits = {
             'yfinance': {'calls': 2, 'per_seconds': 60},  # 2 calls per minute
+            'quote_ingest': {'calls': 60, 'per_seconds': 60, 'reserve': 0},  # batch downloads
             'default': {'calls': 5, 'per_seconds': 60}    # 5 calls per minute
         }
-    
+        self.stats = defaultdict(lambda: {'granted': 0, 'deferred': 0})
+
     def _get_app_limit(self, api_name: str) -> dict:
         """Get rate limit from app config if available"""
         if has_app_context():
             config_key = f"RATE_LIMIT_{api_name.upper()}"
-            if hasattr(current_app.config, config_key):
+            if config_key in current_app.config:
                 return current_app.config[config_key]
         return self.api_limits.get(api_name, self.api_limits['default'])
-    
-    def wait_if_needed(self, api_name: str = 'default') -> float:
+
+    def acquire(self, api_name: str = 'default', priority: Optional[str] = None) -> RateDecision:
         """
-        Check if we need to wait before making another API call
-        Returns the wait time in seconds (0 if no wait needed)
+        Take a token for one upstream call without waiting
+
+        priority defaults to INTERACTIVE inside a request and BACKGROUND
+        elsewhere (Celery tasks, ingest processes).
         """
+        if priority is None:
+            priority = INTERACTIVE if has_request_context() else BACKGROUND
         limit_config = self._get_app_limit(api_name)
-        max_calls = limit_config['calls']
-        period_seconds = limit_config['per_seconds']
-        
-        now = datetime.now()
-        cutoff_time = now - timedelta(seconds=period_seconds)
-        
-        # Use Redis if available
+        capacity = float(limit_config.get('burst', limit_config['calls']))
+        rate = limit_config['calls'] / float(limit_config['per_seconds'])
+        # Share of every limit a background call must leave unused
+        reserve_share = 0.0
+        if priority == BACKGROUND:
+            reserve_share = float(limit_config.get('reserve', BACKGROUND_RESERVE))
+
+        decision = None
         if self.redis:
             try:
-                # Trim old entries and count recent calls
-                key = f"rate_limit:{api_name}"
-                self.redis.zremrangebyscore(key, 0, cutoff_time.timestamp())
-                recent_calls = self.redis.zcount(key, cutoff_time.timestamp(), float('inf'))
-                
-                if recent_calls >= max_calls:
-                    # Get oldest timestamp in window
-                    oldest = self.redis.zrange(key, 0, 0, withscores=True)
-                    if oldest:
-                        oldest_ts = oldest[0][1]
-                        wait_time = period_seconds - (now.timestamp() - oldest_ts)
-                        if wait_time > 0:
-                            time.sleep(wait_time)
-                            return wait_time
-                
-                # Record this call
-                self.redis.zadd(key, {now.isoformat(): now.timestamp()})
-                self.redis.expire(key, period_seconds * 2)  # Set expiry
-                return 0
-                
+                decision = self._acquire_redis(api_name, limit_config, reserve_share)
             except Exception as e:
                 logger.warning(f"Redis rate limiting failed, falling back to in-memory: {str(e)}")
-                # Fall through to in-memory implementation
-        
-        # In-memory implementation
-        calls = self.api_calls[api_name]
-        calls = [ts for ts in calls if ts > cutoff_time]
-        self.api_calls[api_name] = deque(calls, maxlen=1000)
-        
-        if len(calls) >= max_calls:
-            # Need to wait - calculate time
-            oldest_call = min(calls)
-            wait_time = (oldest_call + timedelta(seconds=period_seconds) - now).total_seconds()
-            if wait_time > 0:
-                time.sleep(wait_time)
-                return wait_time
-        
-        # Record this call
-        self.api_calls[api_name].append(now)
-        return 0
+        if decision is None:
+            # Background callers keep at least one token of a bucket
+            reserve = min(capacity * reserve_share, capacity - 1)
+            decision = self._acquire_local(api_name, capacity, rate, max(0.0, reserve))
+
+        self.stats[api_name]['granted' if decision.granted else 'deferred'] += 1
+        return decision
+
+    def _acquire_local(self, api_name: str, capacity: float, rate: float, reserve: float) -> RateDecision:
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated_at = self.buckets.get(api_name, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens - 1 >= reserve:
+                self.buckets[api_name] = (tokens - 1, now)
+                return RateDecision(True, 0.0)
+            self.buckets[api_name] = (tokens, now)
+            return RateDecision(False, (1 + reserve - tokens) / rate)
+
+    def _acquire_redis(self, api_name: str, limit_config: dict, reserve_share: float) -> RateDecision:
+        """Sliding-window check-and-record shared by all workers (one round trip)"""
+        if self._window_script is None:
+            self._window_script = self.redis.register_script(SLIDING_WINDOW_SCRIPT)
+        calls = limit_config['calls']
+        per_seconds = float(limit_config['per_seconds'])
+        windows = [(per_seconds, calls)]
+        burst = limit_config.get('burst', calls)
+        if burst < calls:
+            # The local bucket refills `burst` tokens in this long
+            windows.append((per_seconds * burst / calls, burst))
+        args = [f"{self._caller_id}:{threading.get_ident()}"]
+        for seconds, limit in windows:
+            # At least one call per window is left to background callers
+            args += [int(seconds * 1000000), max(1, int(limit * (1 - reserve_share)))]
+        granted, retry_us = self._window_script(keys=[f"rate_limit:{api_name}"], args=args)
+        return RateDecision(bool(granted), max(0.0, int(retry_us) / 1000000.0))
+
+    def wait_if_needed(self, api_name: str = 'default') -> float:
+        """
+        Check whether another API call may be made now (never sleeps)
+        Returns 0 if the call may go ahead, otherwise the seconds until it
+        could; the caller should serve cached data or report the limit
+        """
+        return self.acquire(api_name).retry_after
+
+    def wait_for_token(self, api_name: str = 'default', priority: str = BACKGROUND,
+                       timeout: float = 60.0) -> bool:
+        """
+        Wait for a token; for background jobs only (inside a request this
+        does not wait and behaves like acquire())
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            decision = self.acquire(api_name, priority)
+            if decision.granted:
+                return True
+            if has_request_context() or time.monotonic() + decision.retry_after > deadline:
+                return False
+            time.sleep(decision.retry_after)
+
+    def get_stats(self) -> Dict:
+        return {api_name: dict(counts) for api_name, counts in self.stats.items()}
 
 # Singleton instance
 rate_limiter = RateLimiter()
@@ -1,222 +1,124 @@
 # Redis Caching Implementation for Aksjeradar
 """
 Redis caching implementation for news feeds and expensive operations
+
+Kept for backwards compatibility: everything here now goes through the
+unified tiered cache (utils/tiered_cache.py), so entries, TTLs and stats
+are shared with the rest of the app instead of living in a separate Redis
+connection and key prefix.
 """
 
-import redis
-import json
-import pickle
-from datetime import timedelta
+import hashlib
 from functools import wraps
-from flask import current_app
 import logging
-import os
+from .cache_manager import cache_manager
+from .tiered_cache import tiered_cache, resolve_namespace
+from .market_open import market_ttl, symbol_ttl
 
 logger = logging.getLogger(__name__)
 
 class RedisCache:
-    """Redis cache manager for Aksjeradar"""
-    
+    """Redis cache manager for Aksjeradar (delegates to the tiered cache)"""
+
     def __init__(self, app=None):
-        self.redis_client = None
-        self.enabled = False
+        self.manager = cache_manager
         if app:
             self.init_app(app)
-    
+
+    @property
+    def enabled(self):
+        return self.manager.redis_available
+
+    @property
+    def redis_client(self):
+        return self.manager.redis_client if self.manager.redis_available else None
+
     def init_app(self, app):
-        """Initialize Redis with Flask app"""
-        try:
-            redis_url = app.config.get('REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
-            self.redis_client = redis.from_url(
-                redis_url,
-                decode_responses=False,  # We'll handle encoding manually
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True
-            )
-            
-            # Test connection
-            self.redis_client.ping()
-            self.enabled = True
-            logger.info("Redis cache initialized successfully")
-            
-        except Exception as e:
-            logger.warning(f"Redis cache initialization failed: {e}")
-            self.redis_client = None
-            self.enabled = False
-    
+        """Initialize with Flask app - the tiered cache owns the connection"""
+        logger.info("Redis cache using the shared tiered cache")
+
     def get(self, key):
         """Get value from cache"""
-        if not self.redis_client or not self.enabled:
-            return None
-        
-        try:
-            value = self.redis_client.get(f"aksjeradar:{key}")
-            if value:
-                return pickle.loads(value)
-        except Exception as e:
-            logger.error(f"Cache get error for key {key}: {e}")
-        
-        return None
-    
-    def set(self, key, value, timeout=3600):
+        return self.manager.get(key)
+
+    def set(self, key, value, timeout=3600, tags=None):
         """Set value in cache with timeout (default 1 hour)"""
-        if not self.redis_client or not self.enabled:
-            return False
-        
-        try:
-            serialized = pickle.dumps(value)
-            return self.redis_client.setex(f"aksjeradar:{key}", timeout, serialized)
-        except Exception as e:
-            logger.error(f"Cache set error for key {key}: {e}")
-            return False
-    
+        return self.manager.set(key, value, timeout, tags=tags)
+
     def delete(self, key):
         """Delete key from cache"""
-        if not self.redis_client or not self.enabled:
-            return False
-        
-        try:
-            return self.redis_client.delete(f"aksjeradar:{key}")
-        except Exception as e:
-            logger.error(f"Cache delete error for key {key}: {e}")
-            return False
-    
+        return self.manager.delete(key)
+
+    def get_many(self, keys):
+        """Get several values in one round trip; returns a dict of keys found"""
+        return self.manager.get_many(keys)
+
+    def set_many(self, mapping, timeout=3600, tags=None):
+        """Set several values in one round trip"""
+        return self.manager.set_many(mapping, timeout, tags=tags)
+
+    def delete_many(self, keys):
+        """Delete several keys in one round trip"""
+        return self.manager.delete_many(keys)
+
     def flush_all(self):
-        """Clear all cache"""
-        if not self.redis_client or not self.enabled:
-            return False
-        
-        try:
-            return self.redis_client.flushdb()
-        except Exception as e:
-            logger.error(f"Cache flush error: {e}")
-            return False
-    
+        """Clear every cache namespace in use, including decorator namespaces (never FLUSHDB - Redis is shared with Celery)"""
+        return self.manager.clear_all()
+
+    def invalidate_tags(self, *tags):
+        """Delete every key registered under the given tags - O(keys in tags)"""
+        return self.manager.invalidate_tags(*tags)
+
     def flush_pattern(self, pattern):
         """Delete all keys matching pattern"""
-        if not self.redis_client or not self.enabled:
-            return False
-        
-        try:
-            keys = self.redis_client.keys(f"aksjeradar:{pattern}")
-            if keys:
-                return self.redis_client.delete(*keys)
-            return True
-        except Exception as e:
-            logger.error(f"Cache flush pattern error for {pattern}: {e}")
-            return False
-    
+        return self.manager.clear_pattern(pattern)
+
     def exists(self, key):
         """Check if key exists"""
-        if not self.redis_client or not self.enabled:
-            return False
-        
-        try:
-            return bool(self.redis_client.exists(f"aksjeradar:{key}"))
-        except Exception as e:
-            logger.error(f"Cache exists error for key {key}: {e}")
-            return False
-    
+        return self.manager.get(key) is not None
+
     def get_stats(self):
         """Get cache statistics"""
-        if not self.redis_client or not self.enabled:
-            return {"enabled": False, "status": "Redis not available"}
-        
-        try:
-            info = self.redis_client.info()
-            return {
-                "enabled": True,
-                "status": "Connected",
-                "used_memory": info.get('used_memory_human', 'N/A'),
-                "connected_clients": info.get('connected_clients', 0),
-                "keyspace_hits": info.get('keyspace_hits', 0),
-                "keyspace_misses": info.get('keyspace_misses', 0)
-            }
-        except Exception as e:
-            logger.error(f"Cache stats error: {e}")
-            return {"enabled": False, "status": f"Error: {e}"}
-            if value:
-                return pickle.loads(value)
-        except Exception as e:
-            logger.error(f"Cache get error for key {key}: {e}")
-        
-        return None
-    
-    def set(self, key, value, timeout=3600):
-        """Set value in cache with timeout (default 1 hour)"""
-        if not self.redis_client:
-            return False
-        
-        try:
-            serialized = pickle.dumps(value)
-            return self.redis_client.setex(key, timeout, serialized)
-        except Exception as e:
-            logger.error(f"Cache set error for key {key}: {e}")
-            return False
-    
-    def delete(self, key):
-        """Delete key from cache"""
-        if not self.redis_client:
-            return False
-        
-        try:
-            return self.redis_client.delete(key)
-        except Exception as e:
-            logger.error(f"Cache delete error for key {key}: {e}")
-            return False
-    
-    def flush_all(self):
-        """Clear all cache"""
-        if not self.redis_client:
-            return False
-        
-        try:
-            return self.redis_client.flushdb()
-        except Exception as e:
-            logger.error(f"Cache flush error: {e}")
-            return False
+        return tiered_cache.get_stats()
 
 # Global cache instance
 cache = RedisCache()
 
-def cached(timeout=3600, key_prefix=""):
+def cached(timeout=3600, key_prefix="", tags=None):
     """
     Decorator for caching function results
-    
+
     Args:
-        timeout: Cache timeout in seconds (default 1 hour)
-        key_prefix: Optional prefix for cache key
+        timeout: Cache timeout in seconds (default 1 hour), or a callable
+            computing it from the function's arguments
+        key_prefix: Cache namespace (also its invalidation tag)
+        tags: Optional extra invalidation tags
     """
+    def key_func_for(f):
+        def key_func(*args, **kwargs):
+            # Stable digest (not hash(), which is salted per process) so
+            # every worker agrees on the key
+            arg_digest = hashlib.md5((str(args) + str(sorted(kwargs.items()))).encode()).hexdigest()
+            return f"{f.__name__}:{arg_digest}"
+        return key_func
+
     def decorator(f):
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            # Generate cache key from function name and arguments
-            cache_key = f"{key_prefix}:{f.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
-            
-            # Try to get from cache first
-            cached_result = cache.get(cache_key)
-            if cached_result is not None:
-                logger.debug(f"Cache hit for {cache_key}")
-                return cached_result
-            
-            # Execute function and cache result
-            result = f(*args, **kwargs)
-            cache.set(cache_key, result, timeout)
-            logger.debug(f"Cache miss for {cache_key}, result cached")
-            
-            return result
-        return wrapper
+        return tiered_cache.cached(
+            namespace=resolve_namespace(key_prefix),
+            ttl=timeout,
+            key_func=key_func_for(f),
+            tags=tags
+        )(f)
     return decorator
 
 # Specific cache decorators for different data types
 def cache_news_feeds(timeout=900):  # 15 minutes for news
     """Cache decorator specifically for news feeds"""
-    return cached(timeout=timeout, key_prefix="news_feeds")
+    return cached(timeout=timeout, key_prefix="news")
 
-def cache_market_data(timeout=300):  # 5 minutes for market data
-    """Cache decorator specifically for market data"""
-    return cached(timeout=timeout, key_prefix="market_data")
+def cache_market_data(timeout=300, market='all'):  # 5 minutes while the market is open
+    """Cache decorator specifically for market data (valid until next open while closed)"""
+    return cached(timeout=lambda *args, **kwargs: market_ttl(market, timeout), key_prefix="market_data")
 
 def cache_analysis_results(timeout=1800):  # 30 minutes for analysis
     """Cache decorator specifically for analysis results"""
@@ -226,25 +128,36 @@ def cache_user_data(timeout=600):  # 10 minutes for user-specific data
     """Cache decorator specifically for user data"""
     return cached(timeout=timeout, key_prefix="user_data")
 
-def cache_stock_data(timeout=300):  # 5 minutes for stock data
-    """Cache decorator specifically for stock data"""
-    return cached(timeout=timeout, key_prefix="stocks")
+def _symbol_argument(args, kwargs):
+    """The symbol a cached stock function was called for, if any"""
+    for name in ('symbol', 'ticker'):
+        if isinstance(kwargs.get(name), str):
+            return kwargs[name]
+    return next((arg for arg in args if isinstance(arg, str)), None)
+
+def cache_stock_data(timeout=300):  # 5 minutes while the symbol's market is open
+    """Cache decorator specifically for stock data (TTL follows the symbol's market)"""
+    def ttl(*args, **kwargs):
+        symbol = _symbol_argument(args, kwargs)
+        return symbol_ttl(symbol, timeout) if symbol else market_ttl('all', timeout)
+    return cached(timeout=ttl, key_prefix="stocks")
 
-# Cache management functions
+# Cache management functions - each namespace is a tag, so these only touch
+# the keys they own
 def clear_news_cache():
     """Clear all news-related cache"""
-    cache.flush_pattern("news_*")
+    tiered_cache.invalidate("news")
 
 def clear_market_cache():
     """Clear all market data cache"""
-    cache.flush_pattern("market_*")
+    tiered_cache.invalidate("market_data", "stocks")
 
 def clear_analysis_cache():
     """Clear all analysis cache"""
-    cache.flush_pattern("analysis_*")
+    tiered_cache.invalidate("analysis")
 
 def clear_all_cache():
-    """Clear entire cache"""
+    """Clear every cached namespace (Celery keys in the same Redis are kept)"""
     cache.flush_all()
 
 def get_cache_stats():
@@ -0,0 +1,123 @@
+"""
+Shared Redis connection pools for Aksjeradar
+
+One pool per logical database per process, shared by the cache, the rate
+limiter and anything else that talks to Redis. Pools are created lazily on
+first use (nothing connects at import time, so a slow Redis never blocks
+worker startup). get_redis() builds new pools after a fork; clients created
+before it (module-level instances) keep the parent's pool, which redis-py
+itself resets in the child on first use, so sockets are never shared.
+
+Pools block for up to REDIS_POOL_TIMEOUT seconds when all connections are
+checked out, instead of failing with "Too many connections".
+REDIS_MAX_CONNECTIONS has to cover the long-lived pub/sub listener plus the
+quote fetcher, provider router and cache refresh threads of a worker.
+"""
+
+import logging
+import os
+import threading
+from urllib.parse import urlparse, urlunparse
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REDIS_URL = 'redis://localhost:6379'
+
+# Logical database per purpose; override with REDIS_DB_<PURPOSE>
+REDIS_DATABASES = {
+    'cache': 0,
+    'ratelimit': 1,
+    'celery': 2,
+    'socketio': 3,
+    'quotes': 4
+}
+
+POOL_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 20))
+# How long a command waits for a free connection when the pool is exhausted
+POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', 5))
+SOCKET_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', 2))
+SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 5))
+HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30))
+
+_pools = {}
+_pools_pid = None
+_lock = threading.Lock()
+
+
+def is_redis_configured() -> bool:
+    """True when REDIS_URL is set (otherwise callers use in-memory fallbacks)"""
+    return bool(os.getenv('REDIS_URL'))
+
+
+def get_redis_db(purpose: str) -> int:
+    """Logical database used for a purpose"""
+    override = os.getenv(f"REDIS_DB_{purpose.upper()}")
+    if override is not None:
+        return int(override)
+    return REDIS_DATABASES.get(purpose, 0)
+
+
+def get_redis_url(purpose: str = 'cache', base_url: str = None) -> str:
+    """Redis URL for a purpose (for clients with their own pools: Celery, SocketIO)"""
+    parsed = urlparse(base_url or os.getenv('REDIS_URL', DEFAULT_REDIS_URL))
+    return urlunparse(parsed._replace(path=f"/{get_redis_db(purpose)}"))
+
+
+def get_redis(purpose: str = 'cache', url: str = None) -> redis.Redis:
+    """
+    Redis client backed by the shared pool for a purpose
+
+    Creating the client is cheap and does not connect; the first command
+    does. Connections are health-checked when they have been idle.
+    """
+    global _pools, _pools_pid
+
+    pool_url = get_redis_url(purpose, url)
+    pid = os.getpid()
+    with _lock:
+        if _pools_pid != pid:
+            # Forked: never reuse the parent's sockets
+            _pools = {}
+            _pools_pid = pid
+        pool = _pools.get(pool_url)
+        if pool is None:
+            pool = redis.BlockingConnectionPool.from_url(
+                pool_url,
+                max_connections=POOL_MAX_CONNECTIONS,
+                timeout=POOL_TIMEOUT,
+                socket_connect_timeout=SOCKET_CONNECT_TIMEOUT,
+                socket_timeout=SOCKET_TIMEOUT,
+                health_check_interval=HEALTH_CHECK_INTERVAL,
+                retry_on_timeout=True
+            )
+            _pools[pool_url] = pool
+            logger.info(f"Created Redis pool for {purpose} (db {get_redis_db(purpose)})")
+
+    return redis.Redis(connection_pool=pool)
+
+
+def get_pool_stats() -> dict:
+    """Connection counts per pool in this process"""
+    stats = {}
+    with _lock:
+        for pool_url, pool in _pools.items():
+            idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+            stats[pool_url.rsplit('@', 1)[-1]] = {
+                'in_use': len(pool._connections) - idle,
+                'available': idle,
+                'max_connections': pool.max_connections
+            }
+    return stats
+
+
+def close_pools():
+    """Disconnect all pools in this process (e.g. on worker exit)"""
+    with _lock:
+        for pool in _pools.values():
+            try:
+                pool.disconnect()
+            except Exception as e:
+                logger.debug(f"Error closing Redis pool: {e}")
+        _pools.clear()
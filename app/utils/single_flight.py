@@ -0,0 +1,244 @@
+"""
+Cache stampede protection for Aksjeradar
+
+Provides per-key single-flight execution (in-process and across gunicorn
+workers through a short Redis lock) and probabilistic early expiration
+(XFetch) for the ``cached`` decorators.
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Marker used to recognise values written by the cached decorators
+ENVELOPE_MARKER = '__sf__'
+
+# XFetch tuning: beta > 1 favours earlier refreshes
+DEFAULT_BETA = 1.0
+
+# Compare-and-delete so a worker never releases a lock it no longer owns
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_MISSING = object()
+
+
+class _Call:
+    """An in-flight computation shared by concurrent callers"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Ensure only one caller recomputes a given key at a time"""
+
+    def __init__(self, lock_ttl: float = 10.0, wait_timeout: float = 5.0, poll_interval: float = 0.05):
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'leaders': 0,
+            'followers': 0,
+            'redis_waits': 0,
+            'redis_wait_hits': 0,
+            'abandoned': 0,
+            'timeouts': 0
+        }
+
+    def do(self, key: str, fn: Callable[[], Any], redis_client=None,
+           recheck: Optional[Callable[[], Any]] = None, stale: Any = None) -> Any:
+        """
+        Run ``fn`` for ``key`` unless another caller is already doing so
+
+        Concurrent callers in this process wait for the leader's result.
+        When ``redis_client`` is given, the leader also takes a short Redis
+        lock; callers in other workers that fail to take it poll ``recheck``
+        (usually a cache read) until the value appears, the lock is released
+        without a value (the leader failed) or the wait expires, after which
+        they fall back to computing it themselves. When a
+        ``stale`` value is available it is returned to those callers at once
+        instead of waiting.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            self.stats['followers'] += 1
+            if stale is not None:
+                return stale
+            if call.event.wait(self.wait_timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # Leader is taking too long - compute independently
+            self.stats['timeouts'] += 1
+            return fn()
+
+        self.stats['leaders'] += 1
+        try:
+            call.result = self._run_leader(key, fn, redis_client, recheck, stale)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def _run_leader(self, key, fn, redis_client, recheck, stale):
+        """Execute ``fn`` while holding the cross-worker lock if possible"""
+        if redis_client is None:
+            return fn()
+
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = redis_client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception as e:
+            logger.debug(f"Single-flight lock unavailable for {key}: {e}")
+            return fn()
+
+        if not acquired:
+            if stale is not None:
+                return stale
+            self.stats['redis_waits'] += 1
+            if recheck is not None:
+                deadline = time.time() + self.wait_timeout
+                while time.time() < deadline:
+                    time.sleep(self.poll_interval)
+                    value = recheck()
+                    if value is not None:
+                        self.stats['redis_wait_hits'] += 1
+                        return value
+                    if not self._lock_held(redis_client, lock_key):
+                        # Released without a value: the leader failed, waiting longer is pointless
+                        value = recheck()
+                        if value is not None:
+                            self.stats['redis_wait_hits'] += 1
+                            return value
+                        self.stats['abandoned'] += 1
+                        return fn()
+            self.stats['timeouts'] += 1
+            return fn()
+
+        try:
+            return fn()
+        finally:
+            try:
+                redis_client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                logger.debug(f"Single-flight lock release failed for {key}: {e}")
+
+    @staticmethod
+    def _lock_held(redis_client, lock_key: str) -> bool:
+        try:
+            return bool(redis_client.exists(lock_key))
+        except Exception:
+            # Can't tell; keep waiting for the value
+            return True
+
+    def in_flight(self, key: str) -> bool:
+        """Return True if a computation for ``key`` is running in this process"""
+        with self._lock:
+            return key in self._calls
+
+
+def wrap_value(value: Any, ttl: float, delta: float) -> dict:
+    """Wrap a computed value with the metadata XFetch needs"""
+    return {
+        ENVELOPE_MARKER: 1,
+        'value': value,
+        'delta': delta,
+        'expiry': time.time() + ttl
+    }
+
+
+def unwrap_value(entry: Any, beta: float = DEFAULT_BETA) -> Tuple[Any, bool]:
+    """
+    Return ``(value, refresh_early)`` for a cached entry
+
+    ``refresh_early`` is drawn with probability rising towards 1 as expiry
+    approaches, scaled by how long the value took to compute, so hot keys
+    get refreshed by a single caller before they actually expire. Entries
+    written without an envelope are returned as-is.
+    """
+    if not isinstance(entry, dict) or entry.get(ENVELOPE_MARKER) != 1:
+        return entry, False
+
+    value = entry.get('value')
+    try:
+        delta = float(entry.get('delta') or 0)
+        expiry = float(entry['expiry'])
+    except (KeyError, TypeError, ValueError):
+        return value, False
+
+    # 1 - random() lies in (0, 1], so log() is always defined
+    jitter = -delta * beta * math.log(1.0 - random.random())
+    return value, time.time() + jitter >= expiry
+
+
+def cached_call(key: str, fn: Callable[[], Any], ttl: float, get: Callable[[str], Any],
+                set: Callable[[str, Any, float], Any], redis_client=None,
+                flight: Optional[SingleFlight] = None) -> Any:
+    """
+    Read-through helper shared by the cached decorators
+
+    Serves cached values, refreshes hot keys early through single-flight
+    (other callers keep getting the current value meanwhile) and collapses
+    concurrent misses into one computation.
+    """
+    flight = flight or single_flight
+
+    entry = get(key)
+    value = _MISSING
+    if entry is not None:
+        value, refresh_early = unwrap_value(entry)
+        if not refresh_early or flight.in_flight(key):
+            return value
+
+    def compute():
+        started = time.time()
+        result = fn()
+        if result is not None:
+            set(key, wrap_value(result, ttl, time.time() - started), ttl)
+        return result
+
+    def recheck():
+        fresh = get(key)
+        return unwrap_value(fresh)[0] if fresh is not None else None
+
+    if value is not _MISSING:
+        # Early refresh: only the leader recomputes, everyone else serves stale
+        try:
+            return flight.do(key, compute, redis_client=redis_client, stale=value)
+        except Exception as e:
+            logger.warning(f"Early refresh failed for {key}, serving cached value: {e}")
+            return value
+
+    return flight.do(key, compute, redis_client=redis_client, recheck=recheck)
+
+
+# Global single-flight instance
+single_flight = SingleFlight()
@@ -0,0 +1,219 @@
+"""
+Ticker validity registry for Aksjeradar
+
+Lookups for invalid or delisted symbols used to go through DataService and
+the upstream providers on every request. This module keeps:
+
+- a per-process set of symbols known to exist, seeded at startup from the
+  DataService ticker lists and shared between workers through a Redis set
+- a short-lived negative cache (the 'negative' namespace) for symbols and
+  search queries that came back empty
+
+so repeated lookups for bad symbols are answered from memory.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Iterable, Optional
+
+from .tiered_cache import tiered_cache
+
+logger = logging.getLogger(__name__)
+
+# Redis set holding every symbol a worker has seen resolve successfully
+REGISTRY_KEY = 'ticker_registry:valid'
+# How often a worker merges the shared set into its local copy (seconds)
+REGISTRY_SYNC_INTERVAL = int(os.getenv('TICKER_REGISTRY_SYNC_INTERVAL', 300))
+# How long a "not found" answer is remembered (seconds). Kept short so a
+# symbol that failed because of an upstream outage recovers quickly.
+NEGATIVE_TTL = int(os.getenv('TICKER_NEGATIVE_TTL', 300))
+
+# Yahoo-style symbols: EQNR.OL, BRK-B, ^OSEBX, EURNOK=X, BTC-USD; exchange
+# prefixes without a Yahoo suffix below are kept (XSTU:SAP)
+SYMBOL_PATTERN = re.compile(r'^(?:[A-Z]{2,10}:)?[\^A-Z0-9][A-Z0-9.\-=^&]{0,19}$')
+
+# Exchange prefixes used by search results and links (OSL:EQNR -> EQNR.OL)
+EXCHANGE_PREFIXES = {
+    'OSL': '.OL',
+    'OSE': '.OL',
+    'NASDAQ': '',
+    'NYSE': '',
+    'AMEX': '',
+    'XETRA': '.DE',
+    'ETR': '.DE',
+    'FRA': '.F',
+    'LON': '.L',
+    'LSE': '.L',
+    'STO': '.ST',
+    'CPH': '.CO',
+    'HEL': '.HE',
+    'EPA': '.PA',
+    'AMS': '.AS',
+    'SWX': '.SW',
+    'TSX': '.TO',
+    'TSE': '.T',
+    'HKG': '.HK'
+}
+
+VALID = 'valid'
+INVALID = 'invalid'
+UNKNOWN = 'unknown'
+
+
+def normalize_symbol(symbol: Optional[str]) -> str:
+    """Canonical form of a symbol (upper case, exchange prefix resolved)"""
+    symbol = (symbol or '').strip().upper()
+    if ':' in symbol:
+        prefix, _, rest = symbol.partition(':')
+        suffix = EXCHANGE_PREFIXES.get(prefix)
+        if suffix is not None and rest:
+            symbol = rest if rest.endswith(suffix) else rest + suffix
+    return symbol
+
+
+def is_valid_format(symbol: Optional[str]) -> bool:
+    """True if the symbol could be a ticker at all"""
+    return bool(SYMBOL_PATTERN.match(normalize_symbol(symbol)))
+
+
+def _default_symbols() -> Iterable[str]:
+    """Ticker lists DataService ships with (lazy import avoids a cycle)"""
+    symbols = []
+    try:
+        from ..services import data_service
+        for name in ('OSLO_BORS_TICKERS', 'GLOBAL_TICKERS', 'CRYPTO_TICKERS'):
+            symbols.extend(getattr(data_service, name, None) or [])
+    except Exception as e:
+        logger.warning(f"Could not load DataService ticker lists: {e}")
+    return symbols
+
+
+class TickerRegistry:
+    """Known-valid symbols plus a negative cache for symbols that are not"""
+
+    def __init__(self):
+        self._valid = set()
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+        self._synced_pid = None
+        self.stats = {
+            'known_hits': 0,
+            'negative_hits': 0,
+            'rejected_format': 0,
+            'marked_valid': 0,
+            'marked_invalid': 0
+        }
+
+    def load(self, symbols: Optional[Iterable[str]] = None) -> int:
+        """Seed the registry (called at startup); returns the registry size"""
+        if symbols is None:
+            symbols = _default_symbols()
+        with self._lock:
+            self._valid.update(normalize_symbol(symbol) for symbol in symbols if symbol)
+            size = len(self._valid)
+        logger.info(f"Ticker registry loaded with {size} symbols")
+        return size
+
+    def is_known(self, symbol: str) -> bool:
+        """True if the symbol is known to exist"""
+        self._maybe_sync()
+        return normalize_symbol(symbol) in self._valid
+
+    def known_symbols(self):
+        """Sorted list of symbols known to exist"""
+        self._maybe_sync()
+        with self._lock:
+            return sorted(self._valid)
+
+    def check(self, symbol: str) -> str:
+        """
+        Classify a symbol before doing any upstream work
+
+        Returns VALID (known to exist), INVALID (malformed or recently not
+        found) or UNKNOWN (go ahead and look it up).
+        """
+        symbol = normalize_symbol(symbol)
+        if not SYMBOL_PATTERN.match(symbol):
+            self.stats['rejected_format'] += 1
+            return INVALID
+        if self.is_known(symbol):
+            self.stats['known_hits'] += 1
+            return VALID
+        if tiered_cache.get(symbol, 'negative') is not None:
+            self.stats['negative_hits'] += 1
+            return INVALID
+        return UNKNOWN
+
+    def is_known_invalid(self, symbol: str) -> bool:
+        return self.check(symbol) == INVALID
+
+    def mark_valid(self, symbol: str):
+        """Record a symbol that resolved successfully"""
+        symbol = normalize_symbol(symbol)
+        if not symbol or symbol in self._valid:
+            return
+        with self._lock:
+            self._valid.add(symbol)
+        self.stats['marked_valid'] += 1
+        tiered_cache.delete(symbol, 'negative')
+        manager = tiered_cache.manager
+        if manager.redis_available:
+            try:
+                manager.redis_client.sadd(REGISTRY_KEY, symbol)
+            except Exception as e:
+                logger.debug(f"Could not share valid symbol {symbol}: {e}")
+
+    def mark_invalid(self, symbol: str):
+        """Remember a "not found" answer (never for symbols known to exist)"""
+        symbol = normalize_symbol(symbol)
+        if not symbol or symbol in self._valid:
+            return
+        self.stats['marked_invalid'] += 1
+        tiered_cache.set(symbol, True, 'negative', ttl=NEGATIVE_TTL)
+
+    def has_no_results(self, query: str) -> bool:
+        """True if this search query recently returned nothing"""
+        query = (query or '').strip().lower()
+        if tiered_cache.get(f"search:{query}", 'negative') is not None:
+            self.stats['negative_hits'] += 1
+            return True
+        return False
+
+    def mark_no_results(self, query: str):
+        """Remember a search query that returned nothing"""
+        query = (query or '').strip().lower()
+        if query:
+            tiered_cache.set(f"search:{query}", True, 'negative', ttl=NEGATIVE_TTL)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['known_symbols'] = len(self._valid)
+        return stats
+
+    def _maybe_sync(self):
+        """Merge symbols other workers have discovered (at most every REGISTRY_SYNC_INTERVAL)"""
+        now = time.time()
+        pid = os.getpid()
+        if self._synced_pid == pid and now - self._synced_at < REGISTRY_SYNC_INTERVAL:
+            return
+        self._synced_at = now
+        self._synced_pid = pid
+        manager = tiered_cache.manager
+        if not manager.redis_available:
+            return
+        try:
+            members = manager.redis_client.smembers(REGISTRY_KEY)
+            with self._lock:
+                self._valid.update(
+                    member.decode('utf-8') if isinstance(member, bytes) else member
+                    for member in members
+                )
+        except Exception as e:
+            logger.debug(f"Ticker registry sync failed: {e}")
+
+
+# Global registry instance
+ticker_registry = TickerRegistry()
@@ -0,0 +1,158 @@
+"""
+Unified tiered cache for Aksjeradar
+
+Single entry point for caching in blueprints and services. Values live in
+the per-worker local tier and in Redis (both managed by CacheManager), keys
+are always built as ``<namespace>:<key>`` and every namespace has a default
+TTL, so hit rates and occupancy are reported in one place.
+"""
+
+import hashlib
+import logging
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from .cache_manager import cache_manager, _generate_key
+from .single_flight import cached_call, single_flight
+from .redis_pool import get_pool_stats
+from .market_open import market_ttl
+
+logger = logging.getLogger(__name__)
+
+# Default TTL (seconds) per namespace
+NAMESPACE_TTLS = {
+    'market_data': 300,
+    'stocks': 300,
+    'analysis': 1800,
+    'user_data': 600,
+    'news': 900,
+    'pages': 300,
+    'negative': 300,
+    'upstream': 5,
+    'default': 3600
+}
+
+# Namespaces whose default TTL follows the Oslo/New York calendar: the
+# TTL above while a market is open, until the next open while both are closed
+MARKET_NAMESPACES = {'market_data', 'stocks'}
+
+# Older prefixes mapped onto the unified namespaces
+NAMESPACE_ALIASES = {
+    'news_feeds': 'news'
+}
+
+# Keys longer than this are hashed to keep Redis keys short
+MAX_KEY_LENGTH = 200
+
+
+def resolve_namespace(namespace: Optional[str]) -> str:
+    """Normalise a namespace name (None and '' map to 'default')"""
+    namespace = namespace or 'default'
+    return NAMESPACE_ALIASES.get(namespace, namespace)
+
+
+def make_key(namespace: Optional[str], *parts: Any) -> str:
+    """Build the canonical cache key for a namespace and key parts"""
+    namespace = resolve_namespace(namespace)
+    key = ':'.join(str(part) for part in parts)
+    if len(key) > MAX_KEY_LENGTH:
+        key = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return f"{namespace}:{key}"
+
+
+class TieredCache:
+    """Namespaced facade over the local + Redis cache tiers"""
+
+    def __init__(self, manager=None):
+        self.manager = manager or cache_manager
+
+    def ttl_for(self, namespace: Optional[str]) -> int:
+        """Default TTL of a namespace (market namespaces follow the market calendar)"""
+        namespace = resolve_namespace(namespace)
+        ttl = NAMESPACE_TTLS.get(namespace, NAMESPACE_TTLS['default'])
+        if namespace in MARKET_NAMESPACES:
+            return market_ttl('all', ttl)
+        return ttl
+
+    def get(self, key: str, namespace: str = 'default') -> Optional[Any]:
+        """Get a value (signature matches the old simple_cache.get(key, cache_type))"""
+        return self.manager.get(make_key(namespace, key))
+
+    def set(self, key: str, value: Any, namespace: str = 'default', ttl: Optional[int] = None,
+            tags: Optional[List[str]] = None) -> bool:
+        """Set a value; ttl defaults to the namespace TTL"""
+        return self.manager.set(make_key(namespace, key), value, ttl or self.ttl_for(namespace), tags=tags)
+
+    def delete(self, key: str, namespace: str = 'default') -> bool:
+        return self.manager.delete(make_key(namespace, key))
+
+    def get_many(self, keys: List[str], namespace: str = 'default') -> Dict[str, Any]:
+        """Get several keys in one round trip; returns {key: value} for keys found"""
+        full_keys = {make_key(namespace, key): key for key in keys}
+        found = self.manager.get_many(list(full_keys.keys()))
+        return {full_keys[full_key]: value for full_key, value in found.items()}
+
+    def set_many(self, mapping: Dict[str, Any], namespace: str = 'default', ttl: Optional[int] = None,
+                 tags: Optional[List[str]] = None) -> bool:
+        return self.manager.set_many(
+            {make_key(namespace, key): value for key, value in mapping.items()},
+            ttl or self.ttl_for(namespace),
+            tags=tags
+        )
+
+    def delete_many(self, keys: List[str], namespace: str = 'default') -> int:
+        return self.manager.delete_many([make_key(namespace, key) for key in keys])
+
+    def get_swr(self, key: str, loader: Callable[[], Any], namespace: str = 'default',
+                soft_ttl: Optional[int] = None, hard_ttl: Optional[int] = None, block: bool = True) -> Optional[Any]:
+        """Stale-while-revalidate read (see CacheManager.get_swr)"""
+        soft_ttl = soft_ttl or self.ttl_for(namespace)
+        return self.manager.get_swr(make_key(namespace, key), loader, soft_ttl=soft_ttl,
+                                    hard_ttl=hard_ttl or soft_ttl * 12, block=block)
+
+    def invalidate(self, *namespaces: str) -> int:
+        """Drop every key in the given namespaces"""
+        return self.manager.invalidate_tags(*[resolve_namespace(namespace) for namespace in namespaces])
+
+    def invalidate_tags(self, *tags: str) -> int:
+        return self.manager.invalidate_tags(*tags)
+
+    def cached(self, namespace: str = 'default', ttl: Optional[Union[int, Callable[..., int]]] = None,
+               key_func: Optional[Callable] = None, tags: Optional[List[str]] = None):
+        """
+        Decorator caching a function's result in a namespace (single-flight, early refresh)
+
+        `ttl` may be a callable taking the function's arguments, for TTLs
+        that depend on the call (e.g. the market a symbol trades on).
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if key_func:
+                    key = key_func(*args, **kwargs)
+                else:
+                    key = f"{func.__module__}.{func.__name__}:{_generate_key(*args, **kwargs)}"
+                full_key = make_key(namespace, key)
+                timeout = (ttl(*args, **kwargs) if callable(ttl) else ttl) or self.ttl_for(namespace)
+                return cached_call(
+                    full_key,
+                    lambda: func(*args, **kwargs),
+                    timeout,
+                    get=self.manager.get,
+                    set=lambda k, value, t: self.manager.set(k, value, t, tags=tags),
+                    redis_client=self.manager.redis_client if self.manager.redis_available else None
+                )
+            return wrapper
+        return decorator
+
+    def get_stats(self) -> Dict:
+        """One stats surface for all cache layers"""
+        stats = self.manager.get_stats()
+        stats['single_flight'] = dict(single_flight.stats)
+        stats['namespace_ttls'] = dict(NAMESPACE_TTLS)
+        stats['redis_pools'] = get_pool_stats()
+        return stats
+
+
+# Global tiered cache instance
+tiered_cache = TieredCache()
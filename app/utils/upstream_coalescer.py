@@ -0,0 +1,123 @@
+"""
+Cross-user coalescing of upstream fetches for Aksjeradar
+
+When many users open the same stock at once, each request used to make its
+own upstream call for the same symbol. Calls made through this module are
+keyed by (provider, endpoint, symbol, params):
+
+- concurrent callers in a process share the one in-flight call
+- across workers and nodes the caller holding a short Redis lease fetches,
+  and publishes the result for a few seconds so the others pick it up
+
+so upstream load follows the number of distinct symbols, not users.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Optional
+
+from .circuit_breaker import CircuitOpenError, get_breaker
+from .single_flight import SingleFlight
+from .tiered_cache import tiered_cache
+
+logger = logging.getLogger(__name__)
+
+# How long a finished fetch is shared with callers that arrive late (seconds)
+SHARE_TTL = int(os.getenv('UPSTREAM_SHARE_TTL', 5))
+# Lease held by the fetching worker; other workers wait at most this long
+LEASE_TTL = float(os.getenv('UPSTREAM_LEASE_TTL', 15))
+
+
+def coalesce_key(provider: str, endpoint: str, symbol: str, params: Optional[Dict] = None) -> str:
+    key = f"{provider}:{endpoint}:{(symbol or '').upper()}"
+    if params:
+        digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        key = f"{key}:{digest}"
+    return key
+
+
+class UpstreamCoalescer:
+    """Collapses identical concurrent upstream calls into one"""
+
+    def __init__(self, share_ttl: int = SHARE_TTL, lease_ttl: float = LEASE_TTL):
+        self.share_ttl = share_ttl
+        self.flight = SingleFlight(lock_ttl=lease_ttl, wait_timeout=lease_ttl, poll_interval=0.05)
+        self.stats = {'calls': 0, 'fetches': 0, 'shared': 0}
+
+    def call(self, provider: str, endpoint: str, symbol: str, fn: Callable[[], Any],
+             params: Optional[Dict] = None) -> Any:
+        """Result of fn(), shared with every concurrent caller for the same key"""
+        key = coalesce_key(provider, endpoint, symbol, params)
+        self.stats['calls'] += 1
+
+        # Results are wrapped so an empty answer (None) is shared too
+        shared = tiered_cache.get(key, 'upstream')
+        if shared is not None:
+            self.stats['shared'] += 1
+            return shared['value']
+
+        def fetch():
+            self.stats['fetches'] += 1
+            value = fn()
+            tiered_cache.set(key, {'value': value}, 'upstream', ttl=self.share_ttl)
+            return {'value': value}
+
+        def recheck():
+            return tiered_cache.get(key, 'upstream')
+
+        manager = tiered_cache.manager
+        redis_client = manager.redis_client if manager.redis_available else None
+        return self.flight.do(f"upstream:{key}", fetch, redis_client=redis_client, recheck=recheck)['value']
+
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats.update({f"flight_{name}": value for name, value in self.flight.stats.items()})
+        return stats
+
+
+# Global coalescer instance
+upstream_coalescer = UpstreamCoalescer()
+
+
+# Breaker endpoint class per DataService method (others share 'details')
+ENDPOINT_CLASSES = {
+    'get_stock_info': 'info',
+    'get_stock_data': 'history'
+}
+
+_RAISE = object()
+
+
+def call_data_service(method: str, symbol: str, *, fallback: Any = _RAISE, **params) -> Any:
+    """
+    DataService.<method>(symbol, **params), coalesced across users
+
+    Goes through the yfinance circuit breaker for the method's endpoint
+    class; while it is open (or half-open with its probe already taken)
+    `fallback` is returned at once, or CircuitOpenError raised when no
+    fallback is given. The fallback is applied per caller, never shared.
+    """
+    from ..services.data_service import DataService
+    breaker = get_breaker('yfinance', ENDPOINT_CLASSES.get(method, 'details'))
+    try:
+        return upstream_coalescer.call(
+            'dataservice',
+            method,
+            symbol,
+            lambda: breaker.call(lambda: getattr(DataService, method)(symbol, **params)),
+            params=params or None
+        )
+    except CircuitOpenError:
+        if fallback is not _RAISE:
+            return fallback
+        raise
+
+
+def get_stock_info(symbol: str) -> Optional[Dict]:
+    return call_data_service('get_stock_info', symbol)
+
+
+def get_stock_data(symbol: str, period: str = '1mo', interval: str = '1d'):
+    return call_data_service('get_stock_data', symbol, period=period, interval=interval)
@@ -0,0 +1,32 @@
+"""
+Shared fixtures for the cache and market-data utilities
+
+The ``app`` package is registered without running ``app/__init__`` so the
+utility modules import without the full application (database, blueprints,
+provider SDKs). Redis is fakeredis with Lua support.
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for _name, _path in (('app', 'app'), ('app.utils', os.path.join('app', 'utils')),
+                     ('app.routes', os.path.join('app', 'routes'))):
+    if _name not in sys.modules:
+        _package = types.ModuleType(_name)
+        _package.__path__ = [os.path.join(ROOT, _path)]
+        sys.modules[_name] = _package
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def redis_client():
+    """Fresh in-memory Redis per test"""
+    client = fakeredis.FakeRedis()
+    yield client
+    client.flushall()
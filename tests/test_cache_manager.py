@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from app.utils.cache_manager import CacheManager, INCOHERENT_LOCAL_MAX_TTL
+
+
+@pytest.fixture
+def manager(redis_client):
+    cache = CacheManager()
+    cache.redis_client = redis_client
+    cache.redis_available = True
+    # No invalidation listener thread in tests
+    cache._listener_pid = os.getpid()
+    return cache
+
+
+def test_clear_all_reaches_every_namespace(manager, redis_client):
+    redis_client.set('celery-task-meta-1', 'keep')
+    manager.set('news:latest', [1], 300)
+    manager.set('pages:home', 'html', 300)
+    manager.set('app.routes.stocks.details:abc', {'x': 1}, 300, tags=['stocks'])
+    assert manager.clear_all() == 3
+    for key in ('news:latest', 'pages:home', 'app.routes.stocks.details:abc'):
+        assert manager.get(key) is None
+        assert not redis_client.exists(key)
+    assert redis_client.get('celery-task-meta-1') == b'keep'
+
+
+def test_clear_all_without_redis_clears_local_tier(manager):
+    manager.redis_available = False
+    manager.set('homepage_data:v1', {'a': 1}, 300)
+    manager.clear_all()
+    assert manager.get('homepage_data:v1') is None
+    assert manager.local_cache == {}
+
+
+def test_get_stats_does_not_start_listener(redis_client):
+    cache = CacheManager()
+    cache.redis_client = redis_client
+    stats = cache.get_stats()
+    assert cache._listener_pid is None
+    assert stats['local_max_ttl'] == INCOHERENT_LOCAL_MAX_TTL
+    assert stats['invalidation_bus']['connected'] is False
+
+
+def test_invalidation_from_other_worker_drops_local_entries(manager):
+    manager._origin = 'self'
+    manager.set('news:a', 1, 300)
+    manager.set('stock:b', 2, 300)
+    manager._apply_invalidation('{"origin": "self", "op": "keys", "items": ["news:a"]}')
+    assert 'news:a' in manager.local_cache
+    manager._apply_invalidation('{"origin": "other", "op": "keys", "items": ["news:a"]}')
+    manager._apply_invalidation('{"origin": "other", "op": "tags", "items": ["stock"]}')
+    assert manager.local_cache == {}
+
+
+@pytest.fixture
+def local_only():
+    cache = CacheManager(max_local_bytes=4000, max_local_entries=100)
+    cache.redis_available = False
+    return cache
+
+
+def test_lru_evicts_least_recently_used_within_byte_budget(local_only):
+    blob = 'x' * 500
+    for i in range(7):
+        local_only._set_local(f"a:{i}", blob, 300)
+    assert local_only.cache_stats['local_evictions'] == 0
+    local_only._get_local('a:0')
+    local_only._set_local('a:7', blob, 300)
+    assert local_only.local_bytes <= local_only.max_local_bytes
+    assert 'a:0' in local_only.local_cache
+    assert 'a:1' not in local_only.local_cache
+    assert local_only.cache_stats['local_evictions'] >= 1
+
+
+def test_lru_entry_limit(local_only):
+    local_only.max_local_entries = 3
+    for i in range(5):
+        local_only._set_local(f"b:{i}", i, 300)
+    assert list(local_only.local_cache) == ['b:2', 'b:3', 'b:4']
+
+
+def test_oversized_value_is_rejected(local_only):
+    assert not local_only._set_local('big:1', 'x' * 2000, 300)
+    assert local_only.local_cache == {}
+    assert local_only.cache_stats['local_rejected'] == 1
+
+
+def test_namespace_accounting_follows_removals(local_only):
+    local_only._set_local('news:1', 'abc', 300)
+    local_only._set_local('news:2', 'abc', 300)
+    local_only._delete_local('news:1')
+    assert local_only.namespace_usage['news'][0] == 1
+    local_only._delete_local('news:2')
+    assert 'news' not in local_only.namespace_usage
+    assert local_only.local_bytes == 0
@@ -0,0 +1,61 @@
+import time
+
+from app.utils.cache_tags import (register_tags, invalidate_tags, tag_key, namespace_of,
+                                  pattern_namespace)
+
+
+def test_register_scores_keys_by_expiry(redis_client):
+    register_tags(redis_client, 'news:latest', ['news', 'oslo'], 300)
+    for tag in ('news', 'oslo'):
+        score = redis_client.zscore(tag_key(tag), 'news:latest')
+        assert abs(score - (time.time() + 300)) < 5
+        assert 0 < redis_client.ttl(tag_key(tag)) <= 300
+
+
+def test_register_through_pipeline(redis_client):
+    redis_client.script_flush()
+    with redis_client.pipeline() as pipe:
+        pipe.set('stock:EQNR', '1', ex=60)
+        register_tags(pipe, 'stock:EQNR', ['stock'], 60)
+        pipe.execute()
+    assert redis_client.zcard(tag_key('stock')) == 1
+
+
+def test_expired_members_are_pruned(redis_client):
+    redis_client.zadd(tag_key('news'), {'news:old': time.time() - 10})
+    register_tags(redis_client, 'news:new', ['news'], 60)
+    assert redis_client.zrange(tag_key('news'), 0, -1) == [b'news:new']
+
+
+def test_tag_set_ttl_follows_longest_key(redis_client):
+    register_tags(redis_client, 'a:1', ['a'], 600)
+    register_tags(redis_client, 'a:2', ['a'], 30)
+    assert redis_client.ttl(tag_key('a')) > 30
+
+
+def test_invalidate_deletes_only_tagged_keys(redis_client):
+    for key in ('news:1', 'news:2', 'stock:1'):
+        redis_client.set(key, '1')
+        register_tags(redis_client, key, [namespace_of(key)], 60)
+    deleted = invalidate_tags(redis_client, ['news'])
+    assert sorted(deleted) == ['news:1', 'news:2']
+    assert redis_client.exists('news:1', 'news:2') == 0
+    assert redis_client.exists('stock:1') == 1
+    assert not redis_client.exists(tag_key('news'))
+
+
+def test_invalidate_large_tag_in_batches(redis_client):
+    keys = [f"bulk:{i}" for i in range(1200)]
+    for key in keys:
+        redis_client.set(key, '1')
+        register_tags(redis_client, key, ['bulk'], 60)
+    assert len(invalidate_tags(redis_client, ['bulk'])) == 1200
+    assert redis_client.dbsize() == 0
+
+
+def test_namespace_helpers():
+    assert namespace_of('stock:EQNR') == 'stock'
+    assert namespace_of('plain') == 'default'
+    assert pattern_namespace('news:*') == 'news'
+    assert pattern_namespace('news:*:x') is None
+    assert pattern_namespace('*') is None
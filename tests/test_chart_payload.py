@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.chart_payload import build_chart_payload, lttb_indices
+
+
+def test_lttb_keeps_endpoints_and_size():
+    x = np.arange(1000)
+    y = np.sin(x / 20.0)
+    kept = lttb_indices(x, y, 100)
+    assert len(kept) == 100
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_keeps_spikes():
+    x = np.arange(500)
+    y = np.zeros(500)
+    y[137] = 50.0
+    y[351] = -50.0
+    kept = lttb_indices(x, y, 20)
+    assert 137 in kept and 351 in kept
+
+
+@pytest.mark.parametrize('threshold', [0, 2, 10, 50])
+def test_lttb_returns_everything_below_minimum_or_above_length(threshold):
+    x = np.arange(10)
+    kept = lttb_indices(x, x * 2.0, threshold)
+    assert list(kept) == list(range(10))
+
+
+def test_payload_drops_missing_prices():
+    frame = pd.DataFrame({'Close': [1.0, np.nan, 3.0], 'Volume': [10, 20, np.nan]},
+                         index=pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']))
+    assert build_chart_payload(frame) == {
+        'dates': ['2024-01-01', '2024-01-03'],
+        'prices': [1.0, 3.0],
+        'volumes': [10, 0]
+    }
+
+
+def test_payload_downsamples_to_max_points():
+    index = pd.date_range('2020-01-01', periods=2000, freq='D')
+    frame = pd.DataFrame({'Close': np.linspace(1, 2, 2000), 'Volume': 1}, index=index)
+    payload = build_chart_payload(frame, max_points=300)
+    assert len(payload['dates']) == len(payload['prices']) == len(payload['volumes']) == 300
+    assert payload['dates'][0] == '2020-01-01'
+    assert payload['dates'][-1] == index[-1].strftime('%Y-%m-%d')
+
+
+def test_payload_empty_and_open_only_frames():
+    assert build_chart_payload(None) == {'dates': [], 'prices': [], 'volumes': []}
+    frame = pd.DataFrame({'Open': [5.0]}, index=pd.to_datetime(['2024-01-01']))
+    assert build_chart_payload(frame)['prices'] == [5.0]
@@ -0,0 +1,109 @@
+import sys
+import types
+
+import pytest
+
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from app.utils.tiered_cache import tiered_cache
+from app.utils.upstream_coalescer import call_data_service
+
+
+def _breaker(**kwargs):
+    kwargs.setdefault('min_calls', 4)
+    kwargs.setdefault('open_seconds', 30)
+    return CircuitBreaker('test', **kwargs)
+
+
+def _trip(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.record(False, 0.1)
+
+
+def _expire(breaker):
+    breaker.opened_at -= breaker.open_seconds
+
+
+def test_trips_on_failure_rate():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    assert breaker.state == CLOSED
+    breaker.record(True, 0.1)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_trips_on_slow_calls():
+    breaker = _breaker(slow_call_seconds=1.0)
+    for _ in range(4):
+        breaker.record(True, 2.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = _breaker()
+    _trip(breaker)
+    _expire(breaker)
+    assert breaker.available()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.available()
+    assert not breaker.allow()
+
+
+def test_probe_success_closes_and_failure_reopens():
+    breaker = _breaker()
+    _trip(breaker)
+    _expire(breaker)
+    breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+
+    _expire(breaker)
+    breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.stats['trips'] == 2
+
+
+def test_call_uses_fallback_while_open():
+    breaker = _breaker()
+    _trip(breaker)
+    assert breaker.call(lambda: 'live', fallback=lambda: 'cached') == 'cached'
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'live')
+
+
+@pytest.fixture
+def data_service(monkeypatch):
+    """DataService with a get_stock_info that counts its calls"""
+    calls = []
+
+    class DataService:
+        @staticmethod
+        def get_stock_info(symbol):
+            calls.append(symbol)
+            return {'last_price': 1.0}
+
+    module = types.ModuleType('app.services.data_service')
+    module.DataService = DataService
+    monkeypatch.setitem(sys.modules, 'app.services.data_service', module)
+    monkeypatch.setattr(tiered_cache.manager, 'redis_available', False)
+    monkeypatch.setattr(circuit_breaker, '_breakers', {})
+    yield calls
+    tiered_cache.invalidate('upstream')
+
+
+def test_call_data_service_open_breaker_with_fallback(data_service):
+    _trip(circuit_breaker.get_breaker('yfinance', 'info'))
+    sentinel = object()
+    assert call_data_service('get_stock_info', 'EQNR.OL', fallback=sentinel) is sentinel
+    with pytest.raises(CircuitOpenError):
+        call_data_service('get_stock_info', 'EQNR.OL')
+    assert data_service == []
+
+
+def test_call_data_service_closed_breaker(data_service):
+    assert call_data_service('get_stock_info', 'EQNR.OL', fallback=None) == {'last_price': 1.0}
+    assert data_service == ['EQNR.OL']
@@ -0,0 +1,115 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils import history_store as history_module
+from app.utils.history_store import HistoryStore, frame_to_records, gap_period, get_history
+
+
+def _frame(dates, closes):
+    index = pd.DatetimeIndex(pd.to_datetime(dates), name='Date')
+    closes = np.asarray(closes, dtype=float)
+    return pd.DataFrame({'Open': closes, 'High': closes + 1, 'Low': closes - 1, 'Close': closes,
+                         'Volume': np.full(len(closes), 100.0)}, index=index)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path))
+
+
+def test_frame_records_sorted_and_deduplicated():
+    records = frame_to_records(_frame(['2024-01-03', '2024-01-02', '2024-01-03'], [3.0, 2.0, 4.0]))
+    assert list(records['close']) == [2.0, 3.0]
+
+
+def test_write_then_read_window(store):
+    store.write('EQNR.OL', '1d', _frame(pd.date_range('2024-01-01', periods=10), range(10)),
+                covered_from=datetime(2024, 1, 1))
+    assert len(store.read('EQNR.OL', '1d')) == 10
+    window = store.read('EQNR.OL', '1d', start=datetime(2024, 1, 8))
+    assert list(window['close']) == [7.0, 8.0, 9.0]
+    assert store.read_frame('EQNR.OL', '1d').index[0] == pd.Timestamp('2024-01-01')
+
+
+def test_newer_bars_are_appended(store):
+    store.write('EQNR.OL', '1d', _frame(['2024-01-01', '2024-01-02'], [1.0, 2.0]))
+    store.write('EQNR.OL', '1d', _frame(['2024-01-03'], [3.0]))
+    assert list(store.read('EQNR.OL', '1d')['close']) == [1.0, 2.0, 3.0]
+    assert store.stats['rewrites'] == 0
+
+
+def test_backfill_rewrites_in_order(store):
+    store.write('EQNR.OL', '1d', _frame(['2024-01-03', '2024-01-04'], [3.0, 4.0]))
+    store.write('EQNR.OL', '1d', _frame(['2024-01-01', '2024-01-03'], [1.0, 30.0]))
+    assert list(store.read('EQNR.OL', '1d')['close']) == [1.0, 30.0, 4.0]
+    assert store.stats['rewrites'] == 1
+
+
+def test_invalid_keys_are_rejected(store):
+    assert store.write('../../etc', '1d', _frame(['2024-01-01'], [1.0])) == 0
+    assert len(store.read('EQNR.OL', '../x')) == 0
+    with pytest.raises(ValueError):
+        store.path('EQNR.OL', 'bogus')
+
+
+def test_exchange_prefixed_symbol_file_name(store):
+    assert ':' not in store.path('XSTU:SAP', '1d').rsplit('/', 1)[-1]
+
+
+def test_is_complete_follows_covered_from(store):
+    store.write('EQNR.OL', '1d', _frame(['2024-01-01'], [1.0]), covered_from=datetime(2020, 1, 1))
+    assert store.is_complete('EQNR.OL', '1d', '1mo')
+    assert not store.is_complete('EQNR.OL', '1d', 'max')
+
+
+def test_incremental_write_replaces_live_bar_only(store):
+    store.write('EQNR.OL', '1d', _frame(['2024-01-01', '2024-01-02'], [1.0, 2.0]))
+    # The refresh repeats older sessions with other values; only the last stored bar may change
+    written = store.write('EQNR.OL', '1d', _frame(['2024-01-01', '2024-01-02', '2024-01-03'], [9.0, 2.5, 3.0]),
+                          incremental=True)
+    assert written == 1
+    assert list(store.read('EQNR.OL', '1d')['close']) == [1.0, 2.5, 3.0]
+    assert store.stats['live_updates'] == 1
+    assert store.stats['rewrites'] == 0
+
+
+@pytest.mark.parametrize('last_bar, expected', [
+    (datetime(2024, 3, 14, 15, 30), '5d'),
+    (datetime(2024, 3, 1), '1mo'),
+    (datetime(2024, 1, 20), '3mo'),
+    (datetime(1990, 1, 1), 'max'),
+])
+def test_gap_period_reaches_last_session(last_bar, expected):
+    assert gap_period(last_bar, now=datetime(2024, 3, 15, 10, 0)) == expected
+
+
+def test_get_history_fetches_only_the_gap(store, monkeypatch):
+    fetches = []
+    full = _frame(pd.date_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=1), periods=20), range(20))
+
+    def fetch(symbol, period, interval):
+        fetches.append(period)
+        return full if period == '1mo' else full.iloc[-2:].assign(Close=[18.0, 19.5])
+
+    monkeypatch.setattr(history_module, 'history_store', store)
+    monkeypatch.setattr(history_module, '_fetch_upstream', fetch)
+    assert len(get_history('EQNR.OL', '1mo')) == 20
+    assert len(get_history('EQNR.OL', '1mo')) == 20
+    assert fetches == ['1mo']
+
+    # Once stale, only the last sessions are asked for
+    store._save_meta('EQNR.OL', '1d', dict(store.load_meta('EQNR.OL', '1d'), fresh_until=0))
+    frame = get_history('EQNR.OL', '1mo')
+    assert fetches == ['1mo', '5d']
+    assert frame['Close'].iloc[-1] == 19.5
+    assert store.stats['gap_fetches'] == 1
+
+
+def test_get_history_serves_stored_bars_when_upstream_fails(store, monkeypatch):
+    store.write('EQNR.OL', '1d', _frame([pd.Timestamp.now().normalize() - pd.Timedelta(days=1)], [5.0]))
+    monkeypatch.setattr(history_module, 'history_store', store)
+    monkeypatch.setattr(history_module, '_fetch_upstream', lambda symbol, period, interval: None)
+    assert list(get_history('EQNR.OL', '1mo')['Close']) == [5.0]
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.market_open import OSLO_TZ, MAX_CLOSED_TTL, market_for_symbol, market_ttl, next_market_open, symbol_ttl
+
+
+def oslo(*args):
+    return OSLO_TZ.localize(datetime(*args))
+
+
+# 2024-03-15 is a Friday
+@pytest.mark.parametrize('now, expected', [
+    (oslo(2024, 3, 16, 12, 0), oslo(2024, 3, 18, 9, 0)),   # Saturday
+    (oslo(2024, 3, 17, 23, 0), oslo(2024, 3, 18, 9, 0)),   # Sunday night
+    (oslo(2024, 3, 15, 17, 0), oslo(2024, 3, 18, 9, 0)),   # Friday after the close
+    (oslo(2024, 3, 14, 8, 0), oslo(2024, 3, 14, 9, 0)),    # Weekday before the open
+    (oslo(2024, 3, 14, 10, 0), oslo(2024, 3, 15, 9, 0)),   # During a session
+])
+def test_next_market_open_skips_weekends(now, expected):
+    assert next_market_open('oslo', now) == expected
+
+
+def test_open_market_uses_short_ttl():
+    assert market_ttl('oslo', 60, oslo(2024, 3, 14, 10, 0)) == 60
+
+
+def test_settling_after_close_keeps_short_ttl():
+    assert market_ttl('oslo', 60, oslo(2024, 3, 14, 16, 40)) == 60
+
+
+def test_closed_market_valid_until_next_open():
+    assert market_ttl('oslo', 60, oslo(2024, 3, 14, 8, 0)) == 3600
+    assert market_ttl('oslo', 60, oslo(2024, 3, 15, 17, 0)) == 64 * 3600
+
+
+def test_weekend_ttl_capped():
+    ttl = market_ttl('oslo', 60, oslo(2024, 3, 16, 0, 0))
+    assert ttl == min(57 * 3600, MAX_CLOSED_TTL)
+
+
+def test_all_markets_open_while_either_is():
+    assert market_ttl('all', 60, oslo(2024, 3, 14, 20, 0)) == 60
+    assert market_ttl('all', 60, oslo(2024, 3, 14, 23, 0)) == 10 * 3600
+
+
+def test_crypto_never_closes():
+    assert market_ttl('crypto', 30, oslo(2024, 3, 16, 3, 0)) == 30
+
+
+@pytest.mark.parametrize('symbol, market', [
+    ('EQNR.OL', 'oslo'), ('OSL:EQNR', 'oslo'), ('^OSEBX', 'oslo'),
+    ('EURNOK=X', 'currency'), ('BTC-USD', 'crypto'), ('AAPL', 'global'),
+])
+def test_market_for_symbol(symbol, market):
+    assert market_for_symbol(symbol) == market
+
+
+def test_symbol_ttl_follows_symbol_market():
+    saturday = oslo(2024, 3, 16, 12, 0)
+    assert symbol_ttl('BTC-USD', 30, saturday) == 30
+    assert symbol_ttl('EQNR.OL', 30, saturday) > 30
@@ -0,0 +1,93 @@
+import itertools
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+from app.utils.provider_router import (Provider, ProviderRouter, QuoteUnavailableError, normalize_quote,
+                                       _YFinancePool)
+
+_names = itertools.count()
+
+
+def _provider(fetch, hedge_delay=None):
+    provider = Provider(f"test-{next(_names)}", fetch)
+    if hedge_delay is not None:
+        provider.hedge_delay = lambda: hedge_delay
+    return provider
+
+
+def _fail(symbol, api_key, timeout):
+    raise IOError('upstream down')
+
+
+def _quote(price, delay=0.0):
+    def fetch(symbol, api_key, timeout):
+        time.sleep(delay)
+        return {'last_price': price}
+    return fetch
+
+
+def test_normalizes_provider_shapes():
+    quote = normalize_quote({'regularMarketPrice': 301.5, 'regularMarketChangePercent': 1.2,
+                             'longName': 'Equinor ASA', 'marketState': 'REGULAR'})
+    assert quote == {'last_price': 301.5, 'change': None, 'change_percent': 1.2, 'volume': None,
+                     'name': 'Equinor ASA', 'market_state': 'REGULAR'}
+    assert normalize_quote({'name': 'No price'}) is None
+    assert normalize_quote(None) is None
+
+
+def test_failure_fails_over_to_next_provider():
+    router = ProviderRouter([_provider(_fail), _provider(_quote(10.0))])
+    assert router.fetch_quote('EQNR.OL', timeout=2)['last_price'] == 10.0
+    assert router.stats['failovers'] == 1
+
+
+def test_empty_answer_does_not_fail_over():
+    calls = []
+
+    def second(symbol, api_key, timeout):
+        calls.append(symbol)
+        return {'last_price': 1.0}
+
+    router = ProviderRouter([_provider(lambda symbol, api_key, timeout: {}), _provider(second)])
+    assert router.fetch_quote('NOPE', timeout=2) is None
+    assert calls == []
+    assert router.stats['empty'] == 1
+
+
+def test_no_answer_raises_unavailable():
+    router = ProviderRouter([_provider(_fail), _provider(_fail)])
+    with pytest.raises(QuoteUnavailableError):
+        router.fetch_quote('EQNR.OL', timeout=2)
+
+
+def test_slow_provider_is_hedged():
+    router = ProviderRouter([_provider(_quote(1.0, delay=1.0), hedge_delay=0.05), _provider(_quote(2.0))])
+    started = time.time()
+    assert router.fetch_quote('EQNR.OL', timeout=3)['last_price'] == 2.0
+    assert time.time() - started < 0.5
+    assert router.stats['hedges'] == 1
+
+
+def test_open_breaker_skips_provider():
+    down = _provider(_quote(1.0))
+    for _ in range(down.breaker.min_calls):
+        down.breaker.record(False, 0.1)
+    router = ProviderRouter([down, _provider(_quote(2.0))])
+    assert router.fetch_quote('EQNR.OL', timeout=2)['last_price'] == 2.0
+    assert down.stats['calls'] == 0
+
+
+def test_yfinance_pool_enforces_timeout_and_bound():
+    release = threading.Event()
+    pool = _YFinancePool(1)
+    with pytest.raises(FutureTimeout):
+        pool.run(release.wait, timeout=0.05)
+    # The hung lookup still holds the only slot
+    with pytest.raises(RuntimeError):
+        pool.run(lambda: 1, timeout=0.05)
+    release.set()
+    time.sleep(0.05)
+    assert pool.run(lambda: 1, timeout=1) == 1
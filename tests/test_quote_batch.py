@@ -0,0 +1,41 @@
+import pytest
+
+from app.utils import quote_batch
+from app.utils.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    rl = RateLimiter()
+    rl.redis = None
+    monkeypatch.setattr(quote_batch, 'rate_limiter', rl)
+    monkeypatch.setattr(quote_batch, 'load_quotes',
+                        lambda chunk, period: {symbol: {'price': 1.0} for symbol in chunk})
+    return rl
+
+
+def test_ingest_budget_covers_a_full_board(limiter):
+    symbols = [f"S{i}" for i in range(1024)]
+    quotes, cursor = quote_batch.load_quotes_budgeted(symbols)
+    assert len(quotes) == 1024
+    assert cursor == 0
+
+
+def test_deferred_batches_go_first_next_time(limiter):
+    limiter.api_limits['test'] = {'calls': 2, 'per_seconds': 60, 'reserve': 0}
+    symbols = [f"S{i}" for i in range(120)]
+    quotes, cursor = quote_batch.load_quotes_budgeted(symbols, api_name='test')
+    assert len(quotes) == 100
+    assert cursor == 100
+    limiter.buckets.clear()
+    quotes, cursor = quote_batch.load_quotes_budgeted(symbols, cursor, api_name='test')
+    assert {f"S{i}" for i in range(100, 120)} <= set(quotes)
+    assert len(quotes) == 100
+    assert cursor == 80
+
+
+def test_single_call_budget_still_ingests(limiter):
+    limiter.api_limits['test'] = {'calls': 1, 'per_seconds': 60}
+    quotes, cursor = quote_batch.load_quotes_budgeted([f"S{i}" for i in range(60)], api_name='test')
+    assert len(quotes) == 50
+    assert cursor == 50
@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from app.utils import quote_batch
+from app.utils.quote_board import QuoteBoard, ingest_once
+
+
+@pytest.fixture
+def boards(tmp_path):
+    path = str(tmp_path / 'quotes.board')
+    writer = QuoteBoard(path, capacity=4).create()
+    reader = QuoteBoard(path, capacity=4)
+    return writer, reader
+
+
+def test_reader_sees_writer_quotes(boards):
+    writer, reader = boards
+    assert writer.write({'EQNR.OL': {'price': 301.5, 'change': 2.0, 'change_percent': 0.7, 'volume': 1000}}) == 1
+    quote = reader.get('EQNR.OL')
+    assert quote['price'] == 301.5
+    assert quote['volume'] == 1000
+
+
+def test_symbols_added_later_are_indexed(boards):
+    writer, reader = boards
+    writer.write({'EQNR.OL': {'price': 1.0}})
+    assert set(reader.get_many(['EQNR.OL', 'DNB.OL'])) == {'EQNR.OL'}
+    writer.write({'DNB.OL': {'price': 2.0}, 'EQNR.OL': {'price': 1.5}})
+    quotes = reader.get_many(['EQNR.OL', 'DNB.OL'])
+    assert quotes['DNB.OL']['price'] == 2.0
+    assert quotes['EQNR.OL']['price'] == 1.5
+
+
+def test_full_board_skips_new_symbols(boards):
+    writer, reader = boards
+    assert writer.write({f"S{i}": {'price': float(i + 1)} for i in range(6)}) == 4
+    assert reader.get_stats()['symbols'] == 4
+
+
+def test_old_quotes_are_left_out(boards):
+    writer, reader = boards
+    writer.write({'EQNR.OL': {'price': 1.0}}, timestamp=time.time() - 600)
+    assert reader.get('EQNR.OL', max_age=120) is None
+    assert reader.get('EQNR.OL', max_age=3600)['price'] == 1.0
+
+
+def test_reader_never_returns_a_torn_write(boards):
+    writer, reader = boards
+    writer.write({'EQNR.OL': {'price': 1.0}})
+    # Odd sequence: the writer is between its two increments
+    writer.header['sequence'] += 1
+    assert reader.get_many(['EQNR.OL']) == {}
+    writer.header['sequence'] += 1
+    assert reader.get('EQNR.OL')['price'] == 1.0
+
+
+def test_recreated_board_resets_reader_index(boards, tmp_path):
+    writer, reader = boards
+    writer.write({'EQNR.OL': {'price': 1.0}})
+    assert reader.get('EQNR.OL')
+    writer.header['magic'] = 0
+    fresh = QuoteBoard(writer.path, capacity=4).create()
+    fresh.write({'DNB.OL': {'price': 2.0}})
+    assert reader.get('EQNR.OL') is None
+    assert reader.get('DNB.OL')['price'] == 2.0
+
+
+def test_ingest_once_writes_budgeted_quotes(boards, monkeypatch):
+    writer, reader = boards
+    monkeypatch.setattr(quote_batch, 'load_quotes_budgeted',
+                        lambda symbols, cursor: ({s: {'price': 10.0} for s in symbols[:2]}, 2))
+    assert ingest_once(writer, ['A', 'B', 'C']) == (2, 2)
+    assert set(reader.get_many(['A', 'B', 'C'])) == {'A', 'B'}
@@ -0,0 +1,83 @@
+import pytest
+
+from app.utils.quote_stream import (QuoteStreamConsumer, QuoteIngestor, publish_ticks, prune_consumers,
+                                    encode_tick, decode_tick, STREAM_KEY)
+
+
+class Boom(Exception):
+    pass
+
+
+def _consumer(redis_client, received, name='c1', group='board:host', fail=False):
+    def handler(quotes):
+        if fail:
+            raise Boom()
+        received.update(quotes)
+    consumer = QuoteStreamConsumer(group, handler, consumer=name, client=redis_client, block_ms=0)
+    consumer.ensure_group()
+    return consumer
+
+
+def test_tick_round_trip():
+    symbol, quote = decode_tick(encode_tick('EQNR.OL', {'price': 301.5, 'volume': 1200}, 1700000000.0))
+    assert symbol == 'EQNR.OL'
+    assert quote == {'price': 301.5, 'volume': 1200, 'timestamp': 1700000000.0}
+
+
+def test_unacknowledged_ticks_are_replayed(redis_client):
+    crashed = _consumer(redis_client, {}, fail=True)
+    publish_ticks({'EQNR.OL': {'price': 300.0}, 'DNB.OL': {'price': 200.0}}, redis_client)
+    with pytest.raises(Boom):
+        crashed.read_batch()
+
+    received = {}
+    restarted = _consumer(redis_client, received)
+    assert restarted.read_batch(pending=True) == 2
+    assert set(received) == {'EQNR.OL', 'DNB.OL'}
+    assert restarted.read_batch(pending=True) == 0
+
+
+def test_idle_pending_ticks_are_claimed(redis_client):
+    gone = _consumer(redis_client, {}, name='gone', group='celery', fail=True)
+    publish_ticks({'NHY.OL': {'price': 60.0}}, redis_client)
+    with pytest.raises(Boom):
+        gone.read_batch()
+
+    received = {}
+    live = _consumer(redis_client, received, name='live', group='celery')
+    assert live.claim_idle(min_idle_ms=0) == 1
+    assert received['NHY.OL']['price'] == 60.0
+    assert redis_client.xpending(STREAM_KEY, 'celery')['pending'] == 0
+
+
+def test_every_group_sees_every_tick(redis_client):
+    first, second = {}, {}
+    a = _consumer(redis_client, first, group='board:a')
+    b = _consumer(redis_client, second, group='board:b')
+    publish_ticks({'MOWI.OL': {'price': 190.0}}, redis_client)
+    assert a.read_batch() == 1 and b.read_batch() == 1
+    assert first == second
+
+
+def test_prune_removes_idle_consumers_and_node_groups(redis_client):
+    _consumer(redis_client, {}, group='celery').read_batch()
+    _consumer(redis_client, {}, group='board:gone').read_batch()
+    removed = prune_consumers(redis_client, consumer_idle_ms=0, group_idle_ms=0)
+    assert removed == {'consumers': 1, 'groups': 1}
+    groups = {g['name'] for g in redis_client.xinfo_groups(STREAM_KEY)}
+    assert groups == {b'celery'}
+
+
+def test_prune_keeps_group_without_consumers(redis_client):
+    QuoteStreamConsumer('board:new', lambda quotes: None, client=redis_client).ensure_group()
+    assert prune_consumers(redis_client, consumer_idle_ms=0, group_idle_ms=0) == {'consumers': 0, 'groups': 0}
+    assert len(redis_client.xinfo_groups(STREAM_KEY)) == 1
+
+
+def test_only_one_ingestor_holds_the_lease(redis_client):
+    leader = QuoteIngestor(30, client=redis_client)
+    other = QuoteIngestor(30, client=redis_client)
+    other.identity = 'other-host:1'
+    assert leader.is_leader()
+    assert not other.is_leader()
+    assert leader.is_leader()
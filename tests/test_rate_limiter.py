@@ -0,0 +1,49 @@
+import pytest
+
+from app.utils.rate_limiter import RateLimiter, BACKGROUND, INTERACTIVE
+
+
+@pytest.fixture(params=['local', 'redis'])
+def limiter(request, redis_client):
+    rl = RateLimiter()
+    rl.redis = redis_client if request.param == 'redis' else None
+    return rl
+
+
+def _grants(rl, api_name, priority, attempts):
+    return sum(rl.acquire(api_name, priority).granted for _ in range(attempts))
+
+
+def test_interactive_gets_whole_bucket(limiter):
+    limiter.api_limits['test'] = {'calls': 4, 'per_seconds': 60}
+    assert _grants(limiter, 'test', INTERACTIVE, 6) == 4
+
+
+def test_background_leaves_reserve_for_interactive(limiter):
+    limiter.api_limits['test'] = {'calls': 4, 'per_seconds': 60}
+    assert _grants(limiter, 'test', BACKGROUND, 6) == 2
+    assert _grants(limiter, 'test', INTERACTIVE, 6) == 2
+
+
+def test_background_gets_a_token_from_single_call_budget(limiter):
+    limiter.api_limits['test'] = {'calls': 1, 'per_seconds': 60}
+    assert limiter.acquire('test', BACKGROUND).granted
+    denied = limiter.acquire('test', BACKGROUND)
+    assert not denied.granted
+    assert 0 < denied.retry_after <= 60
+
+
+def test_budget_reserve_override(limiter):
+    limiter.api_limits['test'] = {'calls': 4, 'per_seconds': 60, 'reserve': 0}
+    assert _grants(limiter, 'test', BACKGROUND, 6) == 4
+
+
+def test_burst_limits_both_backends(limiter):
+    limiter.api_limits['test'] = {'calls': 250, 'per_seconds': 86400, 'burst': 10}
+    assert _grants(limiter, 'test', INTERACTIVE, 20) == 10
+
+
+def test_stats_count_deferred_calls(limiter):
+    limiter.api_limits['test'] = {'calls': 1, 'per_seconds': 60}
+    _grants(limiter, 'test', INTERACTIVE, 3)
+    assert limiter.get_stats()['test'] == {'granted': 1, 'deferred': 2}
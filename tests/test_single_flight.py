@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.single_flight import SingleFlight, cached_call, wrap_value, unwrap_value
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'value'
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ['value'] * 5
+    assert flight.stats['followers'] == 4
+
+
+def test_leader_error_reaches_followers():
+    flight = SingleFlight()
+    errors = []
+
+    def failing():
+        time.sleep(0.1)
+        raise ValueError('upstream')
+
+    def call():
+        try:
+            flight.do('k', failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    assert not flight.in_flight('k')
+
+
+def test_other_worker_waits_for_the_value(redis_client):
+    flight = SingleFlight(wait_timeout=2.0, poll_interval=0.02)
+    redis_client.set('lock:k', 'other-worker')
+    cache = {}
+    threading.Timer(0.1, lambda: cache.update(k='from-leader')).start()
+    result = flight.do('k', lambda: 'computed', redis_client=redis_client, recheck=lambda: cache.get('k'))
+    assert result == 'from-leader'
+    assert flight.stats['redis_wait_hits'] == 1
+
+
+def test_released_lock_without_value_is_abandoned(redis_client):
+    flight = SingleFlight(wait_timeout=5.0, poll_interval=0.02)
+    redis_client.set('lock:k', 'other-worker')
+    threading.Timer(0.1, lambda: redis_client.delete('lock:k')).start()
+    started = time.time()
+    assert flight.do('k', lambda: 'computed', redis_client=redis_client, recheck=lambda: None) == 'computed'
+    assert time.time() - started < 1.0
+    assert flight.stats['abandoned'] == 1
+
+
+def test_stale_value_served_while_locked(redis_client):
+    flight = SingleFlight()
+    redis_client.set('lock:k', 'other-worker')
+    assert flight.do('k', lambda: 'computed', redis_client=redis_client, stale='old') == 'old'
+
+
+def test_leader_releases_its_lock(redis_client):
+    flight = SingleFlight()
+    assert flight.do('k', lambda: 'computed', redis_client=redis_client) == 'computed'
+    assert not redis_client.exists('lock:k')
+
+
+def test_envelope_refreshes_only_near_expiry():
+    assert unwrap_value(wrap_value('v', ttl=3600, delta=0.01)) == ('v', False)
+    assert unwrap_value(wrap_value('v', ttl=-1, delta=0.01)) == ('v', True)
+    assert unwrap_value({'plain': 1}) == ({'plain': 1}, False)
+
+
+def test_cached_call_stores_and_serves():
+    store = {}
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return 42
+
+    def read():
+        return cached_call('k', compute, 60, store.get, lambda key, value, ttl: store.__setitem__(key, value),
+                           flight=SingleFlight())
+
+    assert read() == 42
+    assert read() == 42
+    assert len(calls) == 1
+    assert unwrap_value(store['k'])[0] == 42
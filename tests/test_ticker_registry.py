@@ -0,0 +1,58 @@
+import pytest
+
+from app.utils import quote_fetcher
+from app.utils.provider_router import QuoteUnavailableError
+from app.utils.tiered_cache import tiered_cache
+from app.utils.ticker_registry import TickerRegistry, normalize_symbol, is_valid_format, INVALID, UNKNOWN, VALID
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(tiered_cache.manager, 'redis_available', False)
+    fresh = TickerRegistry()
+    monkeypatch.setattr(quote_fetcher, 'ticker_registry', fresh)
+    yield fresh
+    tiered_cache.invalidate('negative', 'stocks')
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('osl:eqnr', 'EQNR.OL'),
+    ('OSL:EQNR.OL', 'EQNR.OL'),
+    ('NASDAQ:AAPL', 'AAPL'),
+    ('XETRA:SAP', 'SAP.DE'),
+    ('LON:VOD', 'VOD.L'),
+    ('XSTU:SAP', 'XSTU:SAP'),
+])
+def test_exchange_prefixes(raw, expected):
+    assert normalize_symbol(raw) == expected
+    assert is_valid_format(raw)
+
+
+@pytest.mark.parametrize('symbol', ['', '../etc', 'A B', 'X:', ':EQNR', 'TOOLONGPREFIXX:SAP'])
+def test_malformed_symbols(symbol):
+    assert not is_valid_format(symbol)
+
+
+def test_check_classifies_symbols(registry):
+    registry.load(['EQNR.OL'])
+    assert registry.check('osl:eqnr') == VALID
+    assert registry.check('bad symbol') == INVALID
+    assert registry.check('XETRA:SAP') == UNKNOWN
+    registry.mark_invalid('XETRA:SAP')
+    assert registry.check('SAP.DE') == INVALID
+    registry.mark_valid('SAP.DE')
+    assert registry.check('SAP.DE') == VALID
+
+
+def test_confirm_unknown_marks_only_on_empty_answer(registry, monkeypatch):
+    monkeypatch.setattr(quote_fetcher, 'get_quote', lambda ticker: None)
+    assert quote_fetcher.confirm_unknown('NOPE')
+    assert registry.check('NOPE') == INVALID
+
+
+def test_confirm_unknown_ignores_outages(registry, monkeypatch):
+    def unavailable(ticker):
+        raise QuoteUnavailableError(ticker)
+    monkeypatch.setattr(quote_fetcher, 'get_quote', unavailable)
+    assert not quote_fetcher.confirm_unknown('EQNR.OL')
+    assert registry.check('EQNR.OL') == UNKNOWN